@@ -0,0 +1,83 @@
+"""
+Compare reading today's birthdays of every user with one query per user against the chunked
+keyset scan of the daily birthday greetings, on a SQLite database of generated contacts.
+
+Run from the project root:
+
+    python benchmarks/bench_birthdays.py [contacts] [users]
+"""
+import asyncio
+import datetime
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import redis.asyncio as redis
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.database.models import Base, Contact, User  # noqa: E402
+from src.repository.contacts import _birthday_window  # noqa: E402
+from src.services.birthdays import BirthdayGreetings  # noqa: E402
+
+
+def populate(url: str, contacts: int, users: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": n, "email": f"user{n}@example.com", "username": f"user{n}", "password": "x", "confirmed": True} for n in range(1, users + 1)])
+        for start in range(0, contacts, 100000):
+            rows = []
+            for n in range(start, min(start + 100000, contacts)):
+                birthday = datetime.date(1970, 1, 1) + datetime.timedelta(days=rng.randrange(366 * 40))
+                rows.append({"first_name": f"first{n}", "last_name": f"last{n}", "birthday": birthday, "birthday_md": birthday.month * 100 + birthday.day, "user_id": rng.randint(1, users)})
+            conn.execute(insert(Contact), rows)
+    engine.dispose()
+
+
+async def per_user(session_factory, today: datetime.date) -> int:
+    start, end = _birthday_window(today, 0)
+    found = 0
+    async with session_factory() as db:
+        user_ids = (await db.execute(select(User.id))).scalars().all()
+        for user_id in user_ids:
+            result = await db.execute(select(Contact).filter(Contact.user_id == user_id, Contact.birthday_md.between(start, end)))
+            found += len(result.scalars().all())
+    return found
+
+
+async def chunked(session_factory, today: datetime.date) -> int:
+    greetings = BirthdayGreetings(redis.Redis(), None, session_factory)
+    found = 0
+    async for groups in greetings.chunks(today):
+        found += sum(map(len, groups))
+    return found
+
+
+async def main(contacts: int, users: int) -> None:
+    today = datetime.date(2023, 5, 17)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "bench.db")
+        began = time.perf_counter()
+        populate(f"sqlite:///{path}", contacts, users)
+        print(f"populated {contacts} contacts of {users} users in {time.perf_counter() - began:.1f}s")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        print(f"{'scan':<12}{'contacts':>10}{'seconds':>10}")
+        for name, scan in (("per user", per_user), ("chunked", chunked)):
+            began = time.perf_counter()
+            found = await scan(session_factory, today)
+            print(f"{name:<12}{found:>10}{time.perf_counter() - began:>10.2f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10000,
+    ))
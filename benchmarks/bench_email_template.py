@@ -0,0 +1,55 @@
+"""
+Compare the per-message cost of rendering the confirmation email template with a fresh Jinja
+environment, with a cached compiled template, and with the pre-rendered template.
+
+Run from the project root:
+
+    python benchmarks/bench_email_template.py [iterations]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.email import TEMPLATE_FOLDER, env, get_template  # noqa: E402
+
+TEMPLATE = "email_template.html"
+
+
+def fresh_environment(**context) -> str:
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]))
+    return environment.get_template(TEMPLATE).render(**context)
+
+
+def cached_template(**context) -> str:
+    return env.get_template(TEMPLATE).render(**context)
+
+
+def prerendered_template(**context) -> str:
+    return get_template(TEMPLATE, tuple(sorted(context))).render(**context)
+
+
+def main(iterations: int) -> None:
+    context = {
+        "host": "http://localhost:8000/",
+        "username": "bench <user>",
+        "token": "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJiZW5jaEBleGFtcGxlLmNvbSJ9.signature",
+    }
+    renderers = {
+        "fresh environment": fresh_environment,
+        "cached template": cached_template,
+        "pre-rendered": prerendered_template,
+    }
+    expected = fresh_environment(**context)
+    print(f"{'renderer':<20}{'render us':>12}")
+    for name, render in renderers.items():
+        assert render(**context) == expected, name
+        cost = min(timeit.repeat(lambda: render(**context), number=iterations, repeat=5)) / iterations
+        print(f"{name:<20}{cost * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
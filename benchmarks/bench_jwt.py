@@ -0,0 +1,48 @@
+"""
+Compare signing and verification times of the HS256 shared secret and an ES256 key ring.
+
+Run from the project root:
+
+    python benchmarks/bench_jwt.py [iterations]
+"""
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.keys import KeyRing  # noqa: E402
+
+
+def es256_ring(directory: str) -> KeyRing:
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    Path(directory, "bench.pem").write_bytes(pem)
+    return KeyRing.from_directory(directory, "bench", "ES256", "secret", "HS256")
+
+
+def main(iterations: int) -> None:
+    claims = {
+        "sub": "bench@example.com",
+        "uid": 1,
+        "confirmed": True,
+        "scope": "access_token",
+        "exp": datetime.utcnow() + timedelta(hours=1),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        rings = {"HS256": KeyRing("secret", "HS256"), "ES256": es256_ring(directory)}
+        print(f"{'algorithm':<10}{'sign us':>12}{'verify us':>12}")
+        for name, ring in rings.items():
+            token = ring.encode(claims)
+            sign = min(timeit.repeat(lambda: ring.encode(claims), number=iterations, repeat=5)) / iterations
+            verify = min(timeit.repeat(lambda: ring.decode(token), number=iterations, repeat=5)) / iterations
+            print(f"{name:<10}{sign * 1e6:>12.1f}{verify * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
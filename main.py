@@ -1,13 +1,63 @@
-from src.routes import contacts,auth,users
-import redis.asyncio as redis
-from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
+import asyncio
+import logging
+import secrets
+from contextlib import asynccontextmanager
+
+from src.routes import contacts,auth,users,jwks
+from fastapi import FastAPI, Depends, HTTPException, Security, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi.staticfiles import StaticFiles
 from src.conf.config import settings
+from src.services.cache import user_cache, token_cache
+from src.services.passwords import password_hasher
+from src.services.limiter import limiter
+from src.services.redis_pool import redis_pool
+from src.services.mailer import mailer
 from fastapi.middleware.cors import CORSMiddleware
 
 
+logger = logging.getLogger(__name__)
+
+
+# Define the application lifespan: start background tasks and close shared resources
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    This function runs around the lifetime of the FastAPI application.
+    On startup it checks Redis and starts listening for cache invalidations, sending queued emails
+    and, in approximate mode, syncing the rate limiter. On shutdown it sends the queued emails,
+    stops the background tasks, shuts down the password hashing pool and closes the Redis pool.
+    """
+    # Check Redis; connections are opened on first use
+    if not await redis_pool.ping():
+        logger.warning("Redis is not reachable")
+
+    # Drop cached users changed by other workers
+    user_cache_listener = asyncio.create_task(user_cache.listen())
+
+    # Drop cached tokens revoked by other workers
+    token_cache_listener = asyncio.create_task(token_cache.listen())
+
+    # Push requests counted by the local rate limit buckets to Redis
+    limiter_sync = asyncio.create_task(limiter.run()) if limiter.approximate else None
+
+    # Start sending queued emails
+    await mailer.start()
+
+    yield
+
+    await mailer.stop()
+
+    user_cache_listener.cancel()
+    token_cache_listener.cancel()
+    if limiter_sync is not None:
+        limiter_sync.cancel()
+    password_hasher.executor.shutdown(wait=False)
+    await redis_pool.close()
+
+
 # Create a FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Define allowed origins for CORS
 origins = ["*"]
@@ -25,19 +75,11 @@ app.add_middleware(
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router,prefix="/api")
+app.include_router(jwks.router)
 
-# Define an event handler to initialize Redis and FastAPI limiter on startup
-@app.on_event("startup")
-async def startup():
-    """
-    This function is called when the FastAPI application starts.
-    It initializes a Redis connection and sets up the FastAPI limiter.
-    """
-    # Connect to Redis
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",decode_responses=True)
-
-    # Initialize the FastAPI limiter using the Redis connection
-    await FastAPILimiter.init(r)
+# Serve the avatars stored locally
+if settings.avatar_storage == "local":
+    app.mount(settings.avatar_base_url, StaticFiles(directory=settings.avatar_dir), name="avatars")
 
 # Define a GET endpoint for the root path
 @app.get("/")
@@ -46,3 +88,35 @@ def read_root():
     This endpoint returns a simple message "Hello World" when accessed.
     """
     return {"message": "Hello World"}
+
+
+# Create an HTTPBearer instance for the metrics token, answering missing credentials ourselves
+metrics_security = HTTPBearer(auto_error=False)
+
+
+def check_metrics_token(credentials: HTTPAuthorizationCredentials | None = Security(metrics_security)):
+    """
+    Check the bearer token of a metrics request against settings.metrics_token.
+
+    The metrics are not served at all while no token is configured.
+    """
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not secrets.compare_digest(credentials.credentials, settings.metrics_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+
+
+# Define a GET endpoint exposing runtime metrics, for holders of the metrics token only
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(check_metrics_token)])
+def read_metrics():
+    """
+    This endpoint returns the queue depths of the password hashing pool and the mailer, the usage
+    of the Redis pool and the hit rates of the caches. It requires the metrics token as a bearer token.
+    """
+    return {
+        "redis_pool": redis_pool.stats(),
+        "password_hasher": password_hasher.stats(),
+        "mailer": mailer.stats(),
+        "user_cache": user_cache.local.stats(),
+        "token_cache": token_cache.local.stats(),
+    }
@@ -0,0 +1,36 @@
+"""'Contacts birthday month-day'
+
+Revision ID: 3c6f2a9d1b47
+Revises: 527b818f98fd
+Create Date: 2026-10-16 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c6f2a9d1b47'
+down_revision: Union[str, None] = '527b818f98fd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE contacts SET birthday_md = "
+        "CAST(EXTRACT(MONTH FROM birthday) AS INTEGER) * 100 + CAST(EXTRACT(DAY FROM birthday) AS INTEGER) "
+        "WHERE birthday IS NOT NULL"
+    )
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_birthday_md', 'contacts', ['user_id', 'birthday_md'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_user_id_birthday_md', table_name='contacts', postgresql_concurrently=True)
+    op.drop_column('contacts', 'birthday_md')
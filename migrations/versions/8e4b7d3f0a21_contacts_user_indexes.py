@@ -0,0 +1,30 @@
+"""'Contacts per-user indexes'
+
+Revision ID: 8e4b7d3f0a21
+Revises: 3c6f2a9d1b47
+Create Date: 2026-10-16 11:03:57.402311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b7d3f0a21'
+down_revision: Union[str, None] = '3c6f2a9d1b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_name', 'contacts', ['user_id', 'last_name', 'first_name', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_contacts_user_id_email', 'contacts', ['user_id', 'email'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_user_id_email', table_name='contacts', postgresql_concurrently=True)
+        op.drop_index('ix_contacts_user_id_name', table_name='contacts', postgresql_concurrently=True)
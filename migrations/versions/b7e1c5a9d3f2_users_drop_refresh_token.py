@@ -0,0 +1,27 @@
+"""'Users drop refresh token'
+
+Revision ID: b7e1c5a9d3f2
+Revises: f2b8c6d4a9e1
+Create Date: 2026-10-16 16:42:18.905134
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e1c5a9d3f2'
+down_revision: Union[str, None] = 'f2b8c6d4a9e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Refresh token state lives in Redis, see src.services.refresh_tokens
+    op.drop_column('users', 'refresh_token')
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('refresh_token', sa.String(length=255), nullable=True))
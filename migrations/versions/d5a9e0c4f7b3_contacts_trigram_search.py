@@ -0,0 +1,34 @@
+"""'Contacts trigram search indexes'
+
+Revision ID: d5a9e0c4f7b3
+Revises: 8e4b7d3f0a21
+Create Date: 2026-10-16 12:27:15.630948
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9e0c4f7b3'
+down_revision: Union[str, None] = '8e4b7d3f0a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_first_name_trgm', 'contacts', [sa.text('lower(first_name) gin_trgm_ops')], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_contacts_last_name_trgm', 'contacts', [sa.text('lower(last_name) gin_trgm_ops')], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_contacts_email_trgm', 'contacts', [sa.text('lower(email) gin_trgm_ops')], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_email_trgm', table_name='contacts', postgresql_concurrently=True)
+        op.drop_index('ix_contacts_last_name_trgm', table_name='contacts', postgresql_concurrently=True)
+        op.drop_index('ix_contacts_first_name_trgm', table_name='contacts', postgresql_concurrently=True)
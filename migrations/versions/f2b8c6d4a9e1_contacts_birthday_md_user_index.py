@@ -0,0 +1,28 @@
+"""'Contacts birthday month-day index across users'
+
+Revision ID: f2b8c6d4a9e1
+Revises: d5a9e0c4f7b3
+Create Date: 2026-10-16 14:03:52.417306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8c6d4a9e1'
+down_revision: Union[str, None] = 'd5a9e0c4f7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_birthday_md_user_id_id', 'contacts', ['birthday_md', 'user_id', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_birthday_md_user_id_id', table_name='contacts', postgresql_concurrently=True)
@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,13 +10,36 @@ class Settings(BaseSettings):
     - sqlalchemy_database_url (str): The URL for the SQLAlchemy database.
     - secret_key (str): The secret key for the application.
     - algorithm (str): The algorithm used for encryption.
+    - jwt_keys_dir (str): The directory of "<kid>.pem" signing keys. If empty, tokens are signed with secret_key.
+    - jwt_active_kid (str): The kid of the private key signing new tokens; the other keys only verify.
+    - jwt_key_algorithm (str): The algorithm of the signing keys, e.g. ES256.
+    - jwt_accept_secret_tokens (bool): Whether tokens signed with secret_key are still accepted once keys are used.
     - mail_username (str): The username for sending emails.
     - mail_password (str): The password for sending emails.
     - mail_from (str): The email address to send emails from.
     - mail_port (int): The port for the mail server.
     - mail_server (str): The server for sending emails.
+    - mail_ssl_tls (bool): Whether to connect to the mail server over TLS.
+    - mail_starttls (bool): Whether to upgrade the mail connection with STARTTLS.
+    - mail_validate_certs (bool): Whether to validate the certificate of the mail server.
+    - mail_timeout (float): The timeout of SMTP operations, in seconds.
+    - mail_concurrency (int): The number of mail workers, each holding one pooled SMTP connection.
+    - mail_batch_size (int): The maximum number of queued emails sent over a connection in a row.
+    - mail_queue_size (int): The maximum number of queued emails.
+    - mail_max_attempts (int): The number of attempts to send an email before it is dropped.
+    - mail_retry_backoff (float): The delay before the first retry of an email, in seconds; it doubles with every attempt.
     - redis_host (str): The host for the Redis server.
     - redis_port (int): The port for the Redis server.
+    - redis_max_connections (int): The maximum number of connections in the shared Redis pool.
+    - redis_pool_timeout (float): How long to wait for a free Redis connection, in seconds.
+    - redis_socket_timeout (float): How long to wait for a Redis reply, in seconds.
+    - redis_connect_timeout (float): How long to wait for a Redis connection to open, in seconds.
+    - redis_health_check_interval (int): Idle time after which a Redis connection is pinged before use, in seconds.
+    - redis_breaker_threshold (int): The number of consecutive Redis failures opening the circuit breaker.
+    - redis_breaker_reset_timeout (float): How long the circuit breaker stays open before a trial call, in seconds.
+    - redis_fail_open (bool): Whether routes skip checks needing Redis (rate limits, token revocation,
+      refresh token rotation on login and refresh_token) while it is unavailable, instead of answering 503.
+    - redis_fail_policy (Dict[str, str]): Per-route overrides of redis_fail_open, "open" or "closed" by route name.
     - postgres_db (str): The name of the PostgreSQL database.
     - postgres_user (str): The username for the PostgreSQL database.
     - postgres_password (str): The password for the PostgreSQL database.
@@ -22,6 +47,40 @@ class Settings(BaseSettings):
     - cloudinary_name (str): The name of the Cloudinary account.
     - cloudinary_api_key (str): The API key for Cloudinary.
     - cloudinary_api_secret (str): The API secret for Cloudinary.
+    - avatar_storage (str): Where avatars are stored, "cloudinary" or "local".
+    - avatar_dir (str): The directory of the avatars stored locally.
+    - avatar_base_url (str): The URL the local avatars are served at.
+    - avatar_max_size (int): The maximum size of an avatar, in bytes.
+    - avatar_chunk_size (int): The number of bytes of an avatar read at a time.
+    - import_chunk_size (int): The number of rows inserted per statement by the bulk contact import.
+    - user_cache_ttl (int): The time-to-live of cached user snapshots in Redis, in seconds.
+    - user_cache_local_ttl (int): The time-to-live of user snapshots in the in-process cache, in seconds.
+      Changes are broadcast to every worker, so both TTLs can be long.
+    - user_cache_local_size (int): The maximum number of user snapshots in the in-process cache.
+    - token_cache_size (int): The maximum number of verified access tokens cached in process.
+    - bcrypt_rounds (int): The bcrypt cost of new password hashes. Passwords hashed with another cost
+      are rehashed on the next successful login.
+    - password_hash_workers (int): The number of threads hashing and verifying passwords.
+    - password_hash_max_queue (int): The number of password checks allowed to wait for a free thread
+      before new ones are refused with 503.
+    - rate_limit_default (str): The rate limit of routes without their own, as "<requests>/<seconds>".
+    - rate_limits (Dict[str, str]): Rate limits by route name, e.g. {"export_contacts": "2/60"}.
+    - rate_limit_users (Dict[str, str]): Rate limits of specific users, keyed by "<user id>:<route name>"
+      or by "<user id>" for every route. Limits are always counted per user.
+    - rate_limit_approximate (bool): Whether to check limits against per-worker token buckets synced
+      to Redis in batches, trading exactness for fewer Redis calls.
+    - rate_limit_sync_interval (float): The time between two syncs of the token buckets, in seconds.
+    - job_queues (Dict[str, int]): The background job queues and how many of their jobs may run at once,
+      across every worker process.
+    - job_visibility_timeout (int): How long a claimed job may run without a heartbeat before another
+      worker gets it, in seconds.
+    - job_max_attempts (int): The number of attempts of a job before it is moved to its dead-letter queue.
+    - job_retry_backoff (float): The delay before the first retry of a job, in seconds; it doubles with every attempt.
+    - job_poll_interval (float): How long a worker waits before polling an empty queue again, in seconds.
+    - birthday_greetings_hour (int): The hour of the day from which job workers queue the birthday greetings.
+    - birthday_chunk_size (int): The number of contacts read per query by the birthday greetings.
+    - birthday_enqueue_concurrency (int): The maximum number of birthday greetings being queued at once.
+    - metrics_token (str): The bearer token required by GET /metrics; the endpoint is disabled while it is empty.
 
     Config:
     - env_file (str): The name of the environment file to load settings from.
@@ -30,13 +89,35 @@ class Settings(BaseSettings):
     sqlalchemy_database_url: str
     secret_key: str
     algorithm: str
+    jwt_keys_dir: str = ""
+    jwt_active_kid: str = ""
+    jwt_key_algorithm: str = "ES256"
+    jwt_accept_secret_tokens: bool = True
     mail_username: str
     mail_password: str
     mail_from: str
     mail_port: int
     mail_server: str
+    mail_ssl_tls: bool = True
+    mail_starttls: bool = False
+    mail_validate_certs: bool = True
+    mail_timeout: float = 30
+    mail_concurrency: int = 4
+    mail_batch_size: int = 20
+    mail_queue_size: int = 10000
+    mail_max_attempts: int = 5
+    mail_retry_backoff: float = 1.0
     redis_host: str
     redis_port: int 
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 1.0
+    redis_socket_timeout: float = 0.5
+    redis_connect_timeout: float = 0.5
+    redis_health_check_interval: int = 30
+    redis_breaker_threshold: int = 5
+    redis_breaker_reset_timeout: float = 5.0
+    redis_fail_open: bool = True
+    redis_fail_policy: Dict[str, str] = {"export_contacts": "closed", "import_contacts": "closed"}
     postgres_db: str
     postgres_user: str
     postgres_password: str
@@ -44,6 +125,33 @@ class Settings(BaseSettings):
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    avatar_storage: str = "cloudinary"
+    avatar_dir: str = "avatars"
+    avatar_base_url: str = "/avatars"
+    avatar_max_size: int = 5 * 1024 * 1024
+    avatar_chunk_size: int = 64 * 1024
+    import_chunk_size: int = 1000
+    user_cache_ttl: int = 86400
+    user_cache_local_ttl: int = 3600
+    user_cache_local_size: int = 10000
+    token_cache_size: int = 10000
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    rate_limit_default: str = "10/60"
+    rate_limits: Dict[str, str] = {"export_contacts": "2/60", "create_contact": "2/60", "import_contacts": "2/60"}
+    rate_limit_users: Dict[str, str] = {}
+    rate_limit_approximate: bool = False
+    rate_limit_sync_interval: float = 1.0
+    job_queues: Dict[str, int] = {"emails": 4}
+    job_visibility_timeout: int = 60
+    job_max_attempts: int = 5
+    job_retry_backoff: float = 5.0
+    job_poll_interval: float = 0.5
+    birthday_greetings_hour: int = 8
+    birthday_chunk_size: int = 5000
+    birthday_enqueue_concurrency: int = 16
+    metrics_token: str = ""
 
     class Config:
         env_file = ".env"
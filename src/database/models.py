@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, func, Table
+from sqlalchemy import Column, Integer, String, Boolean, func, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import Date,DateTime
@@ -15,10 +15,25 @@ class Contact(Base):
     email=Column(String(125),unique=True)
     phone_number=Column(Integer,unique=True)
     birthday=Column("birthday",Date)
+    # month * 100 + day of the birthday, kept in sync by the repository for window queries
+    birthday_md=Column(Integer)
     additional_data=Column(String(255))
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="contacts")
 
+    # Every repository query is scoped by user_id, so each index leads with it
+    __table_args__ = (
+        Index("ix_contacts_user_id_name", "user_id", "last_name", "first_name", "id"),
+        Index("ix_contacts_user_id_email", "user_id", "email"),
+        Index("ix_contacts_user_id_birthday_md", "user_id", "birthday_md"),
+        # The daily birthday greetings read one day across all users, in keyset order
+        Index("ix_contacts_birthday_md_user_id_id", "birthday_md", "user_id", "id"),
+        # Trigram indexes back the fuzzy search on Postgres (requires the pg_trgm extension)
+        Index("ix_contacts_first_name_trgm", func.lower(first_name).label("lower_first_name"), postgresql_using="gin", postgresql_ops={"lower_first_name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_contacts_last_name_trgm", func.lower(last_name).label("lower_last_name"), postgresql_using="gin", postgresql_ops={"lower_last_name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_contacts_email_trgm", func.lower(email).label("lower_email"), postgresql_using="gin", postgresql_ops={"lower_email": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -28,5 +43,4 @@ class User(Base):
     password = Column(String(255), nullable=False)
     created_at = Column('crated_at', DateTime, default=func.now())
     avatar = Column(String(255), nullable=True)
-    refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
\ No newline at end of file
@@ -1,14 +1,21 @@
-from typing import List
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Sequence, Tuple
+import base64
+import calendar
 import datetime
+import functools
+import json
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, tuple_, or_, func, bindparam, Row
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 
 from src.database.models import Contact,User
 from src.schemas import ContactModel
 
 
 # Function to retrieve a list of contacts for a given user, with pagination
-async def get_contacts(skip: int, limit: int,user:User, db: Session) -> List[Contact]:
+async def get_contacts(skip: int, limit: int,user:User, db: AsyncSession) -> List[Contact]:
     """
     Retrieves a list of contacts for a given user, with pagination.
 
@@ -16,154 +23,662 @@ async def get_contacts(skip: int, limit: int,user:User, db: Session) -> List[Con
         skip (int): The number of contacts to skip (for pagination).
         limit (int): The maximum number of contacts to return.
         user (User): The user for whom to retrieve the contacts.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
 
     Returns:
         List[Contact]: A list of Contact objects.
     """
-    return db.query(Contact).filter(Contact.user_id==user.id).offset(skip).limit(limit).all()
+    result = await db.execute(select(Contact).filter(Contact.user_id==user.id).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+def _encode_cursor(contact: Contact) -> str:
+    """
+    Encodes the sort key of a contact into an opaque cursor token.
+
+    Args:
+        contact (Contact): The last contact of a page.
+
+    Returns:
+        str: A URL-safe cursor pointing right after the given contact.
+    """
+    raw = json.dumps([contact.last_name, contact.first_name, contact.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    """
+    Decodes a cursor token produced by _encode_cursor.
+
+    Args:
+        cursor (str): The cursor token.
+
+    Returns:
+        Tuple[str, str, int]: The (last_name, first_name, id) sort key.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_name, first_name, contact_id = json.loads(raw)
+    except (ValueError, TypeError) as err:
+        raise ValueError("Invalid cursor") from err
+    if not (isinstance(last_name, str) and isinstance(first_name, str) and isinstance(contact_id, int)):
+        raise ValueError("Invalid cursor")
+    return last_name, first_name, contact_id
+
+
+# Function to retrieve a page of contacts for a given user, using keyset pagination
+async def get_contacts_page(limit: int, user: User, db: AsyncSession, cursor: str | None = None) -> Tuple[List[Contact], str | None]:
+    """
+    Retrieves a page of contacts for a given user, ordered by (last_name, first_name, id).
+
+    Instead of skipping rows with OFFSET, the page starts right after the sort key stored
+    in the cursor, so every page costs the same as the first one.
+
+    Args:
+        limit (int): The maximum number of contacts to return.
+        user (User): The user for whom to retrieve the contacts.
+        db (AsyncSession): The SQLAlchemy async database session.
+        cursor (str | None, optional): The cursor returned with the previous page, or None for the first page.
+
+    Returns:
+        Tuple[List[Contact], str | None]: The contacts of the page and the cursor of the next page,
+        or None if this is the last page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    query = select(Contact).filter(Contact.user_id==user.id)
+    if cursor:
+        last_name, first_name, contact_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(Contact.last_name, Contact.first_name, Contact.id) > tuple_(last_name, first_name, contact_id))
+    query = query.order_by(Contact.last_name, Contact.first_name, Contact.id).limit(limit + 1)
+    result = await db.execute(query)
+    contacts = result.scalars().all()
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        return contacts, _encode_cursor(contacts[-1])
+    return contacts, None
+
+
+# Function to stream every contact of a given user
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Row]:
+    """
+    Streams all contacts of a given user through a server-side cursor.
+
+    Rows come in (last_name, first_name, id) order, which the per-user name index already
+    provides, so the first rows are sent without sorting the whole set. They are fetched
+    batch_size at a time as plain rows rather than ORM objects, so memory use stays flat
+    whatever the number of contacts.
+
+    Args:
+        user (User): The user whose contacts to stream.
+        db (AsyncSession): The SQLAlchemy async database session.
+        batch_size (int, optional): The number of rows fetched per round-trip. Defaults to 1000.
+
+    Yields:
+        Row: The contact columns, accessible as attributes.
+    """
+    table = Contact.__table__
+    query = select(table.c.id, table.c.first_name, table.c.last_name, table.c.email, table.c.phone_number, table.c.birthday, table.c.additional_data).filter(table.c.user_id==user.id).order_by(table.c.last_name, table.c.first_name, table.c.id)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for row in result:
+        yield row
 
 
 # Function to retrieve a single contact by ID for a given user
-async def get_contact(tag_id: int,user:User, db: Session) -> Contact:
+async def get_contact(tag_id: int,user:User, db: AsyncSession) -> Contact:
     """
     Retrieves a single contact by ID for a given user.
 
     Args:
         tag_id (int): The ID of the contact to retrieve.
         user (User): The user for whom to retrieve the contact.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
 
     Returns:
         Contact: The Contact object, or None if not found.
     """
-    return db.query(Contact).filter(Contact.id == tag_id,Contact.user_id==user.id).first()
+    result = await db.execute(select(Contact).filter(Contact.id == tag_id,Contact.user_id==user.id))
+    return result.scalars().first()
 
 
 # Function to create a new contact for a given user
-async def create_contact(body: ContactModel, db: Session,user:User) -> Contact:
+async def create_contact(body: ContactModel, db: AsyncSession,user:User) -> Contact:
     """
     Creates a new contact for a given user.
 
+    The row is inserted with INSERT ... RETURNING, so the generated id comes back
+    in the same round-trip.
+
     Args:
         body (ContactModel): The contact data to create.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
         user (User): The user for whom to create the contact.
 
     Returns:
         Contact: The created Contact object.
     """
-    tag = Contact(user_id=user.id,first_name=body.first_name,last_name=body.last_name,email=body.email,phone_number=body.phone_number,birthday=body.birthday,additional_data=body.additional_data)
-    db.add(tag)
-    db.commit()
-    db.refresh(tag)
+    result = await db.execute(insert(Contact).values(user_id=user.id,first_name=body.first_name,last_name=body.last_name,email=body.email,phone_number=body.phone_number,birthday=body.birthday,birthday_md=_month_day(body.birthday),additional_data=body.additional_data).returning(Contact))
+    tag = result.scalars().one()
+    await db.commit()
     return tag
 
 
+# The number of row errors kept in an import report; further errors are only counted
+IMPORT_ERROR_LIMIT = 1000
+
+
+def _insert_ignoring_conflicts(db: AsyncSession):
+    """
+    Builds an INSERT into contacts that skips rows violating a unique constraint.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy async database session.
+
+    Returns:
+        Insert: The statement, returning the email of every inserted row.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(Contact.__table__).on_conflict_do_nothing().returning(Contact.__table__.c.email)
+
+
+async def _insert_chunk(chunk: List[Tuple[int, dict]], db: AsyncSession) -> List[int]:
+    """
+    Inserts a chunk of validated contact rows in one batched statement and commits.
+
+    Args:
+        chunk (List[Tuple[int, dict]]): The (row number, values) pairs to insert.
+        db (AsyncSession): The SQLAlchemy async database session.
+
+    Returns:
+        List[int]: The numbers of the rows skipped because their email or phone number already exists.
+    """
+    result = await db.execute(_insert_ignoring_conflicts(db), [values for _, values in chunk])
+    inserted = set(result.scalars().all())
+    await db.commit()
+    return [number for number, values in chunk if values["email"] not in inserted]
+
+
+# Function to import many contacts for a given user
+async def import_contacts(rows: AsyncIterable[Tuple[int, dict | None]], user: User, db: AsyncSession, chunk_size: int = 1000) -> dict:
+    """
+    Validates and inserts contacts for a given user in chunks.
+
+    Rows are consumed lazily and validated with ContactModel. Every chunk is inserted with a
+    single batched INSERT ... ON CONFLICT DO NOTHING and committed, so memory use does not grow
+    with the number of rows. Rows whose email or phone number is already taken are reported as errors.
+
+    Args:
+        rows (AsyncIterable[Tuple[int, dict | None]]): The (row number, values) pairs to import; None values mark unreadable rows.
+        user (User): The user for whom to create the contacts.
+        db (AsyncSession): The SQLAlchemy async database session.
+        chunk_size (int, optional): The number of rows per INSERT. Defaults to 1000.
+
+    Returns:
+        dict: The number of inserted and failed rows and the first IMPORT_ERROR_LIMIT row errors.
+    """
+    report = {"inserted": 0, "failed": 0, "errors": []}
+
+    def fail(number: int, detail: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < IMPORT_ERROR_LIMIT:
+            report["errors"].append({"row": number, "detail": detail})
+
+    chunk = []
+    emails, phones = set(), set()
+
+    async def flush() -> None:
+        conflicts = await _insert_chunk(chunk, db)
+        report["inserted"] += len(chunk) - len(conflicts)
+        for number in conflicts:
+            fail(number, "Contact with this email or phone number already exists")
+        chunk.clear()
+        emails.clear()
+        phones.clear()
+
+    async for number, row in rows:
+        if row is None:
+            fail(number, "Unreadable row")
+            continue
+        try:
+            body = ContactModel(**row)
+        except ValidationError as err:
+            fail(number, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in err.errors()))
+            continue
+        if body.email in emails or body.phone_number in phones:
+            fail(number, "Duplicate email or phone number in the same batch")
+            continue
+        emails.add(body.email)
+        phones.add(body.phone_number)
+        chunk.append((number, {"user_id": user.id, "first_name": body.first_name, "last_name": body.last_name, "email": body.email, "phone_number": body.phone_number, "birthday": body.birthday, "birthday_md": _month_day(body.birthday), "additional_data": body.additional_data}))
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return report
+
+
 # Function to update an existing contact for a given user
-async def update_contact(tag_id: int, body: ContactModel, db: Session,user:User) -> Contact | None:
+async def update_contact(tag_id: int, body: ContactModel, db: AsyncSession,user:User) -> Contact | None:
     """
     Updates an existing contact for a given user.
 
+    A single UPDATE ... RETURNING both changes the row and reads it back.
+
     Args:
         tag_id (int): The ID of the contact to update.
         body (ContactModel): The updated contact data.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
         user (User): The user for whom to update the contact.
 
     Returns:
         Contact | None: The updated Contact object, or None if the contact was not found.
     """
-    tag = db.query(Contact).filter(Contact.id == tag_id,Contact.user_id==user.id).first()
-    if tag:
-        tag.first_name = body.first_name
-        tag.last_name=body.last_name
-        tag.email=body.email
-        tag.phone_number=body.phone_number
-        tag.birthday=body.birthday
-        tag.additional_data=body.additional_data
-        db.commit()
+    result = await db.execute(update(Contact).filter(Contact.id == tag_id,Contact.user_id==user.id).values(first_name=body.first_name,last_name=body.last_name,email=body.email,phone_number=body.phone_number,birthday=body.birthday,birthday_md=_month_day(body.birthday),additional_data=body.additional_data).returning(Contact))
+    tag = result.scalars().first()
+    await db.commit()
     return tag
 
 
 # Function to remove a contact for a given user
-async def remove_contact(tag_id: int, db: Session,user:User)  -> Contact | None:
+async def remove_contact(tag_id: int, db: AsyncSession,user:User)  -> Contact | None:
     """
     Removes a contact for a given user.
 
+    A single DELETE ... RETURNING both removes the row and returns it.
+
     Args:
         tag_id (int): The ID of the contact to remove.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
         user (User): The user for whom to remove the contact.
 
     Returns:
         Contact | None: The removed Contact object, or None if the contact was not found.
     """
-    tag = db.query(Contact).filter(Contact.id == tag_id,Contact.user_id==user.id).first()
-    if tag:
-        db.delete(tag)
-        db.commit()
+    result = await db.execute(delete(Contact).filter(Contact.id == tag_id,Contact.user_id==user.id).returning(Contact))
+    tag = result.scalars().first()
+    await db.commit()
     return tag
 
 
+# Operators accepted by the filter builder, selected by the suffix of a criterion name (e.g. birthday__gte)
+FILTER_OPERATORS = {
+    "eq": lambda column, value: column == value,
+    "ne": lambda column, value: column != value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "like": lambda column, value: column.like(value),
+    "ilike": lambda column, value: column.ilike(value),
+    "in": lambda column, value: column.in_(value),
+}
+
+# Contact columns that can be filtered and sorted on
+FILTER_FIELDS = ("id", "first_name", "last_name", "email", "phone_number", "birthday", "birthday_md", "additional_data")
+
+
+def _coerce(field: str, value: Any) -> Any:
+    """
+    Checks a criterion value against the type of its field, converting ISO date strings to
+    dates and numeric strings to integers.
+
+    Args:
+        field (str): The contact field the value is compared with.
+        value (Any): The value, e.g. decoded from JSON.
+
+    Returns:
+        Any: The value to bind.
+
+    Raises:
+        ValueError: If the value is not a scalar of the field's type, or a date string is malformed.
+    """
+    python_type = getattr(Contact, field).type.python_type
+    if python_type is datetime.date:
+        if isinstance(value, str):
+            return datetime.date.fromisoformat(value)
+        if isinstance(value, datetime.date):
+            return value
+    elif python_type is int:
+        if isinstance(value, str):
+            return int(value)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif isinstance(value, python_type):
+        return value
+    raise ValueError(f"Invalid value for {field}: {value!r}")
+
+
+def _parse_criteria(criteria: Dict[str, Any]) -> Tuple[Tuple[Tuple[str, str], ...], Dict[str, Any]]:
+    """
+    Splits filter criteria into their shape and their values.
+
+    A criterion is named after a contact field, optionally followed by __ and an operator
+    from FILTER_OPERATORS (eq when omitted). Criteria whose value is None or empty are ignored.
+
+    Args:
+        criteria (Dict[str, Any]): The criteria, e.g. {"last_name": "Doe", "birthday__gte": date(1990, 1, 1)}.
+
+    Returns:
+        Tuple[Tuple[Tuple[str, str], ...], Dict[str, Any]]: The sorted (field, operator) pairs and the
+        bind parameter values keyed by "field__operator".
+
+    Raises:
+        ValueError: If a criterion names an unknown field or operator, an __in criterion is not
+        given a list, or a value does not match the type of its field.
+    """
+    shape = []
+    params = {}
+    for name, value in criteria.items():
+        if value is None or value == "":
+            continue
+        field, _, op = name.partition("__")
+        op = op or "eq"
+        if field not in FILTER_FIELDS or op not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter: {name}")
+        if op == "in":
+            if not isinstance(value, (list, tuple)):
+                raise ValueError(f"{name} requires a list of values")
+            value = [_coerce(field, item) for item in value]
+        else:
+            value = _coerce(field, value)
+        shape.append((field, op))
+        params[f"{field}__{op}"] = value
+    return tuple(sorted(shape)), params
+
+
+@functools.lru_cache(maxsize=256)
+def _filter_clauses(shape: Tuple[Tuple[str, str], ...]) -> tuple:
+    """
+    Builds the WHERE clauses for a filter shape, with bind parameters in place of the values.
+
+    The clauses are always scoped by the owner_id bind parameter. They are cached per shape, so
+    repeated searches reuse the same statement objects and hit SQLAlchemy's compiled cache.
+
+    Args:
+        shape (Tuple[Tuple[str, str], ...]): The (field, operator) pairs returned by _parse_criteria.
+
+    Returns:
+        tuple: The SQL expressions to combine with AND.
+    """
+    clauses = [Contact.user_id == bindparam("owner_id")]
+    for field, op in shape:
+        value = bindparam(f"{field}__{op}", expanding=op == "in")
+        clauses.append(FILTER_OPERATORS[op](getattr(Contact, field), value))
+    return tuple(clauses)
+
+
+@functools.lru_cache(maxsize=256)
+def _search_statement(shape: Tuple[Tuple[str, str], ...], order_by: Tuple[str, ...]):
+    """
+    Builds and caches the SELECT statement for a filter shape and sort order.
+
+    Args:
+        shape (Tuple[Tuple[str, str], ...]): The (field, operator) pairs returned by _parse_criteria.
+        order_by (Tuple[str, ...]): Field names to sort by, prefixed with - for descending order.
+
+    Returns:
+        Select: The statement, to be executed with the bind parameter values.
+
+    Raises:
+        ValueError: If a sort field is unknown.
+    """
+    query = select(Contact).filter(*_filter_clauses(shape))
+    for name in order_by:
+        field = name.lstrip("-")
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported sort field: {name}")
+        column = getattr(Contact, field)
+        query = query.order_by(column.desc() if name.startswith("-") else column)
+    return query.order_by(Contact.id)
+
+
 # Function to search for contacts based on various criteria for a given user
-async def search_contacts(db: Session,user:User, first_name: str = None, last_name: str = None, email: str = None):
+async def search_contacts(db: AsyncSession,user:User, first_name: str = None, last_name: str = None, email: str = None, order_by: Sequence[str] = (), **criteria):
     """
     Searches for contacts based on various criteria for a given user.
 
+    Any subset of criteria can be combined; see _parse_criteria for their naming.
+
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
         user (User): The user for whom to search the contacts.
         first_name (str, optional): The first name to search for.
         last_name (str, optional): The last name to search for.
         email (str, optional): The email to search for.
+        order_by (Sequence[str], optional): Field names to sort by, prefixed with - for descending order.
+        **criteria: Additional criteria, e.g. phone_number=12345 or birthday__gte=date(1990, 1, 1).
 
     Returns:
-        List[Contact] | None: A list of Contact objects matching the search criteria, or None if no contacts were found.
+        List[Contact] | None: A list of Contact objects matching the search criteria, or None if no criteria were given.
+
+    Raises:
+        ValueError: If a criterion or sort field is not supported.
+    """
+    shape, params = _parse_criteria({"first_name": first_name, "last_name": last_name, "email": email, **criteria})
+    if not shape:
+        return None
+    params["owner_id"] = user.id
+    result = await db.execute(_search_statement(shape, tuple(order_by)), params)
+    return result.scalars().all()
+
+
+def _batch_clauses(user: User, ids: Sequence[int] | None, criteria: Dict[str, Any] | None) -> Tuple[tuple, Dict[str, Any]]:
+    """
+    Builds the WHERE clauses selecting the contacts of a bulk operation.
+
+    Args:
+        user (User): The user who owns the contacts.
+        ids (Sequence[int] | None): The IDs of the contacts.
+        criteria (Dict[str, Any] | None): Search criteria, as accepted by search_contacts.
+
+    Returns:
+        Tuple[tuple, Dict[str, Any]]: The clauses and their bind parameter values.
+
+    Raises:
+        ValueError: If neither ids nor criteria select anything, or a criterion is not supported.
     """
-    if first_name and last_name and email:
-        return db.query(Contact).filter(Contact.first_name == first_name,Contact.last_name == last_name,Contact.email == email,Contact.user_id==user.id).all()
-    elif first_name and last_name:
-        return db.query(Contact).filter(Contact.first_name == first_name,Contact.last_name == last_name,Contact.user_id==user.id).all()
-    elif last_name and email:
-        return db.query(Contact).filter(Contact.last_name == last_name,Contact.email == email,Contact.user_id==user.id).all()
-    elif first_name and email:
-        return db.query(Contact).filter(Contact.first_name == first_name,Contact.email == email,Contact.user_id==user.id).all()
-    elif first_name:
-        return db.query(Contact).filter(Contact.first_name == first_name,Contact.user_id==user.id).all()
-    elif last_name:
-        return db.query(Contact).filter(Contact.last_name == last_name,Contact.user_id==user.id).all()
-    elif email:
-        return db.query(Contact).filter(Contact.email == email,Contact.user_id==user.id).all()
-    return None
+    shape, params = _parse_criteria(dict(criteria or {}))
+    if ids:
+        shape = tuple(sorted(shape + (("id", "in"),)))
+        params["id__in"] = list(ids)
+    if not shape:
+        raise ValueError("ids or filter is required")
+    params["owner_id"] = user.id
+    return _filter_clauses(shape), params
 
 
-# Function to retrieve a list of contacts with birthdays within the next 7 days for a given user
-async def birthdays(db: Session,user:User):
+# Function to update many contacts of a given user at once
+async def update_contacts(patch: Dict[str, Any], user: User, db: AsyncSession, ids: Sequence[int] | None = None, criteria: Dict[str, Any] | None = None) -> List[int]:
     """
-    Retrieves a list of contacts with birthdays within the next 7 days for a given user.
+    Applies the same changes to every contact of a given user selected by ids and/or criteria.
+
+    The contacts are changed by one set-based UPDATE ... RETURNING in a single transaction.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        patch (Dict[str, Any]): The new field values.
+        user (User): The user who owns the contacts.
+        db (AsyncSession): The SQLAlchemy async database session.
+        ids (Sequence[int] | None, optional): The IDs of the contacts to update.
+        criteria (Dict[str, Any] | None, optional): Search criteria, as accepted by search_contacts.
+
+    Returns:
+        List[int]: The IDs of the updated contacts.
+
+    Raises:
+        ValueError: If no contacts are selected, or a criterion is not supported.
+    """
+    clauses, params = _batch_clauses(user, ids, criteria)
+    values = dict(patch)
+    if values.get("birthday"):
+        values["birthday_md"] = _month_day(values["birthday"])
+    if not values:
+        result = await db.execute(select(Contact.id).filter(*clauses), params)
+        return result.scalars().all()
+    query = update(Contact).filter(*clauses).values(**values).returning(Contact.id).execution_options(synchronize_session=False)
+    result = await db.execute(query, params)
+    updated = result.scalars().all()
+    await db.commit()
+    return updated
+
+
+# Function to remove many contacts of a given user at once
+async def remove_contacts(user: User, db: AsyncSession, ids: Sequence[int] | None = None, criteria: Dict[str, Any] | None = None) -> List[int]:
+    """
+    Removes every contact of a given user selected by ids and/or criteria.
+
+    The contacts are removed by one set-based DELETE ... RETURNING in a single transaction.
+
+    Args:
+        user (User): The user who owns the contacts.
+        db (AsyncSession): The SQLAlchemy async database session.
+        ids (Sequence[int] | None, optional): The IDs of the contacts to remove.
+        criteria (Dict[str, Any] | None, optional): Search criteria, as accepted by search_contacts.
+
+    Returns:
+        List[int]: The IDs of the removed contacts.
+
+    Raises:
+        ValueError: If no contacts are selected, or a criterion is not supported.
+    """
+    clauses, params = _batch_clauses(user, ids, criteria)
+    query = delete(Contact).filter(*clauses).returning(Contact.id).execution_options(synchronize_session=False)
+    result = await db.execute(query, params)
+    removed = result.scalars().all()
+    await db.commit()
+    return removed
+
+
+def _month_day(birthday: datetime.date) -> int:
+    """
+    Packs the month and day of a date into a sortable integer, e.g. March 7 becomes 307.
+
+    Args:
+        birthday (datetime.date): The date to pack.
+
+    Returns:
+        int: month * 100 + day.
+    """
+    return birthday.month * 100 + birthday.day
+
+
+def _birthday_window(today: datetime.date, days: int) -> Tuple[int, int]:
+    """
+    Computes the month-day bounds of the birthday window starting today.
+
+    The window wraps around the new year when the end bound is smaller than the start bound.
+    In non-leap years contacts born on February 29 celebrate on February 28, so a window
+    ending on February 28 is widened to include them.
+
+    Args:
+        today (datetime.date): The first day of the window.
+        days (int): The number of days after today included in the window.
+
+    Returns:
+        Tuple[int, int]: The inclusive (start, end) month-day bounds.
+    """
+    end_date = today + datetime.timedelta(days=days)
+    start, end = _month_day(today), _month_day(end_date)
+    if end == 228 and not calendar.isleap(end_date.year):
+        end = 229
+    return start, end
+
+
+# Function to retrieve a chunk of the contacts born on a given day, across all users
+async def birthdays_chunk(today: datetime.date, db: AsyncSession, after: Tuple[int, int] = (0, 0), limit: int = 5000) -> List[Row]:
+    """
+    Retrieves the next chunk of the contacts of confirmed users whose birthday is today.
+
+    Rows come in (user_id, id) order and the next chunk starts after the last row of the
+    previous one, so every chunk is a seek on the (birthday_md, user_id, id) index however
+    far the scan has gone. In non-leap years contacts born on February 29 are included on
+    February 28.
+
+    Args:
+        today (datetime.date): The day of the birthdays.
+        db (AsyncSession): The SQLAlchemy async database session.
+        after (Tuple[int, int], optional): The (user_id, id) of the last row of the previous chunk. Defaults to (0, 0).
+        limit (int, optional): The maximum number of rows to return. Defaults to 5000.
+
+    Returns:
+        List[Row]: The contact id, user_id, first_name, last_name and birthday, with the email
+        and username of the owner as user_email and username.
+    """
+    start, end = _birthday_window(today, 0)
+    query = (
+        select(Contact.id, Contact.user_id, Contact.first_name, Contact.last_name, Contact.birthday, User.email.label("user_email"), User.username)
+        .join(User, User.id == Contact.user_id)
+        .filter(Contact.birthday_md == start if start == end else Contact.birthday_md.in_([start, end]))
+        .filter(User.confirmed.is_(True), tuple_(Contact.user_id, Contact.id) > after)
+        .order_by(Contact.user_id, Contact.id)
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    return result.all()
+
+
+# Function to search contacts by a free-text query for a given user
+async def find_contacts_fuzzy(q: str, user: User, db: AsyncSession, limit: int = 20) -> List[Contact]:
+    """
+    Searches contacts whose first name, last name or email start with the query or resemble it.
+
+    On Postgres the query is matched case-insensitively by prefix and by trigram similarity
+    (the pg_trgm % operator, backed by GIN indexes), and ranked with prefix matches first, then
+    by similarity. Other databases fall back to case-insensitive prefix matching.
+
+    Args:
+        q (str): The text to search for.
+        user (User): The user for whom to search the contacts.
+        db (AsyncSession): The SQLAlchemy async database session.
+        limit (int, optional): The maximum number of contacts to return. Defaults to 20.
+
+    Returns:
+        List[Contact]: The matching contacts, most relevant first, or none for a blank query.
+    """
+    term = q.strip().lower()
+    if not term:
+        # A blank query would become the pattern "%" and match every contact
+        return []
+    pattern = term.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+    fields = (func.lower(Contact.first_name), func.lower(Contact.last_name), func.lower(Contact.email))
+    is_prefix = or_(*(field.like(pattern, escape="/") for field in fields))
+    query = select(Contact).filter(Contact.user_id==user.id)
+    if db.get_bind().dialect.name == "postgresql":
+        similarity = func.greatest(*(func.similarity(field, term) for field in fields))
+        query = query.filter(or_(is_prefix, *(field.op("%")(term) for field in fields)))
+        query = query.order_by(is_prefix.desc(), similarity.desc(), Contact.id)
+    else:
+        query = query.filter(is_prefix).order_by(Contact.last_name, Contact.first_name, Contact.id)
+    result = await db.execute(query.limit(limit))
+    return result.scalars().all()
+
+
+# Function to retrieve a list of contacts with birthdays within the next days for a given user
+async def birthdays(db: AsyncSession,user:User,days: int = 7):
+    """
+    Retrieves a list of contacts with birthdays within the next days for a given user.
+
+    The window is matched in SQL against the indexed birthday_md column, so only the matching
+    contacts are loaded. They are ordered by how soon their birthday comes.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy async database session.
         user (User): The user for whom to retrieve the contacts.
+        days (int, optional): The number of days after today to look ahead. Defaults to 7.
 
     Returns:
-        List[Contact]: A list of Contact objects with birthdays within the next 7 days.
+        List[Contact]: A list of Contact objects with birthdays within the window.
     """
-    contacts=db.query(Contact).filter(Contact.user_id==user.id).all()
-    congratulation_list=[]
-    today_date=datetime.datetime.today().date()
-    today_year=today_date.year
-    today_year_string=str(today_year)
-    for contact in contacts:
-        birthday_noyear_string=(contact.birthday).strftime("%m.%d")
-        birthday_this_year_string=today_year_string+"."+birthday_noyear_string
-        birthday_this_year=datetime.datetime.strptime(birthday_this_year_string,"%Y.%m.%d").date()
-        difference=birthday_this_year-today_date
-        if difference.days<0:
-            continue
-        elif difference.days>7:
-            continue
+    start, end = _birthday_window(datetime.date.today(), days)
+    query = select(Contact).filter(Contact.user_id==user.id, Contact.birthday_md.isnot(None))
+    if days < 365:
+        if start <= end:
+            query = query.filter(Contact.birthday_md.between(start, end))
         else:
-            congratulation_list.append(contact)
-    return congratulation_list
\ No newline at end of file
+            query = query.filter(or_(Contact.birthday_md >= start, Contact.birthday_md <= end))
+    query = query.order_by(Contact.birthday_md < start, Contact.birthday_md)
+    result = await db.execute(query)
+    return result.scalars().all()
@@ -1,33 +1,53 @@
+import redis.asyncio as redis
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserModel
+from src.services.cache import user_cache
 
 
 # Function to get a user by their email address
-async def get_user_by_email(email: str, db: Session) -> User:
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
     """
     Retrieves a user from the database based on their email address.
 
     Args:
         email (str): The email address of the user to retrieve.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
 
     Returns:
         User: The user object, or None if the user is not found.
     """
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+
+# Function to get a user by their id
+async def get_user_by_id(user_id: int, db: AsyncSession) -> User:
+    """
+    Retrieves a user from the database based on their id.
+
+    Args:
+        user_id (int): The id of the user to retrieve.
+        db (AsyncSession): The SQLAlchemy async database session.
+
+    Returns:
+        User: The user object, or None if the user is not found.
+    """
+    result = await db.execute(select(User).filter(User.id == user_id))
+    return result.scalars().first()
 
 
 # Function to create a new user
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     Creates a new user in the database.
 
     Args:
         body (UserModel): The user data to be used for creating the new user.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
 
     Returns:
         User: The newly created user object.
@@ -40,54 +60,73 @@ async def create_user(body: UserModel, db: Session) -> User:
         print(e)
     new_user = User(email=body.email,username=body.username,password=body.password,avatar=avatar)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-# Function to update a user's refresh token
-async def update_token(user: User, token: str | None, db: Session) -> None:
+# Function to replace a user's password hash
+async def update_password(user: User, hashed_password: str, db: AsyncSession) -> None:
     """
-    Updates the refresh token for a user.
+    Updates the stored password hash for a user, e.g. after a rehash with a new bcrypt cost.
 
     Args:
         user (User): The user object to update.
-        token (str | None): The new refresh token value, or None to clear the token.
-        db (Session): The SQLAlchemy database session.
+        hashed_password (str): The new password hash.
+        db (AsyncSession): The SQLAlchemy async database session.
     """
-    user.refresh_token = token
-    db.commit()
+    user.password = hashed_password
+    await db.commit()
+
+
+# Function to write a changed user through to the user cache
+async def _refresh_cache(user: User) -> None:
+    """
+    Writes a changed user through to the user cache once the change is committed.
+
+    If Redis is unavailable the change stays committed and only the local copy is dropped,
+    so this worker reads the user from the database.
+
+    Args:
+        user (User): The changed user.
+    """
+    try:
+        await user_cache.refresh(user)
+    except redis.RedisError:
+        user_cache.local.pop(user.email)
 
 
 # Function to mark a user's email as confirmed
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
-    Marks a user's email as confirmed in the database.
+    Marks a user's email as confirmed in the database and writes the change through to the user cache.
 
     Args:
         email (str): The email address of the user to confirm.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await _refresh_cache(user)
 
 
 # Function to update a user's avatar
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
-    Updates a user's avatar image in the database.
+    Updates a user's avatar image in the database and writes the change through to the user cache.
 
     Args:
         email (str): The email address of the user to update.
         url (str): The URL of the new avatar image.
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy async database session.
 
     Returns:
         User: The updated user object.
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await _refresh_cache(user)
     return user
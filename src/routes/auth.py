@@ -1,15 +1,18 @@
 from typing import List
 
+import redis.asyncio as redis
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.services.email import send_email
+from src.services.circuit import route_name
+from src.services.email import enqueue_email
+from src.services.jobs import job_queue
 
 
 # Create an APIRouter instance with the prefix '/auth' and the tag 'auth'
@@ -19,16 +22,35 @@ router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
+# Function to queue a confirmation email for the job workers
+async def queue_confirmation_email(email: str, username: str, host: str, background_tasks: BackgroundTasks):
+    """
+    Queue a confirmation email in the job queue, so that a worker process sends it.
+
+    If Redis is unavailable, the email is queued in the mailer of this process after the response instead.
+
+    Args:
+        email (str): The email address to send the email to.
+        username (str): The username of the user.
+        host (str): The host URL of the application.
+        background_tasks (BackgroundTasks): The background tasks of the current request.
+    """
+    try:
+        await job_queue.enqueue("emails", "send_email", email=email, username=username, host=host)
+    except redis.RedisError:
+        background_tasks.add_task(enqueue_email, email, username, host)
+
+
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Sign up a new user.
 
     Args:
         body (UserModel): The user data to be registered.
-        background_tasks (BackgroundTasks): A FastAPI dependency to run tasks in the background.
+        background_tasks (BackgroundTasks): A FastAPI dependency to send the email if the job queue is unavailable.
         request (Request): The current HTTP request.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         UserResponse: The response containing the newly created user and a success message.
@@ -39,24 +61,25 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     
     # Hash the password
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
 
     # Create a new user
     new_user = await repository_users.create_user(body, db)
 
-    # Send a confirmation email in the background
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    # Queue a confirmation email for the job workers
+    await queue_confirmation_email(new_user.email, new_user.username, str(request.base_url), background_tasks)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Log in a user and generate access and refresh tokens.
 
     Args:
+        request (Request): The current HTTP request, selecting the Redis failure policy.
         body (OAuth2PasswordRequestForm): The login credentials.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         TokenModel: The response containing the access and refresh tokens.
@@ -71,60 +94,63 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
     
     # Verify the password
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
 
-    # Generate access and refresh tokens
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
+    # Rehash the password if the bcrypt cost has changed
+    if new_hash:
+        await repository_users.update_password(user, new_hash, db)
 
-    # Update the user's refresh token
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    # Generate access and refresh tokens, starting a new refresh token family
+    return await auth_service.create_session_tokens(user, route_name(request))
 
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(request: Request, credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     Refresh the access token using the refresh token.
 
+    The refresh token family is rotated in Redis, so refreshing only reads the user from the database.
+    Reusing a refresh token that was already exchanged revokes its whole family.
+
     Args:
+        request (Request): The current HTTP request, selecting the Redis failure policy.
         credentials (HTTPAuthorizationCredentials): The authorization credentials.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         TokenModel: The response containing the new access and refresh tokens.
     """
-    # Get the refresh token from the credentials
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    
-    # Get the user by email
-    user = await repository_users.get_user_by_email(email, db)
+    # Exchange the refresh token for new access and refresh tokens
+    return await auth_service.rotate_refresh_token(credentials.credentials, db, route_name(request))
 
-    # Verify the refresh token
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
-    
-    # Generate new access and refresh tokens
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
 
-    # Update the user's refresh token
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+@router.post('/logout')
+async def logout(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Log out a user by revoking their access token and its refresh token family.
+
+    Args:
+        credentials (HTTPAuthorizationCredentials): The authorization credentials holding the access token.
+
+    Returns:
+        dict: A message indicating that the user has been logged out.
+    """
+    # Revoke the access token on every worker, along with its refresh tokens
+    await auth_service.revoke_access_token(credentials.credentials)
+    return {"message": "Logged out"}
 
 
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     Confirm the user's email using the provided token.
 
     Args:
         token (str): The token used to confirm the email.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         dict: A message indicating the email confirmation status.
@@ -147,15 +173,15 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,db: AsyncSession = Depends(get_db)):
     """
     Request a confirmation email to be sent to the user.
 
     Args:
         body (RequestEmail): The email to be confirmed.
-        background_tasks (BackgroundTasks): A FastAPI dependency to run tasks in the background.
+        background_tasks (BackgroundTasks): A FastAPI dependency to send the email if the job queue is unavailable.
         request (Request): The current HTTP request.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         dict: A message indicating that the confirmation email has been sent.
@@ -167,7 +193,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     
-    # Send the confirmation email in the background
+    # Queue the confirmation email for the job workers
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        await queue_confirmation_email(user.email, user.username, str(request.base_url), background_tasks)
     return {"message": "Check your email for confirmation."}
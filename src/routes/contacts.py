@@ -1,53 +1,105 @@
-from typing import List
+from datetime import date
+from typing import List, Union
 
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Query, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
-from src.database.models import User
-from src.schemas import ContactModel,ContactResponse
+from src.database.db import get_db, get_session_factory
+from src.schemas import ContactModel,ContactResponse,ContactPage,ContactImportResponse,ContactBatchUpdate,ContactBatchDelete,ContactBatchResponse
 from src.repository import contacts as repository_contacts
-from src.services.auth import auth_service
+from src.services.auth import auth_service, Principal
+from src.services import contacts_io
+from src.services.limiter import limits, rate_limit
+from src.conf.config import settings
 
 # Create an APIRouter instance for contacts
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
 
 # Define a GET endpoint to read all contacts
-# This endpoint is rate-limited to 10 requests per minute
-@router.get("/", response_model=List[ContactResponse],description='No more than 10 requests per minute',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.get("/", response_model=Union[List[ContactResponse],ContactPage],description=limits.get('read_contacts').describe(),dependencies=[Depends(rate_limit('read_contacts'))])
+async def read_contacts(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), cursor: str = None, db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Retrieve a list of contacts.
 
+    Without a cursor the contacts are paginated with skip/limit and returned as a plain list.
+    Passing a cursor (an empty one for the first page) switches to keyset pagination ordered by
+    last name, first name and id: the response is a page with a next_cursor to pass to the next call.
+
     Args:
         skip (int, optional): The number of contacts to skip. Defaults to 0.
-        limit (int, optional): The maximum number of contacts to return. Defaults to 100.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        limit (int, optional): The maximum number of contacts to return, from 1 to 1000. Defaults to 100.
+        cursor (str, optional): The cursor returned with the previous page. Defaults to None.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
-        List[ContactResponse]: A list of contact responses.
+        List[ContactResponse] | ContactPage: A list of contact responses, or a page of them in cursor mode.
 
     Raises:
-        HTTPException: If an error occurs.
+        HTTPException: If the cursor is invalid.
     """
+    if cursor is not None:
+        try:
+            tags, next_cursor = await repository_contacts.get_contacts_page(limit,current_user,db,cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        return {"items": tags, "next_cursor": next_cursor}
     tags = await repository_contacts.get_contacts(skip, limit,current_user,db)
     return tags
 
 
+# Define a GET endpoint to export all contacts
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.get("/export",response_class=StreamingResponse,description=limits.get('export_contacts').describe(),dependencies=[Depends(rate_limit('export_contacts'))])
+async def export_contacts(format: str = Query("ndjson", pattern="^(ndjson|csv|vcard)$"), session_factory = Depends(get_session_factory),current_user:Principal=Depends(auth_service.current_principal)):
+    """
+    Export all contacts as NDJSON, CSV or vCard.
+
+    The contacts are streamed from a server-side cursor straight into the response, so the first
+    bytes are sent right away and memory use does not depend on the number of contacts.
+
+    Args:
+        format (str, optional): "ndjson", "csv" or "vcard". Defaults to "ndjson".
+        session_factory (async_sessionmaker, optional): Opens the session used while streaming. Defaults to Depends(get_session_factory).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
+
+    Returns:
+        StreamingResponse: The exported contacts.
+    """
+    media_type, header, formatter = contacts_io.EXPORT_FORMATS[format]
+
+    async def body():
+        if header:
+            yield header()
+        buffer = []
+        async with session_factory() as db:
+            async for contact in repository_contacts.stream_contacts(current_user,db):
+                buffer.append(formatter(contact))
+                if len(buffer) >= 500:
+                    yield b"".join(buffer)
+                    buffer.clear()
+        if buffer:
+            yield b"".join(buffer)
+
+    extension = "vcf" if format == "vcard" else format
+    return StreamingResponse(body(),media_type=media_type,headers={"Content-Disposition": f'attachment; filename="contacts.{extension}"'})
+
+
 # Define a GET endpoint to read a specific contact by ID
-# This endpoint is rate-limited to 10 requests per minute
-@router.get("/{tag_id}", response_model=ContactResponse,description='No more than 10 requests per minute',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def read_contact(tag_id: int, db: Session = Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.get("/{tag_id}", response_model=ContactResponse,description=limits.get('read_contact').describe(),dependencies=[Depends(rate_limit('read_contact'))])
+async def read_contact(tag_id: int, db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Retrieve a specific contact by ID.
 
     Args:
         tag_id (int): The ID of the contact to retrieve.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
         ContactResponse: The contact response.
@@ -61,16 +113,16 @@ async def read_contact(tag_id: int, db: Session = Depends(get_db),current_user:U
     return tag
 
 # Define a POST endpoint to create a new contact
-# This endpoint is rate-limited to 2 requests per minute
-@router.post("/", response_model=ContactResponse,description='No more than 2 requests per minute',dependencies=[Depends(RateLimiter(times=2, seconds=60))])
-async def create_contact(body: ContactModel,db: Session = Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.post("/", response_model=ContactResponse,description=limits.get('create_contact').describe(),dependencies=[Depends(rate_limit('create_contact'))])
+async def create_contact(body: ContactModel,db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Create a new contact.
 
     Args:
         body (ContactModel): The contact data to create.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
         ContactResponse: The created contact response.
@@ -81,18 +133,105 @@ async def create_contact(body: ContactModel,db: Session = Depends(get_db),curren
     return await repository_contacts.create_contact(body,db,current_user)
 
 
+# Define a POST endpoint to import contacts from a CSV or NDJSON file
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.post("/import", response_model=ContactImportResponse,description=limits.get('import_contacts').describe(),dependencies=[Depends(rate_limit('import_contacts'))])
+async def import_contacts(file: UploadFile = File(), format: str = Query(None, pattern="^(csv|ndjson)$"), db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
+    """
+    Import contacts from a CSV file with a header line or from an NDJSON file.
+
+    Rows are read from the uploaded file one at a time, validated and inserted in batches,
+    so the size of the file does not affect memory use. The file is read on the thread pool,
+    so large uploads spooled to disk do not block the event loop.
+
+    Args:
+        file (UploadFile): The file with the contacts to import.
+        format (str, optional): "csv" or "ndjson". Defaults to a guess from the file name and content type.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
+
+    Returns:
+        ContactImportResponse: The number of imported and rejected rows, and why rows were rejected.
+
+    Raises:
+        HTTPException: If the format of the file is unknown, or a CSV file is not valid UTF-8.
+    """
+    format = format or contacts_io.detect_format(file.filename, file.content_type)
+    if format is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown file format, use csv or ndjson")
+    if format == "csv":
+        # A CSV row cannot be told apart from the next once decoding fails, so reject the file before importing any of it
+        try:
+            await run_in_threadpool(contacts_io.check_utf8, file.file)
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    rows = contacts_io.iter_csv_rows(file.file) if format == "csv" else contacts_io.iter_ndjson_rows(file.file)
+    rows = contacts_io.iterate_in_threadpool(rows, settings.import_chunk_size)
+    return await repository_contacts.import_contacts(rows,current_user,db,settings.import_chunk_size)
+
+
+# Define a POST endpoint to update many contacts at once
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.post("/batch/update", response_model=ContactBatchResponse,description=limits.get('update_contacts').describe(),dependencies=[Depends(rate_limit('update_contacts'))])
+async def update_contacts(body: ContactBatchUpdate, db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
+    """
+    Apply the same changes to many contacts, selected by IDs and/or a filter.
+
+    Args:
+        body (ContactBatchUpdate): The contacts to update and the changes to apply.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
+
+    Returns:
+        ContactBatchResponse: The number and IDs of the updated contacts.
+
+    Raises:
+        HTTPException: If the filter is not supported.
+    """
+    try:
+        ids = await repository_contacts.update_contacts(body.patch.model_dump(exclude_none=True),current_user,db,body.ids,body.filter)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return {"count": len(ids), "ids": ids}
+
+
+# Define a POST endpoint to delete many contacts at once
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.post("/batch/delete", response_model=ContactBatchResponse,description=limits.get('remove_contacts').describe(),dependencies=[Depends(rate_limit('remove_contacts'))])
+async def remove_contacts(body: ContactBatchDelete, db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
+    """
+    Delete many contacts, selected by IDs and/or a filter.
+
+    Args:
+        body (ContactBatchDelete): The contacts to delete.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
+
+    Returns:
+        ContactBatchResponse: The number and IDs of the deleted contacts.
+
+    Raises:
+        HTTPException: If the filter is not supported.
+    """
+    try:
+        ids = await repository_contacts.remove_contacts(current_user,db,body.ids,body.filter)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return {"count": len(ids), "ids": ids}
+
+
 # Define a PUT endpoint to update an existing contact
-# This endpoint is rate-limited to 10 requests per minute
-@router.put("/{tag_id}", response_model=ContactResponse,description='No more than 10 requests per minute',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def update_contact(body: ContactModel, tag_id: int, db: Session = Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.put("/{tag_id}", response_model=ContactResponse,description=limits.get('update_contact').describe(),dependencies=[Depends(rate_limit('update_contact'))])
+async def update_contact(body: ContactModel, tag_id: int, db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Update an existing contact.
 
     Args:
         body (ContactModel): The contact data to update.
         tag_id (int): The ID of the contact to update.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
         ContactResponse: The updated contact response.
@@ -107,16 +246,16 @@ async def update_contact(body: ContactModel, tag_id: int, db: Session = Depends(
 
 
 # Define a DELETE endpoint to delete a contact
-# This endpoint is rate-limited to 10 requests per minute
-@router.delete("/{tag_id}", response_model=ContactResponse,description='No more than 10 requests per minute',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def remove_contact(tag_id: int, db: Session = Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.delete("/{tag_id}", response_model=ContactResponse,description=limits.get('remove_contact').describe(),dependencies=[Depends(rate_limit('remove_contact'))])
+async def remove_contact(tag_id: int, db: AsyncSession = Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Delete a contact.
 
     Args:
         tag_id (int): The ID of the contact to delete.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
         ContactResponse: The deleted contact response.
@@ -131,41 +270,57 @@ async def remove_contact(tag_id: int, db: Session = Depends(get_db),current_user
 
 
 # Define a GET endpoint to search for contacts
-# This endpoint is rate-limited to 10 requests per minute
-@router.get("/find/",response_model=List[ContactResponse],description='No more than 10 requests per minute',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def find_contacts(first_name:str=None,last_name:str=None,email:str=None,db:Session=Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.get("/find/",response_model=List[ContactResponse],description=limits.get('find_contacts').describe(),dependencies=[Depends(rate_limit('find_contacts'))])
+async def find_contacts(first_name:str=None,last_name:str=None,email:str=None,phone_number:int=None,birthday_from:date=None,birthday_to:date=None,sort:str=None,q:str=Query(None,min_length=1,max_length=125,pattern=r"\S"),limit:int=Query(20,ge=1,le=100),db:AsyncSession=Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Search for contacts by first name, last name, or email.
 
+    With q the search is fuzzy instead: contacts whose first name, last name or email start with
+    or resemble q are returned, most relevant first, and the exact-match parameters are ignored.
+
     Args:
         first_name (str, optional): The first name to search for. Defaults to None.
         last_name (str, optional): The last name to search for. Defaults to None.
         email (str, optional): The email to search for. Defaults to None.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        phone_number (int, optional): The phone number to search for. Defaults to None.
+        birthday_from (date, optional): The earliest birth date to include. Defaults to None.
+        birthday_to (date, optional): The latest birth date to include. Defaults to None.
+        sort (str, optional): Comma-separated fields to sort by, prefixed with - for descending order. Defaults to None.
+        q (str, optional): The free-text query for fuzzy search; it must not be blank. Defaults to None.
+        limit (int, optional): The maximum number of contacts returned by fuzzy search. Defaults to 20.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
         List[ContactResponse]: A list of contact responses matching the search criteria.
 
     Raises:
-        HTTPException: If no contacts are found.
+        HTTPException: If no search criteria are given or a sort field is not supported.
     """
-    result=await repository_contacts.search_contacts(db,current_user,first_name,last_name,email)
+    if q is not None:
+        return await repository_contacts.find_contacts_fuzzy(q,current_user,db,limit)
+    order_by=[name.strip() for name in sort.split(",") if name.strip()] if sort else []
+    try:
+        result=await repository_contacts.search_contacts(db,current_user,first_name,last_name,email,order_by=order_by,phone_number=phone_number,birthday__gte=birthday_from,birthday__lte=birthday_to)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,detail=str(err))
     if result is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Contact not found")
     return result
 
 
 # Define a GET endpoint to retrieve contacts with upcoming birthdays
-# This endpoint is rate-limited to 10 requests per minute
-@router.get("/birthday/",response_model=List[ContactResponse],description='No more than 10 requests per minute',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def birth_contacts(db:Session=Depends(get_db),current_user:User=Depends(auth_service.get_current_user)):
+# This endpoint is rate-limited per user, see Settings.rate_limits
+@router.get("/birthday/",response_model=List[ContactResponse],description=limits.get('birth_contacts').describe(),dependencies=[Depends(rate_limit('birth_contacts'))])
+async def birth_contacts(days:int=Query(7,ge=0,le=366),db:AsyncSession=Depends(get_db),current_user:Principal=Depends(auth_service.current_principal)):
     """
     Retrieve contacts with upcoming birthdays.
 
     Args:
-        db (Session, optional): The database session. Defaults to Depends(get_db).
-        current_user (User, optional): The currently authenticated user. Defaults to Depends(auth_service.get_current_user).
+        days (int, optional): The number of days after today to look ahead. Defaults to 7.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        current_user (Principal, optional): The currently authenticated user, from the token claims. Defaults to Depends(auth_service.current_principal).
 
     Returns:
         List[ContactResponse]: A list of contact responses with upcoming birthdays.
@@ -173,7 +328,7 @@ async def birth_contacts(db:Session=Depends(get_db),current_user:User=Depends(au
     Raises:
         HTTPException: If no contacts with upcoming birthdays are found.
     """
-    result=await repository_contacts.birthdays(db,current_user)
+    result=await repository_contacts.birthdays(db,current_user,days)
     if result is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Contact not found")
     return result
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Response
+
+from src.services.keys import key_ring
+
+
+# Create a router for the well-known endpoints, served without the API prefix
+router = APIRouter(prefix="/.well-known", tags=["jwks"])
+
+
+@router.get("/jwks.json")
+async def read_jwks(response: Response):
+    """
+    Publish the public keys that verify our tokens, so other services can check them locally.
+
+    Args:
+        response (Response): The response, used to let clients cache the key set.
+
+    Returns:
+        dict: The JSON Web Key Set, with one entry per kid.
+    """
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return key_ring.jwks()
@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import UploadFile
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import settings
+from src.services.storage import avatars
 from src.schemas import UserDb
 
 
@@ -29,32 +28,54 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return current_user
 
 
-@router.patch('/avatar', response_model=UserDb)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),db: Session = Depends(get_db)):
+# Describe the multipart body of the avatar upload, which the route parses itself
+AVATAR_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                },
+            },
+        },
+    },
+}
+
+
+@router.patch('/avatar', response_model=UserDb, openapi_extra=AVATAR_REQUEST_BODY)
+async def update_avatar_user(request: Request, current_user: User = Depends(auth_service.get_current_user),db: AsyncSession = Depends(get_db)):
     """
     Update the avatar of the current user.
 
+    The upload is read in chunks and must be a PNG, JPEG, GIF or WebP image of at most
+    settings.avatar_max_size bytes. An image stored before is not uploaded again.
+    The form is parsed only once the user is authenticated and the Content-Length of the
+    request fits the size limit, so oversized uploads are refused before they are received.
+
     Args:
-        file (UploadFile): The image file to be used as the new avatar.
+        request (Request): The upload request, a multipart form with the image as "file".
         current_user (User): The authenticated user, obtained from the auth_service.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         User: The updated user information with the new avatar URL.
     """
-    # Configure Cloudinary with the necessary credentials
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-    
-    # Upload the file to Cloudinary
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-
-    # Generate the URL for the uploaded image with specific dimensions
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}').build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    # Refuse oversized uploads before reading their body
+    avatars.check_content_length(request)
+
+    form = await request.form(max_files=1, max_fields=1)
+    try:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Avatar file is required")
+
+        # Store the image, off the event loop, and get its URL
+        src_url = await avatars.upload(file)
+    finally:
+        await form.close()
 
     # Update the user's avatar in the database
     user = await repository_users.update_avatar(current_user.email, src_url, db)
@@ -1,5 +1,7 @@
 from datetime import date,datetime
-from pydantic import BaseModel, Field,EmailStr
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field,EmailStr,model_validator
 
 
 class ContactModel(BaseModel):
@@ -56,6 +58,104 @@ class ContactResponse(BaseModel):
         orm_mode=True
 
 
+class ContactPage(BaseModel):
+    """
+    ContactPage represents one page of contacts returned by keyset pagination.
+    
+    Attributes:
+        items (List[ContactResponse]): The contacts of the page.
+        next_cursor (str): The opaque cursor for the next page, or None if this is the last page.
+    """
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class ContactImportError(BaseModel):
+    """
+    ContactImportError represents a row rejected by a bulk contact import.
+    
+    Attributes:
+        row (int): The number of the rejected row (for CSV, the first data row is 1).
+        detail (str): Why the row was rejected.
+    """
+    row: int
+    detail: str
+
+
+class ContactImportResponse(BaseModel):
+    """
+    ContactImportResponse represents the report of a bulk contact import.
+    
+    Attributes:
+        inserted (int): The number of contacts created.
+        failed (int): The number of rejected rows.
+        errors (List[ContactImportError]): The rejected rows, truncated to the first 1000.
+    """
+    inserted: int
+    failed: int
+    errors: List[ContactImportError]
+
+
+class ContactPatch(BaseModel):
+    """
+    ContactPatch represents the fields changed by a bulk contact update.
+    
+    Email and phone number are unique per contact, so they cannot be set in bulk.
+    
+    Attributes:
+        first_name (str): The new first name, with a minimum length of 2 and a maximum length of 25.
+        last_name (str): The new last name, with a minimum length of 2 and a maximum length of 25.
+        birthday (date): The new birth date.
+        additional_data (str): The new additional data, with a maximum length of 255.
+    """
+    first_name:Optional[str]=Field(default=None,min_length=2,max_length=25)
+    last_name:Optional[str]=Field(default=None,min_length=2,max_length=25)
+    birthday:Optional[date]=None
+    additional_data:Optional[str]=Field(default=None,max_length=255)
+
+
+class ContactBatchDelete(BaseModel):
+    """
+    ContactBatchDelete represents the contacts targeted by a bulk operation.
+    
+    At least one of ids and filter must be given; when both are, contacts must match both.
+    
+    Attributes:
+        ids (List[int]): The IDs of the contacts, at most 10000.
+        filter (Dict[str, Any]): Search criteria, named like the search_contacts criteria (e.g. "birthday__lt").
+    """
+    ids:Optional[List[int]]=Field(default=None,max_length=10000)
+    filter:Optional[Dict[str, Any]]=None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if not self.ids and not self.filter:
+            raise ValueError("ids or filter is required")
+        return self
+
+
+class ContactBatchUpdate(ContactBatchDelete):
+    """
+    ContactBatchUpdate represents a bulk contact update.
+    
+    Attributes:
+        patch (ContactPatch): The fields to change; fields left out are not changed.
+    """
+    patch: ContactPatch
+
+
+class ContactBatchResponse(BaseModel):
+    """
+    ContactBatchResponse represents the result of a bulk contact operation.
+    
+    Attributes:
+        count (int): The number of affected contacts.
+        ids (List[int]): The IDs of the affected contacts.
+    """
+    count: int
+    ids: List[int]
+
+
 class UserModel(BaseModel):
     """
     UserModel represents the schema for a user entity.
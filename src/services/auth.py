@@ -1,57 +1,87 @@
+import uuid
+from dataclasses import dataclass
 from typing import Optional
 
-from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends
+import redis.asyncio as redis
+from jose import JWTError
+from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.conf.config import settings
 from src.database.db import get_db
 from src.repository import users as repository_users
+from src.services.cache import user_cache, token_cache
+from src.services.circuit import fail_policy, route_name
+from src.services.keys import key_ring
+from src.services.passwords import password_hasher
+from src.services.refresh_tokens import refresh_tokens
 
-import pickle
-import redis
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The authenticated user as described by the claims of their access token.
+
+    Routes that only scope queries by the user id take a Principal instead of a full User,
+    so they need neither the user cache nor the database to authenticate a request.
+    """
+    id: int
+    email: str
+    confirmed: bool
 
 
 class Auth:
     """
     A class for handling authentication-related operations.
     """
-    # Initialize password hashing context
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-    # Load secret key and algorithm from settings
-    SECRET_KEY = settings.secret_key
-    ALGORITHM = settings.algorithm
+    # Lifetime of refresh tokens, and of their family in Redis, in seconds
+    REFRESH_TOKEN_TTL = 7 * 24 * 3600
 
     # Set up OAuth2 scheme for token-based authentication
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-    # Initialize Redis connection
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
 
-
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
-        Verify if the plain password matches the hashed password.
+        Verify if the plain password matches the hashed password, on the password hashing pool.
 
         :param plain_password: The password in plain text
         :param hashed_password: The hashed password to compare against
         :return: True if the password is correct, False otherwise
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
+
 
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        Verify a password and rehash it if its hash was made with another bcrypt cost.
 
-    def get_password_hash(self, password: str):
+        :param plain_password: The password in plain text
+        :param hashed_password: The hashed password to compare against
+        :return: A (verified, new hash) pair; the new hash is None when the stored one is current
         """
-        Generate a hash for the given password.
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+
+    async def get_password_hash(self, password: str):
+        """
+        Generate a hash for the given password, on the password hashing pool.
 
         :param password: The password to hash
         :return: The hashed password
         """
-        return self.pwd_context.hash(password)
+        return await password_hasher.hash(password)
+
+    @staticmethod
+    def user_claims(user) -> dict:
+        """
+        Get the claims describing a user in an access token.
+
+        :param user: The user the token is issued to
+        :return: The subject, user id and flags of the user
+        """
+        return {"sub": user.email, "uid": user.id, "confirmed": user.confirmed}
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -68,7 +98,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_access_token = key_ring.encode(to_encode)
         return encoded_access_token
 
     # define a function to generate a new refresh token
@@ -84,9 +114,9 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=self.REFRESH_TOKEN_TTL)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_refresh_token = key_ring.encode(to_encode)
         return encoded_refresh_token
 
 
@@ -95,18 +125,87 @@ class Auth:
         Decode and validate a refresh token.
 
         :param refresh_token: The refresh token to decode
-        :return: The email associated with the token
+        :return: The claims of the token
         :raises HTTPException: If the token is invalid or expired
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = key_ring.decode(refresh_token)
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
-        
+
+
+    async def _create_token_pair(self, claims: dict, family: str, jti: str):
+        """
+        Create an access token and a refresh token belonging to a token family.
+
+        :param claims: The claims describing the user
+        :param family: The id of the refresh token family
+        :param jti: The id of the refresh token
+        :return: The token response
+        """
+        access_token = await self.create_access_token(data={**claims, "fam": family})
+        refresh_token = await self.create_refresh_token(data={**claims, "fam": family, "jti": jti})
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+    async def create_session_tokens(self, user, route: str | None = None):
+        """
+        Create the tokens of a new login, starting a new refresh token family in Redis.
+
+        If Redis is unavailable the failure policy of the route applies. Failing open, the tokens
+        are issued without recording their family: they work until they expire, but the refresh
+        token cannot be exchanged once Redis is back, so the user logs in again then.
+
+        :param user: The user logging in
+        :param route: The name of the route, selecting the failure policy
+        :return: The token response
+        :raises HTTPException: 503 if Redis is unavailable and the route fails closed
+        """
+        family, jti = uuid.uuid4().hex, uuid.uuid4().hex
+        try:
+            await refresh_tokens.start(family, jti, self.REFRESH_TOKEN_TTL)
+        except redis.RedisError:
+            fail_policy.check(route)
+        return await self._create_token_pair(self.user_claims(user), family, jti)
+
+
+    async def rotate_refresh_token(self, refresh_token: str, db: AsyncSession, route: str | None = None):
+        """
+        Exchange a refresh token for new tokens of the same family.
+
+        The user is read again by id, so the new tokens carry their current claims and a deleted
+        user cannot keep refreshing. Presenting a refresh token that has already been exchanged revokes its whole family.
+        If Redis is unavailable the failure policy of the route applies. Failing open, the token
+        is exchanged without rotating it: the new refresh token keeps its id, so it is still the
+        current one once Redis is back, but reuse of the token is not detected meanwhile.
+
+        :param refresh_token: The refresh token
+        :param db: The database session
+        :param route: The name of the route, selecting the failure policy
+        :return: The token response
+        :raises HTTPException: If the token is invalid, expired, revoked or reused, its user no longer exists, or 503 if Redis
+            is unavailable and the route fails closed
+        """
+        payload = await self.decode_refresh_token(refresh_token)
+        family, jti = payload.get("fam"), payload.get("jti")
+        if family is None or jti is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        user = await repository_users.get_user_by_id(payload.get("uid"), db) if "uid" in payload else None
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        new_jti = uuid.uuid4().hex
+        try:
+            rotated = await refresh_tokens.rotate(family, jti, new_jti, self.REFRESH_TOKEN_TTL)
+        except redis.RedisError:
+            fail_policy.check(route)
+            rotated, new_jti = refresh_tokens.ROTATED, jti
+        if rotated != refresh_tokens.ROTATED:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return await self._create_token_pair(self.user_claims(user), family, new_jti)
+
 
     def create_email_token(self, data: dict):
         """
@@ -118,16 +217,73 @@ class Auth:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        token = key_ring.encode(to_encode)
         return token
 
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def decode_access_token(self, token: str, route: str | None = None):
+        """
+        Decode and validate an access token, verifying its signature once per worker.
+
+        Verified claims are served from the token cache until the token expires.
+        Tokens are checked for revocation whenever their signature is verified. If Redis is
+        unavailable the failure policy of the route applies, and the claims are not cached
+        so the token is checked again once Redis is back.
+
+        :param token: The access token
+        :param route: The name of the route, selecting the failure policy
+        :return: The claims of the token, or None if it is invalid, expired or revoked
+        :raises HTTPException: 503 if Redis is unavailable and the route fails closed
+        """
+        payload = token_cache.get(token)
+        if payload is not None:
+            return payload
+        try:
+            payload = key_ring.decode(token)
+        except JWTError:
+            return None
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
+            return None
+        try:
+            revoked = await token_cache.is_revoked(token)
+        except redis.RedisError:
+            fail_policy.check(route)
+            return payload
+        if revoked:
+            return None
+        token_cache.set(token, payload)
+        return payload
+
+
+    async def revoke_access_token(self, token: str):
+        """
+        Revoke an access token on every worker until it expires, along with its refresh token family.
+
+        :param token: The access token
+        :return: The email associated with the token
+        :raises HTTPException: If the token is invalid, expired or already revoked, or 503 if Redis is unavailable
+        """
+        payload = await self.decode_access_token(token)
+        if payload is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
+        try:
+            await token_cache.revoke(token, payload['exp'])
+            if 'fam' in payload:
+                await refresh_tokens.revoke(payload['fam'])
+        except redis.RedisError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service temporarily unavailable")
+        return payload['sub']
+
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db), request: Request = None):
         """
         Get the current user based on the provided token.
 
+        The user is read from the user cache, or from the database if it is missing or Redis is unavailable.
+
         :param token: The access token
         :param db: The database session
+        :param request: The current request, selecting the failure policy of its route
         :return: The current user
         :raises HTTPException: If the token is invalid or the user is not found
         """
@@ -137,33 +293,54 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+        payload = await self.decode_access_token(token, route_name(request) if request else None)
+        if payload is None:
             raise credentials_exception
-        
-        # Try to get user from Redis cache
-        user = self.r.get(f"user:{email}")
+        email = payload["sub"]
+
+        # Try to get user from the in-process cache, then from Redis
+        try:
+            user = await user_cache.get(email)
+        except redis.RedisError:
+            user = None
         if user is None:
             # If not in cache, get from database
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            # Cache user data in Redis
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            # Cache a snapshot of the user; the in-process tier keeps it even if Redis is unavailable
+            try:
+                await user_cache.set(user)
+            except redis.RedisError:
+                pass
         return user
     
 
+    async def current_principal(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db), request: Request = None):
+        """
+        Get the current user from the claims of the provided token, without looking the user up.
+
+        Tokens issued before the user id was embedded fall back to get_current_user.
+
+        :param token: The access token
+        :param db: The database session, only used for older tokens
+        :param request: The current request, selecting the failure policy of its route
+        :return: The current principal
+        :raises HTTPException: If the token is invalid or the user is not found
+        """
+        payload = await self.decode_access_token(token, route_name(request) if request else None)
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if "uid" in payload:
+            return Principal(id=payload["uid"], email=payload["sub"], confirmed=payload.get("confirmed", False))
+        user = await self.get_current_user(token, db, request)
+        return Principal(id=user.id, email=user.email, confirmed=user.confirmed)
+
+
     async def get_email_from_token(self, token: str):
         """
         Extract the email from a token.
@@ -173,7 +350,7 @@ class Auth:
         :raises HTTPException: If the token is invalid
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = key_ring.decode(token)
             email = payload["sub"]
             return email
         except JWTError as e:
@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import logging
+import uuid
+from typing import AsyncIterator, Callable, List, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.repository import contacts as repository_contacts
+from src.services.jobs import JobQueue, job_queue
+from src.services.redis_pool import redis_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+class BirthdayGreetings:
+    """
+    Queues, once a day, a greeting email to every confirmed user whose contacts are born today.
+
+    Today's birthdays of all users are read in chunks with one indexed keyset query per chunk,
+    grouped by owner and queued as send_birthday_email jobs, a bounded number at a time. After
+    each chunk a checkpoint in Redis records the last user done, so a run that stopped resumes
+    where it left off, and a finished day is not sent again. A lock keeps two workers from
+    running the same day at once; each checkpoint extends it, and a run that lost its lock
+    stops without writing its checkpoint.
+    """
+
+    # How long the checkpoint of a day is kept, in seconds
+    CHECKPOINT_TTL = 2 * 24 * 3600
+
+    # Writes the checkpoint and extends the lock, if the lock is still held by this run.
+    # KEYS: checkpoint, lock; ARGV: lock token, lock timeout, checkpoint ttl, field, value, ...
+    CHECKPOINT_SCRIPT = """
+    if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+        return 0
+    end
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+    redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+    """
+
+    # Releases the lock if it is still held by this run. KEYS: lock; ARGV: lock token
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+        return 0
+    end
+    return redis.call('DEL', KEYS[1])
+    """
+
+    def __init__(self, r: redis.Redis, jobs: JobQueue, session_factory: Callable[[], AsyncSession], chunk_size: int = 5000, concurrency: int = 16, queue: str = "emails", lock_timeout: int = 3600):
+        """
+        :param r: The async Redis client
+        :param jobs: The job queues
+        :param session_factory: A callable opening a database session
+        :param chunk_size: The number of contacts read per query
+        :param concurrency: The maximum number of jobs being queued at once
+        :param queue: The job queue of the emails
+        :param lock_timeout: How long a run may hold the lock of its day, in seconds
+        """
+        self.r = r
+        self.jobs = jobs
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.queue = queue
+        self.lock_timeout = lock_timeout
+        self._checkpoint = r.register_script(self.CHECKPOINT_SCRIPT)
+        self._release = r.register_script(self.RELEASE_SCRIPT)
+
+    @staticmethod
+    def key(today: datetime.date) -> str:
+        """
+        Get the Redis key of the checkpoint of a day.
+
+        :param today: The day
+        :return: The Redis key
+        """
+        return f"birthday-greetings:{today.isoformat()}"
+
+    async def chunks(self, today: datetime.date, after: Tuple[int, int] = (0, 0)) -> AsyncIterator[List[List[Row]]]:
+        """
+        Stream today's birthdays, grouped by user.
+
+        A user whose contacts span two queries is held back until the next one, so every
+        yielded chunk holds complete users only.
+
+        :param today: The day of the birthdays
+        :param after: The (user_id, id) of the last contact already done
+        :return: An async iterator of chunks, each a list of groups of rows of one user
+        """
+        pending: List[Row] = []
+        async with self.session_factory() as db:
+            while True:
+                rows = await repository_contacts.birthdays_chunk(today, db, after, self.chunk_size)
+                last = len(rows) < self.chunk_size
+                groups = []
+                for row in rows:
+                    if pending and pending[-1].user_id != row.user_id:
+                        groups.append(pending)
+                        pending = []
+                    pending.append(row)
+                if last and pending:
+                    groups.append(pending)
+                if groups:
+                    yield groups
+                if last:
+                    return
+                after = (rows[-1].user_id, rows[-1].id)
+
+    async def _enqueue(self, groups: List[List[Row]]) -> None:
+        """
+        Queue the greeting emails of a chunk.
+
+        :param groups: The rows of each user
+        """
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def enqueue(rows: List[Row]) -> None:
+            contacts = [{"first_name": row.first_name, "last_name": row.last_name} for row in rows]
+            async with slots:
+                await self.jobs.enqueue(self.queue, "send_birthday_email", email=rows[0].user_email, username=rows[0].username, contacts=contacts)
+
+        await asyncio.gather(*(enqueue(rows) for rows in groups))
+
+    async def _save(self, key: str, lock: str, token: str, checkpoint: dict) -> bool:
+        """
+        Write the checkpoint of a day and extend its lock, if the lock is still held.
+
+        :param key: The Redis key of the checkpoint
+        :param lock: The Redis key of the lock
+        :param token: The token the lock was taken with
+        :param checkpoint: The fields of the checkpoint
+        :return: True if the checkpoint was written, False if the lock was lost
+        """
+        fields = [item for pair in checkpoint.items() for item in pair]
+        return bool(await self._checkpoint(keys=[key, lock], args=[token, self.lock_timeout, self.CHECKPOINT_TTL, *fields]))
+
+    async def run(self, today: datetime.date | None = None) -> dict | None:
+        """
+        Queue the greetings of a day, resuming from its checkpoint.
+
+        :param today: The day, today by default
+        :return: A dict with the number of users and contacts of the day, or None if another
+            run holds the day or took it over
+        """
+        today = today or datetime.date.today()
+        key = self.key(today)
+        lock = f"{key}:lock"
+        token = uuid.uuid4().hex
+        if not await self.r.set(lock, token, nx=True, ex=self.lock_timeout):
+            return None
+        try:
+            checkpoint = {field.decode(): int(value) for field, value in (await self.r.hgetall(key)).items()}
+            users, contacts = checkpoint.get("users", 0), checkpoint.get("contacts", 0)
+            if checkpoint.get("done"):
+                return {"users": users, "contacts": contacts}
+            after = (checkpoint.get("user_id", 0), checkpoint.get("id", 0))
+            async for groups in self.chunks(today, after):
+                await self._enqueue(groups)
+                users += len(groups)
+                contacts += sum(map(len, groups))
+                last = groups[-1][-1]
+                if not await self._save(key, lock, token, {"user_id": last.user_id, "id": last.id, "users": users, "contacts": contacts}):
+                    logger.warning("Lost the lock of the birthday greetings of %s after %d users", today, users)
+                    return None
+            if not await self._save(key, lock, token, {"done": 1, "users": users, "contacts": contacts}):
+                logger.warning("Lost the lock of the birthday greetings of %s after %d users", today, users)
+                return None
+            logger.info("Queued birthday greetings of %s for %d users, %d contacts", today, users, contacts)
+            return {"users": users, "contacts": contacts}
+        finally:
+            await self._release(keys=[lock], args=[token])
+
+
+# Create the birthday greetings job shared by the application
+birthday_greetings = BirthdayGreetings(
+    redis_pool.client,
+    job_queue,
+    SessionLocal,
+    chunk_size=settings.birthday_chunk_size,
+    concurrency=settings.birthday_enqueue_concurrency,
+)
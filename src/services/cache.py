@@ -0,0 +1,369 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Hashable
+
+import orjson
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.redis_pool import redis_pool
+from src.database.models import User
+
+
+class TTLCache:
+    """
+    An in-process LRU cache whose entries expire after a time-to-live.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: The maximum number of entries; the least recently used entry is evicted first
+        :param ttl: The default time-to-live of an entry, in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Get a live entry and mark it as recently used.
+
+        :param key: The key of the entry
+        :return: The cached value, or None if it is missing or expired
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        Store an entry, evicting the least recently used ones if the cache is full.
+
+        :param key: The key of the entry
+        :param value: The value to cache
+        :param ttl: Optional time-to-live in seconds, overriding the default
+        """
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Drop an entry if it exists.
+
+        :param key: The key of the entry
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Drop every entry.
+        """
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the size and hit/miss counters of the cache.
+
+        :return: A dict with size, hits and misses
+        """
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+async def listen(r: redis.Redis, channel: str, handle_message: Callable[[bytes | str], None], local: TTLCache) -> None:
+    """
+    Apply messages from a pub/sub channel to an in-process cache until cancelled.
+
+    Messages sent while the subscription is down are lost, so the in-process cache is
+    cleared when the subscription is restored after a disconnect.
+
+    :param r: The async Redis client subscribing, without a socket timeout
+    :param channel: The channel to subscribe to
+    :param handle_message: The callback applying the payload of a message
+    :param local: The in-process cache kept in sync by the messages
+    """
+    reconnecting = False
+    while True:
+        pubsub = r.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            if reconnecting:
+                local.clear()
+                reconnecting = False
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    handle_message(message["data"])
+        except redis.RedisError:
+            reconnecting = True
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+class UserCache:
+    """
+    A two-tier cache of user snapshots: an in-process TTL/LRU tier in front of Redis.
+
+    Only the fields routes need are cached, serialized with orjson, instead of a pickled ORM object.
+    Writes go through to Redis and are announced on a pub/sub channel, so every worker drops its
+    in-process copy and the TTLs can be long without serving stale data.
+    """
+    # User fields kept in a snapshot
+    FIELDS = ("id", "username", "email", "created_at", "avatar", "confirmed")
+
+    # Pub/sub channel announcing changed users, as "<worker id>:<email>" messages
+    CHANNEL = "user-cache:invalidate"
+
+    def __init__(self, r: redis.Redis, ttl: int, local_ttl: int, local_maxsize: int, subscriber: redis.Redis | None = None):
+        """
+        :param r: The async Redis client
+        :param ttl: The time-to-live of a snapshot in Redis, in seconds
+        :param local_ttl: The time-to-live of a snapshot in the in-process tier, in seconds
+        :param local_maxsize: The maximum number of snapshots in the in-process tier
+        :param subscriber: The Redis client subscribing to CHANNEL, without a socket timeout; r by default
+        """
+        self.r = r
+        self.subscriber = subscriber or r
+        self.ttl = ttl
+        self.local = TTLCache(local_maxsize, local_ttl)
+        self.worker_id = uuid.uuid4().hex
+
+    @staticmethod
+    def key(email: str) -> str:
+        """
+        Get the Redis key of a user snapshot.
+
+        :param email: The email of the user
+        :return: The Redis key
+        """
+        return f"user:{email}"
+
+    @classmethod
+    def snapshot(cls, user: User) -> dict:
+        """
+        Take a snapshot of the cached fields of a user.
+
+        :param user: The user
+        :return: The snapshot
+        """
+        return {field: getattr(user, field) for field in cls.FIELDS}
+
+    @staticmethod
+    def to_user(snapshot: dict) -> User:
+        """
+        Build a detached user from a snapshot.
+
+        :param snapshot: The snapshot
+        :return: A new User instance, not attached to any session
+        """
+        return User(**snapshot)
+
+    async def get(self, email: str) -> User | None:
+        """
+        Get a user from the in-process tier, or from Redis on a local miss.
+
+        :param email: The email of the user
+        :return: The user, or None if neither tier has it
+        """
+        snapshot = self.local.get(email)
+        if snapshot is None:
+            data = await self.r.get(self.key(email))
+            if data is None:
+                return None
+            snapshot = orjson.loads(data)
+            if snapshot["created_at"]:
+                snapshot["created_at"] = datetime.fromisoformat(snapshot["created_at"])
+            self.local.set(email, snapshot)
+        return self.to_user(snapshot)
+
+    async def set(self, user: User) -> None:
+        """
+        Store a snapshot of a user in both tiers.
+
+        :param user: The user
+        """
+        snapshot = self.snapshot(user)
+        self.local.set(user.email, snapshot)
+        await self.r.set(self.key(user.email), orjson.dumps(snapshot), ex=self.ttl)
+
+    async def refresh(self, user: User) -> None:
+        """
+        Write a changed user through to both tiers and tell the other workers to drop their copy,
+        in one round-trip.
+
+        :param user: The changed user
+        """
+        snapshot = self.snapshot(user)
+        self.local.set(user.email, snapshot)
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.set(self.key(user.email), orjson.dumps(snapshot), ex=self.ttl)
+            pipe.publish(self.CHANNEL, f"{self.worker_id}:{user.email}")
+            await pipe.execute()
+
+    async def invalidate(self, email: str) -> None:
+        """
+        Drop a user from both tiers and tell the other workers to drop their copy.
+
+        :param email: The email of the user
+        """
+        self.local.pop(email)
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.delete(self.key(email))
+            pipe.publish(self.CHANNEL, f"{self.worker_id}:{email}")
+            await pipe.execute()
+
+    def handle_message(self, data: bytes | str) -> None:
+        """
+        Drop the in-process copy of a user changed by another worker.
+
+        :param data: The payload of a message from CHANNEL
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        worker_id, _, email = data.partition(":")
+        if worker_id != self.worker_id:
+            self.local.pop(email)
+
+    async def listen(self) -> None:
+        """
+        Apply invalidations from other workers until cancelled.
+        """
+        await listen(self.subscriber, self.CHANNEL, self.handle_message, self.local)
+
+
+class TokenCache:
+    """
+    An in-process cache of verified access token claims, keyed by a digest of the token.
+
+    A token is verified once per worker and its claims are then served from memory until
+    the token expires. Revoked tokens are recorded in Redis until they expire and announced
+    on a pub/sub channel, so every worker drops them and checks Redis on the next request.
+    """
+    # Pub/sub channel announcing revoked tokens, as "<worker id>:<digest>" messages
+    CHANNEL = "token-cache:revoke"
+
+    def __init__(self, r: redis.Redis, maxsize: int, subscriber: redis.Redis | None = None):
+        """
+        :param r: The async Redis client
+        :param maxsize: The maximum number of cached tokens
+        :param subscriber: The Redis client subscribing to CHANNEL, without a socket timeout; r by default
+        """
+        self.r = r
+        self.subscriber = subscriber or r
+        self.local = TTLCache(maxsize, ttl=0)
+        self.worker_id = uuid.uuid4().hex
+
+    @staticmethod
+    def digest(token: str) -> str:
+        """
+        Get the digest identifying a token, so tokens themselves are never kept.
+
+        :param token: The encoded token
+        :return: The SHA-256 hex digest of the token
+        """
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def key(digest: str) -> str:
+        """
+        Get the Redis key marking a token as revoked.
+
+        :param digest: The digest of the token
+        :return: The Redis key
+        """
+        return f"revoked-token:{digest}"
+
+    def get(self, token: str) -> dict | None:
+        """
+        Get the verified claims of a token.
+
+        :param token: The encoded token
+        :return: The claims, or None if the token has not been verified by this worker
+        """
+        return self.local.get(self.digest(token))
+
+    def set(self, token: str, claims: dict) -> None:
+        """
+        Store the verified claims of a token until it expires.
+
+        :param token: The encoded token
+        :param claims: The verified claims, with an exp timestamp
+        """
+        ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self.local.set(self.digest(token), claims, ttl=ttl)
+
+    async def is_revoked(self, token: str) -> bool:
+        """
+        Check in Redis whether a token has been revoked.
+
+        :param token: The encoded token
+        :return: True if the token is revoked
+        """
+        return bool(await self.r.exists(self.key(self.digest(token))))
+
+    async def revoke(self, token: str, exp: int) -> None:
+        """
+        Revoke a token until it expires and tell the other workers to drop it.
+
+        :param token: The encoded token
+        :param exp: The expiry of the token, as a Unix timestamp
+        """
+        digest = self.digest(token)
+        self.local.pop(digest)
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.set(self.key(digest), 1, exat=int(exp))
+            pipe.publish(self.CHANNEL, f"{self.worker_id}:{digest}")
+            await pipe.execute()
+
+    def handle_message(self, data: bytes | str) -> None:
+        """
+        Drop a token revoked by another worker.
+
+        :param data: The payload of a message from CHANNEL
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        worker_id, _, digest = data.partition(":")
+        if worker_id != self.worker_id:
+            self.local.pop(digest)
+
+    async def listen(self) -> None:
+        """
+        Apply revocations from other workers until cancelled.
+        """
+        await listen(self.subscriber, self.CHANNEL, self.handle_message, self.local)
+
+
+# Create the user cache shared by the application
+user_cache = UserCache(
+    redis_pool.client,
+    ttl=settings.user_cache_ttl,
+    local_ttl=settings.user_cache_local_ttl,
+    local_maxsize=settings.user_cache_local_size,
+    subscriber=redis_pool.subscriber,
+)
+
+
+# Create the verified token cache shared by the application
+token_cache = TokenCache(
+    redis_pool.client,
+    maxsize=settings.token_cache_size,
+    subscriber=redis_pool.subscriber,
+)
@@ -0,0 +1,184 @@
+import time
+from typing import Awaitable, Callable, Dict
+
+import redis.asyncio as redis
+from fastapi import HTTPException, Request, status
+
+from src.conf.config import settings
+
+
+class CircuitOpenError(redis.ConnectionError):
+    """
+    Raised instead of calling Redis while the circuit breaker is open.
+
+    It is a redis ConnectionError, so callers handle it like Redis being unreachable.
+    """
+
+
+class PoolExhaustedError(redis.ConnectionError):
+    """
+    Raised when no pooled Redis connection frees up within the pool timeout.
+
+    It is a redis ConnectionError, so callers handle it like Redis being unreachable, but the
+    circuit breaker does not count it as a failure: Redis is busy, not down.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling Redis after repeated failures, so a slow or unreachable Redis costs a fast
+    error instead of a timeout on every request.
+
+    After failure_threshold consecutive connection errors or socket timeouts the breaker opens
+    and calls fail immediately. After reset_timeout seconds one trial call is let through: the
+    breaker closes if it succeeds and opens again if it fails. Errors returned by Redis
+    itself, such as a script error, are not failures of the connection and do not count, and
+    neither is waiting too long for a free connection of the pool. How long a call may take
+    is bounded by the socket and pool timeouts of the connection pool.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        :param failure_threshold: The number of consecutive failures opening the breaker
+        :param reset_timeout: How long the breaker stays open before a trial call, in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """
+        :return: "closed", "open" or "half-open"
+        """
+        if self.opened_at is None:
+            return "closed"
+        if self.trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go through, starting a trial call if the breaker is half-open.
+
+        :return: True if the call may go through
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial:
+            self.trial = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        """
+        Close the breaker after a successful call.
+        """
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self) -> None:
+        """
+        Count a failed call, opening the breaker on a failed trial or after too many failures.
+        """
+        self.failures += 1
+        if self.trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.trial = False
+
+    async def call(self, func: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Call Redis through the breaker.
+
+        :param func: The coroutine function sending the command
+        :return: The result of the call
+        :raises CircuitOpenError: If the breaker is open
+        :raises PoolExhaustedError: If no connection of the pool frees up in time
+        :raises redis.TimeoutError: If Redis does not answer within the socket timeout
+        """
+        if not self.allow():
+            raise CircuitOpenError("Redis circuit breaker is open")
+        try:
+            result = await func(*args, **kwargs)
+        except PoolExhaustedError:
+            # No command was sent, so this says nothing about Redis; a trial must not stay pending
+            self.trial = False
+            raise
+        except (redis.ConnectionError, redis.TimeoutError, OSError):
+            self.record_failure()
+            raise
+        except BaseException:
+            # Redis answered: the connection is fine, but a trial must not stay pending
+            self.trial = False
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        """
+        Get the state and counters of the breaker.
+
+        :return: A dict with state, failures and rejected
+        """
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class FailPolicy:
+    """
+    Decides, per route, what happens when a check that needs Redis cannot run.
+
+    Failing open skips the check, e.g. serves the request without rate limiting it or without
+    looking for a revoked token. Failing closed refuses the request with 503.
+    """
+
+    def __init__(self, fail_open: bool, routes: Dict[str, str]):
+        """
+        :param fail_open: Whether routes fail open by default
+        :param routes: Policies by route name, "open" or "closed"
+        """
+        self.default = fail_open
+        self.routes = {route: policy == "open" for route, policy in routes.items()}
+
+    def fail_open(self, route: str | None) -> bool:
+        """
+        Get the policy of a route.
+
+        :param route: The route name, i.e. the name of its endpoint function
+        :return: True if the route fails open
+        """
+        return self.routes.get(route, self.default)
+
+    def check(self, route: str | None) -> None:
+        """
+        Apply the policy of a route after a Redis failure.
+
+        :param route: The route name
+        :raises HTTPException: 503 if the route fails closed
+        """
+        if not self.fail_open(route):
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service temporarily unavailable")
+
+
+def route_name(request: Request) -> str | None:
+    """
+    Get the name of the route handling a request.
+
+    :param request: The current request
+    :return: The name of the endpoint function, or None outside of a route
+    """
+    route = request.scope.get("route")
+    return getattr(route, "name", None)
+
+
+# Create the breaker guarding Redis and the per-route failure policy
+redis_breaker = CircuitBreaker(
+    failure_threshold=settings.redis_breaker_threshold,
+    reset_timeout=settings.redis_breaker_reset_timeout,
+)
+fail_policy = FailPolicy(settings.redis_fail_open, settings.redis_fail_policy)
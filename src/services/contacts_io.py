@@ -0,0 +1,203 @@
+import codecs
+import csv
+import io
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Iterator, List, Tuple, TypeVar
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+
+T = TypeVar("T")
+
+
+# Formats accepted by the bulk import, keyed by file extension and content type
+IMPORT_FORMATS = {
+    ".csv": "csv",
+    "text/csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def detect_format(filename: str | None, content_type: str | None) -> str | None:
+    """
+    Guesses the format of an uploaded file from its name and content type.
+
+    :param filename: The name of the uploaded file
+    :param content_type: The content type of the uploaded file
+    :return: "csv", "ndjson" or None if the format is unknown
+    """
+    if filename and "." in filename:
+        extension = filename[filename.rindex("."):].lower()
+        if extension in IMPORT_FORMATS:
+            return IMPORT_FORMATS[extension]
+    if content_type:
+        return IMPORT_FORMATS.get(content_type.split(";")[0].strip().lower())
+    return None
+
+
+def check_utf8(file: BinaryIO, chunk_size: int = 64 * 1024) -> None:
+    """
+    Checks that a file is valid UTF-8 before any of it is imported, then rewinds it.
+
+    :param file: The seekable binary file to check
+    :param chunk_size: The number of bytes read at a time
+    :raises ValueError: If the file is not valid UTF-8
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        while chunk := file.read(chunk_size):
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ValueError("File is not valid UTF-8") from None
+    finally:
+        file.seek(0)
+
+
+def iter_csv_rows(file: BinaryIO) -> Iterator[Tuple[int, dict | None]]:
+    """
+    Reads contact rows from a CSV file with a header line, one row at a time.
+
+    The file must be valid UTF-8, see check_utf8.
+
+    :param file: The binary file to read
+    :return: An iterator of (row number, row) pairs, row number 1 being the first data row
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, {key: value for key, value in row.items() if key is not None}
+    finally:
+        # Leave the underlying upload open for its owner
+        text.detach()
+
+
+def iter_ndjson_rows(file: BinaryIO) -> Iterator[Tuple[int, dict | None]]:
+    """
+    Reads contact rows from a newline-delimited JSON file, one line at a time.
+
+    Blank lines are skipped. Lines that are not a JSON object are reported as a None row.
+
+    :param file: The binary file to read
+    :return: An iterator of (line number, row) pairs
+    """
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def _take(items: Iterator[T], count: int) -> List[T]:
+    """
+    Takes up to count items from an iterator.
+
+    :param items: The iterator
+    :param count: The maximum number of items
+    :return: The items taken, an empty list once the iterator is exhausted
+    """
+    return list(islice(items, count))
+
+
+async def iterate_in_threadpool(items: Iterator[T], batch_size: int = 1000) -> AsyncIterator[T]:
+    """
+    Iterates a blocking iterator, such as the rows of an uploaded file, without blocking the event loop.
+
+    Items are read on the thread pool, batch_size at a time, so reading a spooled upload from
+    disk does not hold up other requests.
+
+    :param items: The blocking iterator
+    :param batch_size: The number of items read per call to the thread pool
+    :return: An async iterator of the items
+    """
+    while batch := await run_in_threadpool(_take, items, batch_size):
+        for item in batch:
+            yield item
+
+
+# Contact columns written by the exports, in order
+EXPORT_FIELDS = ("id", "first_name", "last_name", "email", "phone_number", "birthday", "additional_data")
+
+
+def format_ndjson(contact) -> bytes:
+    """
+    Formats a contact as one NDJSON line.
+
+    :param contact: The contact row or object
+    :return: The encoded line
+    """
+    return orjson.dumps({field: getattr(contact, field) for field in EXPORT_FIELDS}) + b"\n"
+
+
+def format_csv_header() -> bytes:
+    """
+    Formats the header line of a CSV export.
+
+    :return: The encoded line
+    """
+    return (",".join(EXPORT_FIELDS) + "\r\n").encode()
+
+
+def format_csv(contact) -> bytes:
+    """
+    Formats a contact as one CSV line, with the columns of format_csv_header.
+
+    :param contact: The contact row or object
+    :return: The encoded line
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if getattr(contact, field) is None else getattr(contact, field) for field in EXPORT_FIELDS])
+    return buffer.getvalue().encode()
+
+
+def _vcard_escape(value) -> str:
+    """
+    Escapes a text value for a vCard property.
+
+    :param value: The value to escape
+    :return: The escaped text
+    """
+    text = "" if value is None else str(value)
+    return text.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;").replace("\n", "\\n")
+
+
+def format_vcard(contact) -> bytes:
+    """
+    Formats a contact as a vCard 3.0 entry.
+
+    :param contact: The contact row or object
+    :return: The encoded entry
+    """
+    first_name, last_name = _vcard_escape(contact.first_name), _vcard_escape(contact.last_name)
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"UID:{contact.id}",
+        f"N:{last_name};{first_name};;;",
+        f"FN:{first_name} {last_name}",
+    ]
+    if contact.email:
+        lines.append(f"EMAIL;TYPE=INTERNET:{_vcard_escape(contact.email)}")
+    if contact.phone_number is not None:
+        lines.append(f"TEL:{contact.phone_number}")
+    if contact.birthday:
+        lines.append(f"BDAY:{contact.birthday.isoformat()}")
+    if contact.additional_data:
+        lines.append(f"NOTE:{_vcard_escape(contact.additional_data)}")
+    lines.append("END:VCARD")
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+
+# Export formats: media type, header line factory (or None) and row formatter
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", None, format_ndjson),
+    "csv": ("text/csv", format_csv_header, format_csv),
+    "vcard": ("text/vcard", None, format_vcard),
+}
@@ -1,56 +1,215 @@
+import re
+from email.message import EmailMessage
+from email.utils import formataddr
+from functools import lru_cache
 from pathlib import Path
+from typing import List, Tuple
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from markupsafe import escape
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
+from src.services.jobs import PermanentJobError
+from src.services.mailer import mailer
 from src.conf.config import settings
 
 
-# ConnectionConfig class is used to configure the email connection settings
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Desired Name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+# Folder of the email templates
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
 
+# Template environment, built once; it keeps the compiled templates
+env = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]), auto_reload=False)
 
-async def send_email(email: EmailStr, username: str, host: str):
+
+class PrerenderedTemplate:
     """
-    Sends an email to the specified email address with a token for email verification.
+    A template rendered once with placeholders, so that rendering it for a message only joins
+    its static parts with the escaped values.
+
+    This only holds for templates that output their values as they are, without filters or
+    conditions on them. Other templates are detected on construction and rendered by Jinja.
+    """
+
+    def __init__(self, template: Template, fields: Tuple[str, ...]):
+        """
+        Args:
+            template (Template): The compiled template.
+            fields (Tuple[str, ...]): The names of the values substituted in the template.
+        """
+        self.template = template
+        placeholders = {field: f"\x00{field}\x00" for field in fields}
+        pattern = re.compile("\x00(" + "|".join(map(re.escape, fields)) + ")\x00")
+        self.parts = pattern.split(template.render(**placeholders))
+        sample = {field: f"<{field}&'\"" for field in fields}
+        if set(self.parts[1::2]) != set(fields) or self._join(sample) != template.render(**sample):
+            self.parts = None
+
+    def _join(self, context: dict) -> str:
+        """
+        Joins the static parts with the escaped values.
+
+        Args:
+            context (dict): The values substituted in the template.
+
+        Returns:
+            str: The rendered template.
+        """
+        parts = list(self.parts)
+        for index in range(1, len(parts), 2):
+            parts[index] = escape(context[parts[index]])
+        return "".join(parts)
+
+    def render(self, **context) -> str:
+        """
+        Renders the template.
+
+        Args:
+            **context: The values substituted in the template.
+
+        Returns:
+            str: The rendered template.
+        """
+        if self.parts is None:
+            return self.template.render(**context)
+        return self._join(context)
+
+
+@lru_cache(maxsize=None)
+def get_template(template_name: str, fields: Tuple[str, ...]) -> PrerenderedTemplate:
+    """
+    Gets a template prepared for the given values, preparing it on first use.
+
+    Args:
+        template_name (str): The file name of the template in TEMPLATE_FOLDER.
+        fields (Tuple[str, ...]): The names of the values substituted in the template.
+
+    Returns:
+        PrerenderedTemplate: The prepared template.
+    """
+    return PrerenderedTemplate(env.get_template(template_name), fields)
+
+
+def render_template(template_name: str, **context) -> str:
+    """
+    Renders an email template.
+
+    Args:
+        template_name (str): The file name of the template in TEMPLATE_FOLDER.
+        **context: The values substituted in the template.
+
+    Returns:
+        str: The rendered template.
+    """
+    return get_template(template_name, tuple(sorted(context))).render(**context)
+
+
+def confirmation_email(email: EmailStr, username: str, host: str) -> EmailMessage:
+    """
+    Builds an email to the specified email address with a token for email verification.
 
     Args:
         email (EmailStr): The email address to send the email to.
         username (str): The username of the user.
         host (str): The host URL of the application.
 
+    Returns:
+        EmailMessage: The message.
+    """
+    # Create an email token using the auth_service
+    token_verification = auth_service.create_email_token({"sub": email})
+
+    # Create the email message
+    message = EmailMessage()
+    message["Subject"] = "Confirm your email "
+    message["From"] = formataddr(("Desired Name", settings.mail_from))
+    message["To"] = email
+    message.set_content(
+        render_template("email_template.html", host=host, username=username, token=token_verification),
+        subtype="html",
+    )
+    return message
+
+
+def birthday_email(email: EmailStr, username: str, contacts: List[dict]) -> EmailMessage:
+    """
+    Builds an email to a user listing their contacts whose birthday is today.
+
+    Args:
+        email (EmailStr): The email address of the user.
+        username (str): The username of the user.
+        contacts (List[dict]): The first_name and last_name of the contacts.
+
+    Returns:
+        EmailMessage: The message.
+    """
+    message = EmailMessage()
+    message["Subject"] = "Birthdays today"
+    message["From"] = formataddr(("Desired Name", settings.mail_from))
+    message["To"] = email
+    message.set_content(render_template("birthday_template.html", username=username, contacts=contacts), subtype="html")
+    return message
+
+
+async def deliver(message: EmailMessage):
+    """
+    Sends a message now, for a job handler: the job is acknowledged only once the message is sent.
+
+    Args:
+        message (EmailMessage): The message.
+
     Raises:
-        ConnectionErrors: If there is an error connecting to the email server.
+        PermanentJobError: If the server refuses the message for good (5xx or refused recipients),
+            so the job is not retried.
+        aiosmtplib.SMTPException, OSError: If sending may succeed later; the job queue retries it.
     """
     try:
-        # Create an email token using the auth_service
-        token_verification = auth_service.create_email_token({"sub": email})
-
-        # Create the email message
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        # Send the email using the FastMail instance
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        # Print the error if there is a connection error
-        print(err)
+        await mailer.send(message)
+    except aiosmtplib.SMTPRecipientsRefused as err:
+        raise PermanentJobError(str(err)) from err
+    except aiosmtplib.SMTPResponseException as err:
+        if err.code >= 500:
+            raise PermanentJobError(str(err)) from err
+        raise
+
+
+async def send_email(email: EmailStr, username: str, host: str):
+    """
+    Sends an email to the specified email address with a token for email verification.
+
+    This is the handler of send_email jobs; it raises if the email could not be sent.
+
+    Args:
+        email (EmailStr): The email address to send the email to.
+        username (str): The username of the user.
+        host (str): The host URL of the application.
+    """
+    await deliver(confirmation_email(email, username, host))
+
+
+async def enqueue_email(email: EmailStr, username: str, host: str):
+    """
+    Queues an email with a token for email verification in the in-process mailer, which sends
+    it over a pooled SMTP connection and retries it on failure. Used when the job queue is down.
+
+    Args:
+        email (EmailStr): The email address to send the email to.
+        username (str): The username of the user.
+        host (str): The host URL of the application.
+    """
+    await mailer.enqueue(confirmation_email(email, username, host))
+
+
+async def send_birthday_email(email: EmailStr, username: str, contacts: List[dict]):
+    """
+    Sends an email to a user listing their contacts whose birthday is today.
+
+    This is the handler of send_birthday_email jobs; it raises if the email could not be sent.
+
+    Args:
+        email (EmailStr): The email address of the user.
+        username (str): The username of the user.
+        contacts (List[dict]): The first_name and last_name of the contacts.
+    """
+    await deliver(birthday_email(email, username, contacts))
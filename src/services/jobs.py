@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+
+import orjson
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.redis_pool import redis_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a job handler when running the job again cannot succeed, e.g. when a mail server
+    refuses the recipient. The job goes to the dead-letter list without further attempts.
+    """
+
+
+@dataclass
+class Job:
+    """
+    A claimed job.
+
+    The payload is the JSON stored in Redis; it identifies the job when it is acknowledged.
+    """
+    queue: str
+    id: str
+    name: str
+    kwargs: dict
+    attempts: int
+    payload: str
+
+
+class JobQueue:
+    """
+    Durable job queues in Redis.
+
+    Each queue is a list of ready jobs, a sorted set of jobs delayed until a retry, a sorted set
+    of claimed jobs scored by their visibility deadline, a hash of attempt counts and a list of
+    dead jobs. A claimed job stays in the inflight set until it is acknowledged; if its worker
+    dies, the job becomes ready again once its deadline passes. Jobs are delivered at least once.
+    """
+
+    # Moves due retries and expired claims back to the ready list, then claims up to ARGV[3]
+    # jobs, keeping at most ARGV[4] in flight. Jobs past ARGV[5] attempts go to the dead list.
+    # KEYS: ready, delayed, inflight, attempts, dead; ARGV: now, deadline (ms), count, limit, max attempts
+    CLAIM_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    for _, job in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 100)) do
+        redis.call('ZREM', KEYS[2], job)
+        redis.call('RPUSH', KEYS[1], job)
+    end
+    for _, job in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now, 'LIMIT', 0, 100)) do
+        redis.call('ZREM', KEYS[3], job)
+        redis.call('LPUSH', KEYS[1], job)
+    end
+    local count = math.min(tonumber(ARGV[3]), tonumber(ARGV[4]) - redis.call('ZCARD', KEYS[3]))
+    local claimed = {}
+    while count > 0 do
+        local job = redis.call('LPOP', KEYS[1])
+        if not job then
+            break
+        end
+        local id = cjson.decode(job)['id']
+        local attempts = redis.call('HINCRBY', KEYS[4], id, 1)
+        if attempts > tonumber(ARGV[5]) then
+            redis.call('HDEL', KEYS[4], id)
+            redis.call('LPUSH', KEYS[5], job)
+        else
+            redis.call('ZADD', KEYS[3], ARGV[2], job)
+            table.insert(claimed, job)
+            table.insert(claimed, attempts)
+            count = count - 1
+        end
+    end
+    return claimed
+    """
+
+    # Removes a finished job. KEYS: inflight, attempts; ARGV: payload, id
+    ACK_SCRIPT = """
+    if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+        return 0
+    end
+    redis.call('HDEL', KEYS[2], ARGV[2])
+    return 1
+    """
+
+    # Delays a failed job until a retry, or moves it to the dead list after its last attempt.
+    # KEYS: inflight, delayed, attempts, dead; ARGV: payload, id, retry time (ms), max attempts
+    RETRY_SCRIPT = """
+    if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+        return 0
+    end
+    if tonumber(redis.call('HGET', KEYS[3], ARGV[2]) or 0) >= tonumber(ARGV[4]) then
+        redis.call('HDEL', KEYS[3], ARGV[2])
+        redis.call('LPUSH', KEYS[4], ARGV[1])
+        return -1
+    end
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+    return 1
+    """
+
+    def __init__(self, r: redis.Redis, limits: Dict[str, int], visibility_timeout: int = 60, max_attempts: int = 5, backoff: float = 5.0, prefix: str = "jobs"):
+        """
+        :param r: The async Redis client
+        :param limits: The queue names and how many of their jobs may be in flight at once
+        :param visibility_timeout: How long a claimed job may run without a heartbeat, in seconds
+        :param max_attempts: The number of attempts of a job before it is dead
+        :param backoff: The delay before the first retry, in seconds; it doubles with every attempt
+        :param prefix: The prefix of the Redis keys
+        """
+        self.r = r
+        self.limits = limits
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.prefix = prefix
+        self._claim = r.register_script(self.CLAIM_SCRIPT)
+        self._ack = r.register_script(self.ACK_SCRIPT)
+        self._retry = r.register_script(self.RETRY_SCRIPT)
+
+    def key(self, queue: str, part: str) -> str:
+        """
+        Get a Redis key of a queue.
+
+        :param queue: The name of the queue
+        :param part: "ready", "delayed", "inflight", "attempts" or "dead"
+        :return: The Redis key
+        """
+        return f"{self.prefix}:{queue}:{part}"
+
+    def _deadline(self) -> int:
+        """
+        :return: The visibility deadline of a job claimed now, in milliseconds
+        """
+        return int((time.time() + self.visibility_timeout) * 1000)
+
+    async def enqueue(self, queue: str, name: str, delay: float = 0, **kwargs) -> str:
+        """
+        Add a job to a queue.
+
+        :param queue: The name of the queue
+        :param name: The name of the job handler
+        :param delay: How long to wait before running the job, in seconds
+        :param kwargs: The JSON-serializable arguments of the handler
+        :return: The id of the job
+        :raises KeyError: If the queue is not configured
+        """
+        if queue not in self.limits:
+            raise KeyError(f"Unknown job queue: {queue}")
+        job_id = uuid.uuid4().hex
+        payload = orjson.dumps({"id": job_id, "name": name, "kwargs": kwargs, "enqueued_at": time.time()}).decode()
+        if delay > 0:
+            await self.r.zadd(self.key(queue, "delayed"), {payload: int((time.time() + delay) * 1000)})
+        else:
+            await self.r.rpush(self.key(queue, "ready"), payload)
+        return job_id
+
+    async def claim(self, queue: str, count: int) -> List[Job]:
+        """
+        Claim ready jobs of a queue, within its concurrency limit.
+
+        :param queue: The name of the queue
+        :param count: The maximum number of jobs to claim
+        :return: The claimed jobs, possibly none
+        """
+        keys = [self.key(queue, part) for part in ("ready", "delayed", "inflight", "attempts", "dead")]
+        claimed = await self._claim(keys=keys, args=[int(time.time() * 1000), self._deadline(), count, self.limits[queue], self.max_attempts])
+        jobs = []
+        for payload, attempts in zip(claimed[::2], claimed[1::2]):
+            payload = payload.decode() if isinstance(payload, bytes) else payload
+            data = orjson.loads(payload)
+            jobs.append(Job(queue, data["id"], data["name"], data["kwargs"], int(attempts), payload))
+        return jobs
+
+    async def extend(self, job: Job) -> bool:
+        """
+        Push back the visibility deadline of a running job.
+
+        :param job: The job
+        :return: False if the job is no longer claimed, e.g. after its deadline passed
+        """
+        changed = await self.r.zadd(self.key(job.queue, "inflight"), {job.payload: self._deadline()}, xx=True, ch=True)
+        return bool(changed)
+
+    async def ack(self, job: Job) -> bool:
+        """
+        Remove a finished job.
+
+        :param job: The job
+        :return: False if the job was no longer claimed
+        """
+        keys = [self.key(job.queue, "inflight"), self.key(job.queue, "attempts")]
+        return bool(await self._ack(keys=keys, args=[job.payload, job.id]))
+
+    async def fail(self, job: Job, permanent: bool = False) -> int:
+        """
+        Retry a failed job after a backoff, or move it to the dead-letter list.
+
+        :param job: The job
+        :param permanent: Whether the job can never succeed and must not be retried
+        :return: 1 if the job will be retried, -1 if it is dead, 0 if it was no longer claimed
+        """
+        keys = [self.key(job.queue, part) for part in ("inflight", "delayed", "attempts", "dead")]
+        retry_at = int((time.time() + self.backoff * 2 ** (job.attempts - 1)) * 1000)
+        max_attempts = 0 if permanent else self.max_attempts
+        return int(await self._retry(keys=keys, args=[job.payload, job.id, retry_at, max_attempts]))
+
+    async def stats(self, queue: str) -> dict:
+        """
+        Get the depth of a queue.
+
+        :param queue: The name of the queue
+        :return: A dict with ready, delayed, inflight and dead job counts
+        """
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.llen(self.key(queue, "ready"))
+            pipe.zcard(self.key(queue, "delayed"))
+            pipe.zcard(self.key(queue, "inflight"))
+            pipe.llen(self.key(queue, "dead"))
+            ready, delayed, inflight, dead = await pipe.execute()
+        return {"ready": ready, "delayed": delayed, "inflight": inflight, "dead": dead}
+
+
+class Worker:
+    """
+    Runs the jobs of some queues, outside of the API workers.
+
+    Each queue is polled by its own loop, running up to its concurrency limit of jobs at once.
+    A job is acknowledged when its handler returns and retried when it raises, unless it raises
+    PermanentJobError. While it runs, its visibility deadline is pushed back, so only jobs of a
+    dead worker are claimed again.
+    """
+
+    def __init__(self, jobs: JobQueue, handlers: Dict[str, Callable[..., Awaitable]], queues: List[str], poll_interval: float = 0.5):
+        """
+        :param jobs: The job queues
+        :param handlers: The coroutine functions running the jobs, by job name
+        :param queues: The names of the queues to run
+        :param poll_interval: How long to wait before polling an empty queue again, in seconds
+        """
+        self.jobs = jobs
+        self.handlers = handlers
+        self.queues = queues
+        self.poll_interval = poll_interval
+        self._stopping = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self) -> None:
+        """
+        Run jobs until stopped, then wait for the running ones.
+        """
+        await asyncio.gather(*(self._consume(queue) for queue in self.queues))
+
+    def stop(self) -> None:
+        """
+        Stop claiming jobs. The running jobs are finished.
+        """
+        self._stopping.set()
+
+    async def _sleep(self, delay: float) -> None:
+        """
+        Wait for a delay, or until the worker is stopped.
+
+        :param delay: The delay, in seconds
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _consume(self, queue: str) -> None:
+        """
+        Claim and run the jobs of a queue until stopped.
+
+        :param queue: The name of the queue
+        """
+        limit = self.jobs.limits[queue]
+        running: set[asyncio.Task] = set()
+        while not self._stopping.is_set():
+            if len(running) >= limit:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                claimed = await self.jobs.claim(queue, limit - len(running))
+            except redis.RedisError as err:
+                logger.warning("Could not claim jobs of %s: %s", queue, err)
+                claimed = []
+            if not claimed:
+                await self._sleep(self.poll_interval)
+                continue
+            for job in claimed:
+                task = asyncio.create_task(self._process(job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        if running:
+            await asyncio.wait(running)
+
+    async def _heartbeat(self, job: Job) -> None:
+        """
+        Push back the visibility deadline of a job until cancelled.
+
+        :param job: The running job
+        """
+        while True:
+            await asyncio.sleep(self.jobs.visibility_timeout / 3)
+            try:
+                await self.jobs.extend(job)
+            except redis.RedisError as err:
+                logger.warning("Could not extend job %s: %s", job.id, err)
+
+    async def _process(self, job: Job) -> None:
+        """
+        Run a job, then acknowledge or retry it.
+
+        :param job: The claimed job
+        """
+        handler = self.handlers.get(job.name)
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                logger.error("No handler for job %s of %s", job.name, job.queue)
+                self.failed += 1
+                await self.jobs.fail(job, permanent=True)
+                return
+            try:
+                await handler(**job.kwargs)
+            except PermanentJobError as err:
+                logger.error("Job %s (%s) failed permanently: %s", job.id, job.name, err)
+                self.failed += 1
+                await self.jobs.fail(job, permanent=True)
+            except Exception:
+                logger.exception("Job %s (%s) failed on attempt %d", job.id, job.name, job.attempts)
+                self.failed += 1
+                await self.jobs.fail(job)
+            else:
+                self.completed += 1
+                await self.jobs.ack(job)
+        except redis.RedisError as err:
+            # The job stays claimed and runs again once its deadline passes
+            logger.warning("Could not settle job %s: %s", job.id, err)
+        finally:
+            heartbeat.cancel()
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the worker.
+
+        :return: A dict with completed and failed job counts
+        """
+        return {"completed": self.completed, "failed": self.failed}
+
+
+# Create the job queues shared by the application
+job_queue = JobQueue(
+    redis_pool.client,
+    settings.job_queues,
+    visibility_timeout=settings.job_visibility_timeout,
+    max_attempts=settings.job_max_attempts,
+    backoff=settings.job_retry_backoff,
+)
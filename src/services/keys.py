@@ -0,0 +1,108 @@
+from pathlib import Path
+from typing import Dict
+
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+
+from src.conf.config import settings
+
+
+class KeyRing:
+    """
+    The keys used to sign and verify JWTs.
+
+    Asymmetric keys are loaded from PEM files named "<kid>.pem". New tokens are signed with the
+    active key and carry its kid in their header. Every loaded key is published in the JWKS, so
+    other services can verify tokens without calling this API. To rotate, add the new key and
+    publish it, then make it active once downstream caches have picked it up. Remove the old key
+    after the longest-lived token it signed has expired.
+
+    Tokens without a kid were signed with the shared secret. They are accepted while
+    accept_secret is set, so tokens issued before the switch stay valid until they expire.
+    """
+
+    def __init__(self, secret: str, secret_algorithm: str, keys: Dict[str, Key] | None = None, active_kid: str | None = None, key_algorithm: str = "ES256", accept_secret: bool = True):
+        """
+        :param secret: The shared secret used when there is no active key
+        :param secret_algorithm: The HMAC algorithm used with the secret, e.g. HS256
+        :param keys: The asymmetric keys by kid; keys without a private part only verify
+        :param active_kid: The kid of the private key signing new tokens, or None to sign with the secret
+        :param key_algorithm: The algorithm of the asymmetric keys, e.g. ES256
+        :param accept_secret: Whether tokens signed with the secret are still accepted
+        """
+        self.secret = jwk.construct(secret, secret_algorithm)
+        self.secret_algorithm = secret_algorithm
+        self.keys = keys or {}
+        self.public_keys = {kid: key if key.is_public() else key.public_key() for kid, key in self.keys.items()}
+        self.key_algorithm = key_algorithm
+        self.accept_secret = accept_secret or active_kid is None
+        self.active_kid = active_kid
+        if active_kid is not None and (active_kid not in self.keys or self.keys[active_kid].is_public()):
+            raise ValueError(f"No private key with kid {active_kid!r}")
+
+    @classmethod
+    def from_directory(cls, path: str, active_kid: str | None, key_algorithm: str, secret: str, secret_algorithm: str, accept_secret: bool = True) -> "KeyRing":
+        """
+        Load every "<kid>.pem" file of a directory.
+
+        :param path: The directory holding the PEM files
+        :param active_kid: The kid of the private key signing new tokens
+        :param key_algorithm: The algorithm of the keys, e.g. ES256
+        :param secret: The shared secret of tokens issued before the keys
+        :param secret_algorithm: The HMAC algorithm used with the secret
+        :param accept_secret: Whether tokens signed with the secret are still accepted
+        :return: The key ring
+        """
+        keys = {file.stem: jwk.construct(file.read_bytes(), key_algorithm) for file in sorted(Path(path).glob("*.pem"))}
+        return cls(secret, secret_algorithm, keys, active_kid, key_algorithm, accept_secret)
+
+    def encode(self, claims: dict) -> str:
+        """
+        Sign claims with the active key.
+
+        :param claims: The claims of the token
+        :return: The encoded token
+        """
+        if self.active_kid is None:
+            return jwt.encode(claims, self.secret, algorithm=self.secret_algorithm)
+        return jwt.encode(claims, self.keys[self.active_kid], algorithm=self.key_algorithm, headers={"kid": self.active_kid})
+
+    def decode(self, token: str) -> dict:
+        """
+        Verify a token with the key named by its kid, or with the secret if it has none.
+
+        :param token: The encoded token
+        :return: The claims of the token
+        :raises JWTError: If the token is malformed, expired, signed with an unknown key or badly signed
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            if not self.accept_secret:
+                raise JWTError("Tokens signed with the shared secret are no longer accepted")
+            return jwt.decode(token, self.secret, algorithms=[self.secret_algorithm])
+        key = self.public_keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown key id {kid!r}")
+        return jwt.decode(token, key, algorithms=[self.key_algorithm])
+
+    def jwks(self) -> dict:
+        """
+        Get the public keys as a JSON Web Key Set.
+
+        :return: The JWKS document
+        """
+        return {"keys": [{**key.to_dict(), "kid": kid, "alg": self.key_algorithm, "use": "sig"} for kid, key in self.public_keys.items()]}
+
+
+# Create the key ring shared by the application
+if settings.jwt_keys_dir:
+    key_ring = KeyRing.from_directory(
+        settings.jwt_keys_dir,
+        active_kid=settings.jwt_active_kid or None,
+        key_algorithm=settings.jwt_key_algorithm,
+        secret=settings.secret_key,
+        secret_algorithm=settings.algorithm,
+        accept_secret=settings.jwt_accept_secret_tokens,
+    )
+else:
+    key_ring = KeyRing(settings.secret_key, settings.algorithm)
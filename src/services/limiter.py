@@ -0,0 +1,270 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import redis.asyncio as redis
+from fastapi import Depends, HTTPException, status
+
+from src.conf.config import settings
+from src.services.circuit import fail_policy
+from src.services.redis_pool import redis_pool
+from src.services.auth import auth_service, Principal
+
+
+@dataclass(frozen=True)
+class Limit:
+    """
+    A number of requests allowed per window.
+    """
+    times: int
+    seconds: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """
+        Parse a limit written as "<times>/<seconds>", e.g. "10/60".
+
+        :param value: The limit
+        :return: The parsed limit
+        """
+        times, _, seconds = value.partition("/")
+        return cls(int(times), int(seconds))
+
+    def describe(self) -> str:
+        """
+        Describe the limit for the API documentation.
+
+        :return: e.g. "No more than 10 requests per minute"
+        """
+        window = "minute" if self.seconds == 60 else f"{self.seconds} seconds"
+        return f"No more than {self.times} requests per {window}"
+
+
+class Limits:
+    """
+    The per-route and per-user limits configured in Settings.
+    """
+
+    def __init__(self, default: str, routes: Dict[str, str], users: Dict[str, str]):
+        """
+        :param default: The limit of routes without their own
+        :param routes: The limits by route name
+        :param users: Limits overriding the route limits, by "<user id>:<route name>" or by "<user id>" for every route
+        """
+        self.default = Limit.parse(default)
+        self.routes = {route: Limit.parse(value) for route, value in routes.items()}
+        self.users = {key: Limit.parse(value) for key, value in users.items()}
+
+    def get(self, route: str, user_id: int | None = None) -> Limit:
+        """
+        Get the limit of a route, for a user if given.
+
+        :param route: The route name
+        :param user_id: The id of the user
+        :return: The limit
+        """
+        if user_id is not None:
+            limit = self.users.get(f"{user_id}:{route}") or self.users.get(str(user_id))
+            if limit is not None:
+                return limit
+        return self.routes.get(route, self.default)
+
+
+class LocalBuckets:
+    """
+    Per-worker token buckets filled from the shared Redis counters.
+
+    A bucket holds the requests still allowed for a key as of the last sync. Requests are
+    taken from it without calling Redis and recorded as pending, and the pending requests
+    are pushed to Redis in batches, which also refills the buckets. Between syncs each worker
+    may allow what is left of the window, so the limit is only approximately enforced.
+    """
+
+    def __init__(self):
+        self.tokens: Dict[str, float] = {}
+        self.pending: Dict[str, Tuple[Limit, int]] = {}
+
+    def take(self, key: str, limit: Limit, cost: int) -> bool | None:
+        """
+        Take requests from a bucket.
+
+        :param key: The key of the bucket
+        :param limit: The limit of the key
+        :param cost: The number of requests to take
+        :return: Whether they are allowed, or None if the bucket has to be filled from Redis first
+        """
+        tokens = self.tokens.get(key)
+        if tokens is None:
+            return None
+        if tokens < cost:
+            return False
+        self.tokens[key] = tokens - cost
+        _, pending = self.pending.get(key, (limit, 0))
+        self.pending[key] = (limit, pending + cost)
+        return True
+
+    def fill(self, key: str, limit: Limit, count: int) -> None:
+        """
+        Fill a bucket from the count of requests in Redis.
+
+        :param key: The key of the bucket
+        :param limit: The limit of the key
+        :param count: The number of requests counted in the sliding window
+        """
+        self.tokens[key] = max(0, limit.times - count)
+
+
+class RateLimiter:
+    """
+    A distributed sliding-window rate limiter costing one Redis call per check.
+
+    Requests are counted in fixed windows and the count of the previous window is weighted by
+    how much of it still overlaps the sliding window. The check and the increment run in a
+    single Lua script, so concurrent workers cannot both take the last request. In approximate
+    mode most checks are answered from LocalBuckets instead and Redis is updated in batches.
+    """
+    # KEYS[1]: counter of the current window, KEYS[2]: counter of the previous window
+    # ARGV: limit, window length in ms, elapsed time of the current window in ms, cost,
+    # and 1 to count the requests even over the limit (used when syncing local buckets).
+    # Returns {allowed, requests counted in the sliding window, ms to wait before retrying}.
+    SCRIPT = """
+    local limit = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local elapsed = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+    local count = previous * (window - elapsed) / window + current
+    if count + cost > limit and ARGV[5] ~= '1' then
+        local wait = window - elapsed
+        if previous > 0 and limit - current - cost >= 0 then
+            wait = wait - (limit - current - cost) * window / previous
+        end
+        return {0, math.ceil(count), math.ceil(wait)}
+    end
+    if cost > 0 then
+        redis.call('INCRBY', KEYS[1], cost)
+        redis.call('PEXPIRE', KEYS[1], window * 2)
+    end
+    return {1, math.ceil(count + cost), 0}
+    """
+
+    def __init__(self, r: redis.Redis, approximate: bool = False, sync_interval: float = 1.0, prefix: str = "ratelimit"):
+        """
+        :param r: The async Redis client
+        :param approximate: Whether to answer checks from local token buckets synced in batches
+        :param sync_interval: The time between two syncs of the local buckets, in seconds
+        :param prefix: The prefix of the Redis keys
+        """
+        self.r = r
+        self.approximate = approximate
+        self.sync_interval = sync_interval
+        self.prefix = prefix
+        self.buckets = LocalBuckets()
+        self._script = r.register_script(self.SCRIPT)
+
+    def _arguments(self, key: str, limit: Limit, cost: int, force: bool = False) -> Tuple[list, list]:
+        """
+        Build the keys and arguments of the script for the current time.
+
+        :param key: The key being limited
+        :param limit: The limit of the key
+        :param cost: The number of requests
+        :param force: Whether to count the requests even over the limit
+        :return: The keys and the arguments
+        """
+        window = limit.seconds * 1000
+        now = int(time.time() * 1000)
+        index = now // window
+        keys = [f"{self.prefix}:{key}:{index}", f"{self.prefix}:{key}:{index - 1}"]
+        return keys, [limit.times, window, now % window, cost, int(force)]
+
+    async def hit(self, key: str, limit: Limit, cost: int = 1) -> Tuple[bool, float]:
+        """
+        Count requests against a limit.
+
+        :param key: The key being limited, e.g. the route and the user
+        :param limit: The limit of the key
+        :param cost: The number of requests
+        :return: Whether the requests are allowed, and the time to wait before retrying in seconds
+        """
+        if self.approximate:
+            allowed = self.buckets.take(key, limit, cost)
+            if allowed is not None:
+                return allowed, 0 if allowed else self.sync_interval
+        keys, args = self._arguments(key, limit, cost)
+        allowed, count, wait = await self._script(keys=keys, args=args)
+        if self.approximate:
+            self.buckets.fill(key, limit, count)
+        return bool(allowed), wait / 1000
+
+    async def sync(self) -> None:
+        """
+        Push the requests taken from local buckets to Redis in one pipeline and refill the buckets.
+
+        Buckets without pending requests are dropped, so the next check of an idle key goes to Redis.
+        """
+        pending, self.buckets.pending = self.buckets.pending, {}
+        for key in set(self.buckets.tokens) - set(pending):
+            del self.buckets.tokens[key]
+        if not pending:
+            return
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                for key, (limit, cost) in pending.items():
+                    keys, args = self._arguments(key, limit, cost, force=True)
+                    await self._script(keys=keys, args=args, client=pipe)
+                results = await pipe.execute()
+        except redis.RedisError:
+            # Keep the requests for the next sync
+            for key, (limit, cost) in pending.items():
+                _, taken = self.buckets.pending.get(key, (limit, 0))
+                self.buckets.pending[key] = (limit, taken + cost)
+            raise
+        for (key, (limit, _)), (_, count, _) in zip(pending.items(), results):
+            self.buckets.fill(key, limit, count)
+
+    async def run(self) -> None:
+        """
+        Sync the local buckets every sync_interval seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except redis.RedisError:
+                pass
+
+
+# Create the limits and the rate limiter shared by the application
+limits = Limits(settings.rate_limit_default, settings.rate_limits, settings.rate_limit_users)
+limiter = RateLimiter(
+    redis_pool.client,
+    approximate=settings.rate_limit_approximate,
+    sync_interval=settings.rate_limit_sync_interval,
+)
+
+
+def rate_limit(route: str):
+    """
+    Create a dependency limiting a route per user, with the limits configured in Settings.
+
+    :param route: The route name the limits are configured for
+    :return: The dependency, raising HTTPException 429 with a Retry-After header over the limit,
+        or applying the failure policy of the route if Redis is unavailable
+    """
+    async def dependency(principal: Principal = Depends(auth_service.current_principal)):
+        try:
+            allowed, wait = await limiter.hit(f"{route}:{principal.id}", limits.get(route, principal.id))
+        except redis.RedisError:
+            fail_policy.check(route)
+            return
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+    return dependency
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from email.message import EmailMessage
+from typing import List
+
+import aiosmtplib
+
+from src.conf.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """
+    A pool of long-lived, authenticated SMTP connections.
+
+    Connections are opened and logged in on first use, then kept open and reused, so most
+    messages skip the TLS handshake and the login. A connection the server has closed is
+    dropped and replaced on next use.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str | None, password: str | None, use_tls: bool, start_tls: bool, validate_certs: bool = True, size: int = 4, timeout: float = 30):
+        """
+        :param hostname: The host of the SMTP server
+        :param port: The port of the SMTP server
+        :param username: The username to log in with, or None to send without logging in
+        :param password: The password to log in with
+        :param use_tls: Whether to connect over TLS
+        :param start_tls: Whether to upgrade the connection with STARTTLS
+        :param validate_certs: Whether to validate the server certificate
+        :param size: The maximum number of open connections
+        :param timeout: The timeout of SMTP operations, in seconds
+        """
+        self.options = dict(
+            hostname=hostname,
+            port=port,
+            username=username,
+            password=password,
+            use_tls=use_tls,
+            start_tls=start_tls,
+            validate_certs=validate_certs,
+            timeout=timeout,
+        )
+        self.size = size
+        self._idle: List[aiosmtplib.SMTP] = []
+        self._slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        """
+        Take a connection from the pool, waiting for a free slot and connecting if needed.
+
+        :return: A connected, logged-in SMTP client
+        """
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                smtp = self._idle.pop()
+                if smtp.is_connected:
+                    return smtp
+            smtp = aiosmtplib.SMTP(**self.options)
+            await smtp.connect()
+            self.opened += 1
+            return smtp
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, smtp: aiosmtplib.SMTP, broken: bool = False) -> None:
+        """
+        Give a connection back to the pool.
+
+        :param smtp: The connection
+        :param broken: Whether the connection failed and must be closed instead of reused
+        """
+        if broken or not smtp.is_connected:
+            smtp.close()
+        else:
+            self._idle.append(smtp)
+        self._slots.release()
+
+    async def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        idle, self._idle = self._idle, []
+        for smtp in idle:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+
+@dataclass
+class _Envelope:
+    """
+    A queued message and the number of failed attempts to send it.
+    """
+    message: EmailMessage
+    attempts: int = 0
+
+
+class Mailer:
+    """
+    Sends emails from an in-process queue through an SMTPPool.
+
+    A bounded number of workers take messages from the queue, each sending up to batch_size
+    queued messages over one connection. Messages that fail with a temporary error or a lost
+    connection are queued again after an exponential backoff, up to max_attempts. Permanent
+    errors, such as a refused recipient, are logged and dropped.
+    """
+
+    def __init__(self, pool: SMTPPool, concurrency: int = 4, batch_size: int = 20, max_queue: int = 10000, max_attempts: int = 5, backoff: float = 1.0):
+        """
+        :param pool: The SMTP connection pool
+        :param concurrency: The number of workers sending in parallel
+        :param batch_size: The maximum number of messages sent over a connection in a row
+        :param max_queue: The maximum number of queued messages; enqueue waits while the queue is full
+        :param max_attempts: The number of attempts before a message is dropped
+        :param backoff: The delay before the first retry, in seconds; it doubles with every attempt
+        """
+        self.pool = pool
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.queue: asyncio.Queue[_Envelope] = asyncio.Queue(max_queue)
+        self._workers: List[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        """
+        Start the workers.
+        """
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """
+        Send what is queued or waiting for a retry, waiting up to timeout seconds, then stop the
+        workers and close the pool. Messages still unsent are logged and counted as failed.
+
+        :param timeout: How long to wait for the queue to drain, in seconds
+        """
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            unsent = self.queue.qsize() + len(self._retries)
+            self.failed += unsent
+            logger.warning("Stopping the mailer with %d unsent messages", unsent)
+        for task in [*self._workers, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers = []
+        await self.pool.close()
+
+    async def _drain(self) -> None:
+        """
+        Wait until the queue is empty and no message is waiting for a retry.
+        """
+        while True:
+            await self.queue.join()
+            if not self._retries:
+                return
+            await asyncio.wait(set(self._retries))
+
+    async def enqueue(self, message: EmailMessage) -> None:
+        """
+        Queue a message for sending.
+
+        :param message: The message, with its From and To headers set
+        """
+        await self.queue.put(_Envelope(message))
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        Send a message now over a pooled connection, without queueing or retrying it.
+
+        :param message: The message, with its From and To headers set
+        :raises aiosmtplib.SMTPException: If the server refuses the message
+        :raises OSError: If the server cannot be reached
+        """
+        smtp = await self.pool.acquire()
+        broken = False
+        try:
+            await smtp.send_message(message)
+            self.sent += 1
+        except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError, OSError):
+            broken = True
+            self.failed += 1
+            raise
+        except aiosmtplib.SMTPException:
+            self.failed += 1
+            raise
+        finally:
+            self.pool.release(smtp, broken)
+
+    def _next_batch(self, first: _Envelope) -> List[_Envelope]:
+        """
+        Take more queued messages to send along with a first one.
+
+        :param first: The message already taken from the queue
+        :return: Up to batch_size messages
+        """
+        batch = [first]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _work(self) -> None:
+        """
+        Send batches of queued messages until cancelled.
+
+        A batch failing with an unexpected error is logged and counted as failed, so the
+        worker keeps running.
+        """
+        while True:
+            batch = self._next_batch(await self.queue.get())
+            try:
+                await self._send_batch(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Could not send emails to %s", ", ".join(str(envelope.message["To"]) for envelope in batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _send_batch(self, batch: List[_Envelope]) -> None:
+        """
+        Send messages over one connection.
+
+        :param batch: The messages to send
+        """
+        try:
+            smtp = await self.pool.acquire()
+        except (aiosmtplib.SMTPException, OSError) as err:
+            for envelope in batch:
+                self._fail(envelope, err)
+            return
+        broken = False
+        try:
+            for index, envelope in enumerate(batch):
+                try:
+                    await smtp.send_message(envelope.message)
+                    self.sent += 1
+                except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError, OSError) as err:
+                    # The connection is gone: retry this message and the rest of the batch
+                    broken = True
+                    for pending in batch[index:]:
+                        self._fail(pending, err)
+                    break
+                except aiosmtplib.SMTPResponseException as err:
+                    # 4xx replies are temporary, 5xx replies are permanent
+                    self._fail(envelope, err, temporary=400 <= err.code < 500)
+                except aiosmtplib.SMTPRecipientsRefused as err:
+                    self._fail(envelope, err, temporary=False)
+                except aiosmtplib.SMTPException as err:
+                    self._fail(envelope, err)
+        finally:
+            self.pool.release(smtp, broken)
+
+    def _fail(self, envelope: _Envelope, err: Exception, temporary: bool = True) -> None:
+        """
+        Queue a message again after a backoff, or drop it after a permanent error or max_attempts.
+
+        :param envelope: The message that failed
+        :param err: The error it failed with
+        :param temporary: Whether sending the message again may succeed
+        """
+        envelope.attempts += 1
+        if not temporary or envelope.attempts >= self.max_attempts:
+            self.failed += 1
+            logger.error("Could not send email to %s after %d attempts: %s", envelope.message["To"], envelope.attempts, err)
+            return
+        task = asyncio.create_task(self._requeue(envelope, self.backoff * 2 ** (envelope.attempts - 1)))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, envelope: _Envelope, delay: float) -> None:
+        """
+        Queue a message again after a delay.
+
+        :param envelope: The message
+        :param delay: The delay, in seconds
+        """
+        await asyncio.sleep(delay)
+        await self.queue.put(envelope)
+
+    def stats(self) -> dict:
+        """
+        Get the queue depth and counters of the mailer.
+
+        :return: A dict with queued, retrying, sent, failed and open connection counts
+        """
+        return {
+            "queued": self.queue.qsize(),
+            "retrying": len(self._retries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "connections_opened": self.pool.opened,
+        }
+
+
+# Create the mailer shared by the application
+mailer = Mailer(
+    SMTPPool(
+        settings.mail_server,
+        settings.mail_port,
+        settings.mail_username,
+        settings.mail_password,
+        use_tls=settings.mail_ssl_tls,
+        start_tls=settings.mail_starttls,
+        validate_certs=settings.mail_validate_certs,
+        size=settings.mail_concurrency,
+        timeout=settings.mail_timeout,
+    ),
+    concurrency=settings.mail_concurrency,
+    batch_size=settings.mail_batch_size,
+    max_queue=settings.mail_queue_size,
+    max_attempts=settings.mail_max_attempts,
+    backoff=settings.mail_retry_backoff,
+)
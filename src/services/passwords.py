@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with bcrypt on a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL while it works, so the pool keeps the event loop free and lets
+    concurrent logins use every core. Calls beyond the pool size wait in a bounded queue;
+    once it is full new calls are refused with 503 instead of piling up.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_queue: int):
+        """
+        :param rounds: The bcrypt cost; hashes made with another cost are reported as needing a rehash
+        :param workers: The number of threads hashing in parallel
+        :param max_queue: The number of calls allowed to wait for a free thread
+        """
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, func: Callable, *args):
+        """
+        Run a blocking call on the pool.
+
+        The counters follow the call on the pool rather than the caller: if the caller is
+        cancelled, the call still counts as pending until its thread finishes it.
+
+        :param func: The function to call
+        :param args: The arguments of the call
+        :return: The result of the call
+        :raises HTTPException: If the queue is full
+        """
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many password checks in progress, try again later")
+        future = asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        self.pending += 1
+        future.add_done_callback(self._done)
+        return await asyncio.shield(future)
+
+    def _done(self, future: asyncio.Future) -> None:
+        """
+        Update the counters once a call on the pool has finished.
+
+        :param future: The future of the call
+        """
+        self.pending -= 1
+        if not future.cancelled():
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured cost.
+
+        :param password: The password in plain text
+        :return: The hashed password
+        """
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """
+        Verify a password against a hash.
+
+        :param password: The password in plain text
+        :param hashed: The hashed password to compare against
+        :return: True if the password is correct, False otherwise
+        """
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, str | None]:
+        """
+        Verify a password and rehash it if the hash was made with another cost.
+
+        :param password: The password in plain text
+        :param hashed: The hashed password to compare against
+        :return: A (verified, new hash) pair; the new hash is None when the stored one is current
+        """
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        """
+        Get the queue depth and counters of the pool.
+
+        :return: A dict with workers, pending, queued, completed and rejected
+        """
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+# Create the password hasher shared by the application
+password_hasher = PasswordHasher(
+    rounds=settings.bcrypt_rounds,
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+)
@@ -0,0 +1,162 @@
+import asyncio
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from src.conf.config import settings
+from src.services.circuit import CircuitBreaker, PoolExhaustedError, redis_breaker
+
+
+class GuardedConnectionPool(redis.BlockingConnectionPool):
+    """
+    A blocking connection pool telling a timeout waiting for a free connection apart from
+    a connection error, so the circuit breaker does not count a busy pool as Redis failing.
+    """
+
+    async def get_connection(self, command_name, *keys, **options):
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as err:
+            # BlockingConnectionPool raises a ConnectionError from the timeout of its wait
+            if isinstance(err.__cause__, asyncio.TimeoutError):
+                raise PoolExhaustedError("No Redis connection available") from err
+            raise
+
+
+class GuardedPipeline(Pipeline):
+    """
+    A pipeline whose execution goes through a circuit breaker.
+    """
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute(self, raise_on_error: bool = True):
+        return await self.breaker.call(super().execute, raise_on_error)
+
+
+class GuardedRedis(redis.Redis):
+    """
+    A Redis client sending every command, script and pipeline through a circuit breaker.
+    """
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        return await self.breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> GuardedPipeline:
+        return GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint, breaker=self.breaker)
+
+
+class RedisPool:
+    """
+    The single Redis connection pool of the application.
+
+    Every service shares one client on a bounded, blocking pool: when all connections are busy,
+    callers wait up to pool_timeout for one instead of opening more, then get a PoolExhaustedError
+    that does not count against the circuit breaker. Connections are opened on
+    first use, health-checked when idle and closed by the application lifespan. Every call goes
+    through a circuit breaker, so an unreachable Redis fails fast with a redis ConnectionError.
+
+    Pub/sub subscriptions block on reads for as long as no message comes, so they use a separate
+    client without a socket timeout, on connections of their own.
+    """
+
+    def __init__(self, host: str, port: int, db: int = 0, max_connections: int = 50, pool_timeout: float = 1.0, socket_timeout: float = 0.5, connect_timeout: float = 0.5, health_check_interval: int = 30, breaker: CircuitBreaker | None = None):
+        """
+        :param host: The host of the Redis server
+        :param port: The port of the Redis server
+        :param db: The Redis database number
+        :param max_connections: The maximum number of open connections
+        :param pool_timeout: How long to wait for a free connection, in seconds
+        :param socket_timeout: How long to wait for a reply, in seconds
+        :param connect_timeout: How long to wait for a connection to open, in seconds
+        :param health_check_interval: Idle time after which a connection is pinged before use, in seconds
+        :param breaker: The circuit breaker guarding the calls, or None for a plain client
+        """
+        self.pool = GuardedConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=connect_timeout,
+            health_check_interval=health_check_interval,
+        )
+        self.subscriber = redis.Redis(
+            host=host,
+            port=port,
+            db=db,
+            socket_timeout=None,
+            socket_connect_timeout=connect_timeout,
+            health_check_interval=health_check_interval,
+        )
+        self.breaker = breaker
+        if breaker is None:
+            self.client = redis.Redis(connection_pool=self.pool)
+        else:
+            self.client = GuardedRedis(connection_pool=self.pool, breaker=breaker)
+
+    def pipeline(self, transaction: bool = False):
+        """
+        Start a pipeline sending several commands in one round-trip.
+
+        Use it as ``async with redis_pool.pipeline() as pipe:`` and ``await pipe.execute()``.
+
+        :param transaction: Whether to wrap the commands in MULTI/EXEC
+        :return: The pipeline
+        """
+        return self.client.pipeline(transaction=transaction)
+
+    async def ping(self) -> bool:
+        """
+        Check that Redis answers.
+
+        :return: True if it does, False otherwise
+        """
+        try:
+            return await self.client.ping()
+        except redis.RedisError:
+            return False
+
+    async def close(self) -> None:
+        """
+        Close every connection of the pool and of the subscriber. Connections are opened again on next use.
+        """
+        await self.pool.disconnect()
+        await self.subscriber.connection_pool.disconnect()
+
+    def stats(self) -> dict:
+        """
+        Get the usage of the pool.
+
+        redis-py has no public API for the connection counts, so they are read from private
+        attributes of BlockingConnectionPool; check them when upgrading redis (pinned in
+        requirements.txt).
+
+        :return: A dict with max_connections, in_use and idle connection counts, and the breaker state
+        """
+        return {
+            "max_connections": self.pool.max_connections,
+            "in_use": len(self.pool._in_use_connections),
+            "idle": len(self.pool._available_connections),
+            "breaker": self.breaker.stats() if self.breaker else None,
+        }
+
+
+# Create the Redis pool shared by the application
+redis_pool = RedisPool(
+    settings.redis_host,
+    settings.redis_port,
+    max_connections=settings.redis_max_connections,
+    pool_timeout=settings.redis_pool_timeout,
+    socket_timeout=settings.redis_socket_timeout,
+    connect_timeout=settings.redis_connect_timeout,
+    health_check_interval=settings.redis_health_check_interval,
+    breaker=redis_breaker,
+)
@@ -0,0 +1,84 @@
+import redis.asyncio as redis
+
+from src.services.redis_pool import redis_pool
+
+
+class RefreshTokenStore:
+    """
+    Keeps refresh token families in Redis.
+
+    Every login starts a family, and every refresh rotates it: the family key holds the id (jti)
+    of the only refresh token that may still be used, and expires with that token. Presenting an
+    older token of the family means it was stolen or replayed, so the whole family is revoked.
+    """
+    # Results of rotate
+    ROTATED = 1
+    UNKNOWN = 0
+    REUSED = -1
+
+    # Rotates a family if the presented token is its current one, revokes it otherwise.
+    # KEYS[1]: the family key; ARGV: presented jti, new jti, time-to-live in seconds
+    ROTATE_SCRIPT = """
+    local current = redis.call('GET', KEYS[1])
+    if not current then
+        return 0
+    end
+    if current ~= ARGV[1] then
+        redis.call('DEL', KEYS[1])
+        return -1
+    end
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+    """
+
+    def __init__(self, r: redis.Redis):
+        """
+        :param r: The async Redis client
+        """
+        self.r = r
+        self._rotate = r.register_script(self.ROTATE_SCRIPT)
+
+    @staticmethod
+    def key(family: str) -> str:
+        """
+        Get the Redis key of a token family.
+
+        :param family: The id of the family
+        :return: The Redis key
+        """
+        return f"refresh-family:{family}"
+
+    async def start(self, family: str, jti: str, ttl: int) -> None:
+        """
+        Start a token family with its first refresh token.
+
+        :param family: The id of the family
+        :param jti: The id of the first refresh token
+        :param ttl: The lifetime of the refresh token, in seconds
+        """
+        await self.r.set(self.key(family), jti, ex=ttl)
+
+    async def rotate(self, family: str, jti: str, new_jti: str, ttl: int) -> int:
+        """
+        Atomically replace the current refresh token of a family, revoking the family on reuse.
+
+        :param family: The id of the family
+        :param jti: The id of the presented refresh token
+        :param new_jti: The id of the refresh token replacing it
+        :param ttl: The lifetime of the new refresh token, in seconds
+        :return: ROTATED, UNKNOWN if the family expired or was revoked, or REUSED if the
+            presented token had already been rotated
+        """
+        return int(await self._rotate(keys=[self.key(family)], args=[jti, new_jti, ttl]))
+
+    async def revoke(self, family: str) -> None:
+        """
+        Revoke a token family, e.g. on logout.
+
+        :param family: The id of the family
+        """
+        await self.r.delete(self.key(family))
+
+
+# Create the refresh token store shared by the application
+refresh_tokens = RefreshTokenStore(redis_pool.client)
@@ -0,0 +1,261 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import cloudinary
+import cloudinary.uploader
+import redis.asyncio as redis
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.redis_pool import redis_pool
+
+
+# Leading bytes of the accepted image types, with their file extensions
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+)
+
+
+@dataclass
+class Image:
+    """
+    An uploaded image, spooled to a temporary file and identified by the sha256 of its content.
+    """
+    file: BinaryIO
+    digest: str
+    content_type: str
+    extension: str
+    size: int
+
+    @property
+    def name(self) -> str:
+        """
+        :return: The file name of the image, derived from its content
+        """
+        return self.digest + self.extension
+
+
+def sniff_image(head: bytes) -> tuple[str, str] | None:
+    """
+    Detect the type of an image from its first bytes, ignoring the declared content type.
+
+    :param head: The first bytes of the file
+    :return: The content type and file extension, or None if the type is not accepted
+    """
+    for signature, content_type, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return None
+
+
+async def read_image(file: UploadFile, max_size: int, chunk_size: int = 64 * 1024) -> Image:
+    """
+    Read an uploaded image in chunks, checking its type and size and hashing it on the way.
+
+    :param file: The uploaded file
+    :param max_size: The maximum size of the image, in bytes
+    :param chunk_size: The number of bytes read at a time
+    :return: The image, rewound to its start
+    :raises HTTPException: 415 if the file is not a PNG, JPEG, GIF or WebP image,
+        413 if it is larger than max_size
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+    digest = hashlib.sha256()
+    size = 0
+    kind = None
+    try:
+        while chunk := await file.read(chunk_size):
+            if kind is None:
+                kind = sniff_image(chunk)
+                if kind is None:
+                    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Avatar must be a PNG, JPEG, GIF or WebP image")
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Avatar must not exceed {max_size} bytes")
+            digest.update(chunk)
+            spool.write(chunk)
+        if kind is None:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Avatar must be a PNG, JPEG, GIF or WebP image")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return Image(spool, digest.hexdigest(), kind[0], kind[1], size)
+
+
+class AvatarStorage(ABC):
+    """
+    Where avatar images are kept. Images are stored under their content hash, so storing the
+    same image twice keeps one copy.
+    """
+    name = "base"
+
+    @abstractmethod
+    async def save(self, image: Image) -> str:
+        """
+        Store an image.
+
+        :param image: The image
+        :return: The public URL of the image
+        """
+
+
+class LocalAvatarStorage(AvatarStorage):
+    """
+    Keeps avatars in a local directory, served by the application as static files. The
+    directory may also be a mounted S3-compatible bucket served by a proxy at base_url.
+    """
+    name = "local"
+
+    def __init__(self, directory: str, base_url: str):
+        """
+        :param directory: The directory of the images, created if missing
+        :param base_url: The URL the directory is served at
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+
+    def _write(self, image: Image) -> None:
+        """
+        Copy an image into the directory, unless it is already there.
+
+        :param image: The image
+        """
+        path = self.directory / image.name
+        if path.exists():
+            return
+        # Write to a temporary name first, so a partial file is never served
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(image.file, out)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    async def save(self, image: Image) -> str:
+        await run_in_threadpool(self._write, image)
+        return f"{self.base_url}/{image.name}"
+
+
+class CloudinaryAvatarStorage(AvatarStorage):
+    """
+    Keeps avatars on Cloudinary. The SDK is blocking, so uploads run in the threadpool.
+    """
+    name = "cloudinary"
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, folder: str = "NotesApp/avatars", size: int = 250):
+        """
+        :param cloud_name: The name of the Cloudinary account
+        :param api_key: The API key of the account
+        :param api_secret: The API secret of the account
+        :param folder: The folder of the images
+        :param size: The width and height of the served avatars, in pixels
+        """
+        self.config = dict(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.folder = folder
+        self.size = size
+
+    async def save(self, image: Image) -> str:
+        public_id = f"{self.folder}/{image.digest}"
+        result = await run_in_threadpool(cloudinary.uploader.upload, image.file, public_id=public_id, overwrite=False, resource_type="image", **self.config)
+        return cloudinary.CloudinaryImage(public_id).build_url(width=self.size, height=self.size, crop="fill", version=result.get("version"), **self.config)
+
+
+class Avatars:
+    """
+    Stores uploaded avatars, skipping the upload of images already stored.
+
+    The URL of every stored image is kept in Redis under its content hash, so uploading an image
+    again costs a hash and a lookup instead of an upload. Without Redis, images are uploaded.
+    """
+
+    # Room for the multipart boundaries and part headers around the image, in bytes
+    MULTIPART_OVERHEAD = 16 * 1024
+
+    def __init__(self, storage: AvatarStorage, r: redis.Redis, max_size: int = 5 * 1024 * 1024, chunk_size: int = 64 * 1024):
+        """
+        :param storage: The storage backend
+        :param r: The async Redis client
+        :param max_size: The maximum size of an avatar, in bytes
+        :param chunk_size: The number of bytes read from the upload at a time
+        """
+        self.storage = storage
+        self.r = r
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+
+    def key(self, digest: str) -> str:
+        """
+        Get the Redis key of a stored image.
+
+        :param digest: The sha256 of the image
+        :return: The Redis key
+        """
+        return f"avatar:{self.storage.name}:{digest}"
+
+    def check_content_length(self, request: Request) -> None:
+        """
+        Refuse an upload from its Content-Length, before its body is received and parsed.
+
+        The multipart parser spools the whole body before the image can be read, so without
+        this check an oversized upload is only refused once it has been received.
+
+        :param request: The upload request
+        :raises HTTPException: 411 if the request has no Content-Length, 400 if it is invalid,
+            413 if the body cannot hold an image of at most max_size bytes
+        """
+        length = request.headers.get("content-length")
+        if length is None:
+            raise HTTPException(status_code=status.HTTP_411_LENGTH_REQUIRED, detail="Content-Length is required")
+        if not length.isdigit():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length")
+        if int(length) > self.max_size + self.MULTIPART_OVERHEAD:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Avatar must not exceed {self.max_size} bytes")
+
+    async def upload(self, file: UploadFile) -> str:
+        """
+        Check and store an uploaded avatar.
+
+        :param file: The uploaded file
+        :return: The public URL of the avatar
+        :raises HTTPException: 415 or 413 if the file is not an accepted image
+        """
+        image = await read_image(file, self.max_size, self.chunk_size)
+        try:
+            try:
+                url = await self.r.get(self.key(image.digest))
+            except redis.RedisError:
+                url = None
+            if url:
+                return url.decode() if isinstance(url, bytes) else url
+            url = await self.storage.save(image)
+            try:
+                await self.r.set(self.key(image.digest), url)
+            except redis.RedisError:
+                pass
+            return url
+        finally:
+            image.file.close()
+
+
+# Create the avatar storage shared by the application
+if settings.avatar_storage == "local":
+    avatar_storage: AvatarStorage = LocalAvatarStorage(settings.avatar_dir, settings.avatar_base_url)
+else:
+    avatar_storage = CloudinaryAvatarStorage(settings.cloudinary_name, settings.cloudinary_api_key, settings.cloudinary_api_secret)
+avatars = Avatars(avatar_storage, redis_pool.client, max_size=settings.avatar_max_size, chunk_size=settings.avatar_chunk_size)
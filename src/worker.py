@@ -0,0 +1,80 @@
+"""
+Runs background jobs from the Redis job queues, apart from the API workers.
+
+Run one or more processes from the project root, optionally limited to some queues:
+
+    python -m src.worker [queue ...]
+"""
+import asyncio
+import datetime
+import logging
+import signal
+import sys
+from typing import List
+
+import redis.asyncio as redis
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.conf.config import settings
+from src.services.birthdays import birthday_greetings
+from src.services.email import send_birthday_email, send_email
+from src.services.jobs import Worker, job_queue
+from src.services.mailer import mailer
+from src.services.redis_pool import redis_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+# Define the job handlers by job name
+handlers = {
+    "send_email": send_email,
+    "send_birthday_email": send_birthday_email,
+}
+
+
+async def greet_birthdays_daily(interval: float = 60) -> None:
+    """
+    Queue the birthday greetings of the day once it is past settings.birthday_greetings_hour.
+
+    Every worker process checks periodically; the greetings are queued once per day whichever
+    process gets there first, and resume from their checkpoint if it stops.
+
+    Args:
+        interval (float): The time between two checks, in seconds.
+    """
+    while True:
+        if datetime.datetime.now().hour >= settings.birthday_greetings_hour:
+            try:
+                await birthday_greetings.run()
+            except (redis.RedisError, SQLAlchemyError) as err:
+                logger.warning("Could not queue the birthday greetings: %s", err)
+        await asyncio.sleep(interval)
+
+
+async def main(queues: List[str]) -> None:
+    """
+    Run the jobs of some queues and the daily birthday greetings until SIGINT or SIGTERM, then
+    finish the running jobs. Email jobs send their message before they are acknowledged, so
+    the mailer queue is not used here, only its pooled SMTP connections.
+
+    Args:
+        queues (List[str]): The names of the queues to run.
+    """
+    worker = Worker(job_queue, handlers, queues, poll_interval=settings.job_poll_interval)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+
+    greetings = asyncio.create_task(greet_birthdays_daily())
+    try:
+        await worker.run()
+    finally:
+        greetings.cancel()
+        await mailer.pool.close()
+        await redis_pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(sys.argv[1:] or list(settings.job_queues)))
@@ -0,0 +1,164 @@
+import unittest
+import datetime
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.schemas import ContactModel
+from src.repository.contacts import (
+    get_contacts,
+    get_contacts_page,
+    stream_contacts,
+    get_contact,
+    create_contact,
+    remove_contact,
+    update_contact,
+    update_contacts,
+    remove_contacts,
+    search_contacts,
+    find_contacts_fuzzy,
+    birthdays,
+    birthdays_chunk
+)
+
+
+class TestContactsQueryPlans(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs the repository against a real SQLite database and checks with EXPLAIN QUERY PLAN
+    that every SELECT on contacts is answered through an index instead of a table scan.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False, class_=AsyncSession)()
+        self.user = User(email="test@example.com", password="password")
+        self.session.add(self.user)
+        await self.session.commit()
+        self.body = ContactModel(first_name="test_name", last_name="test_last_name", email="test@example.com", phone_number=12345, birthday=datetime.date(1990, 5, 17), additional_data="test_data")
+        self.contact = await create_contact(body=self.body, db=self.session, user=self.user)
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")) and "contacts" in statement:
+            self.statements.append((statement, parameters))
+
+    async def assert_uses_index(self, *indexes, ordered=False):
+        statements, self.statements = self.statements, []
+        self.assertTrue(statements)
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._record)
+        try:
+            for statement, parameters in statements:
+                plan = [row[-1] for row in await self._explain(statement, parameters)]
+                details = [detail for detail in plan if "contacts" in detail]
+                self.assertTrue(details, statement)
+                for detail in details:
+                    self.assertTrue(detail.startswith("SEARCH contacts USING"), f"{detail}\n{statement}")
+                    if indexes:
+                        self.assertTrue(any(index in detail for index in indexes), f"{detail}\n{statement}")
+                if ordered:
+                    self.assertFalse([detail for detail in plan if "TEMP B-TREE" in detail], statement)
+        finally:
+            event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+
+    async def _explain(self, statement, parameters):
+        connection = await self.session.connection()
+        result = await connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        return result.all()
+
+    async def test_get_contacts(self):
+        await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
+        await self.assert_uses_index()
+
+    async def test_get_contacts_page(self):
+        await get_contacts_page(limit=1, user=self.user, db=self.session)
+        await get_contacts_page(limit=1, user=self.user, db=self.session, cursor="WyJhIiwgImIiLCAxXQ")
+        await self.assert_uses_index("ix_contacts_user_id_name", ordered=True)
+
+    async def test_stream_contacts(self):
+        rows = [row async for row in stream_contacts(user=self.user, db=self.session)]
+        self.assertEqual([row.email for row in rows], ["test@example.com"])
+        await self.assert_uses_index("ix_contacts_user_id_name", ordered=True)
+
+    async def test_get_contact(self):
+        await get_contact(tag_id=self.contact.id, user=self.user, db=self.session)
+        await self.assert_uses_index()
+
+    async def test_update_contact(self):
+        body = self.body.model_copy(update={"first_name": "new_name"})
+        result = await update_contact(tag_id=self.contact.id, body=body, db=self.session, user=self.user)
+        self.assertEqual(result.first_name, "new_name")
+        self.assertEqual(len(self.statements), 1)
+        await self.assert_uses_index()
+
+    async def test_remove_contact(self):
+        result = await remove_contact(tag_id=self.contact.id, db=self.session, user=self.user)
+        self.assertEqual(result.id, self.contact.id)
+        self.assertEqual(len(self.statements), 1)
+        await self.assert_uses_index()
+        self.assertIsNone(await get_contact(tag_id=self.contact.id, user=self.user, db=self.session))
+
+    async def test_update_contacts(self):
+        other = await create_contact(body=self.body.model_copy(update={"email": "test1@example.com", "phone_number": 1, "birthday": datetime.date(1985, 1, 2)}), db=self.session, user=self.user)
+        self.statements = []
+        result = await update_contacts(patch={"birthday": datetime.date(1991, 3, 4)}, user=self.user, db=self.session, criteria={"birthday__lt": "1990-01-01"})
+        self.assertEqual(result, [other.id])
+        await self.assert_uses_index()
+        result = await update_contacts(patch={"additional_data": "batch"}, user=self.user, db=self.session, ids=[self.contact.id, other.id, 999])
+        self.assertEqual(sorted(result), [self.contact.id, other.id])
+        await self.assert_uses_index()
+        contact = await get_contact(tag_id=other.id, user=self.user, db=self.session)
+        await self.session.refresh(contact)
+        self.assertEqual((contact.birthday_md, contact.additional_data), (304, "batch"))
+
+    async def test_remove_contacts(self):
+        result = await remove_contacts(user=self.user, db=self.session, ids=[self.contact.id], criteria={"last_name": "test_last_name"})
+        self.assertEqual(result, [self.contact.id])
+        await self.assert_uses_index()
+        with self.assertRaises(ValueError):
+            await remove_contacts(user=self.user, db=self.session, criteria={})
+
+    async def test_search_contacts(self):
+        await search_contacts(db=self.session, user=self.user, first_name="test_name", last_name="test_last_name")
+        await self.assert_uses_index("ix_contacts_user_id_name")
+        await search_contacts(db=self.session, user=self.user, email="test@example.com")
+        await self.assert_uses_index("ix_contacts_user_id_email", "sqlite_autoindex_contacts")
+        await search_contacts(db=self.session, user=self.user, first_name="test_name")
+        await self.assert_uses_index()
+        result = await search_contacts(db=self.session, user=self.user, phone_number__in=[12345, 1], birthday__gte=datetime.date(1990, 1, 1), order_by=["-birthday"])
+        self.assertEqual(result, [self.contact])
+        await self.assert_uses_index()
+
+    async def test_find_contacts_fuzzy(self):
+        self.assertEqual(await find_contacts_fuzzy(q="TEST_N", user=self.user, db=self.session), [self.contact])
+        self.assertEqual(await find_contacts_fuzzy(q="50%", user=self.user, db=self.session), [])
+        await self.assert_uses_index()
+
+    async def test_birthdays(self):
+        await birthdays(db=self.session, user=self.user)
+        await self.assert_uses_index("ix_contacts_user_id_birthday_md")
+        self.session.add(Contact(first_name="no_birthday", last_name="test_last_name", user_id=self.user.id))
+        await self.session.commit()
+        self.assertEqual(await birthdays(db=self.session, user=self.user, days=366), [self.contact])
+        await self.assert_uses_index()
+
+    async def test_birthdays_chunk(self):
+        self.user.confirmed = True
+        await self.session.commit()
+        self.statements = []
+        rows = await birthdays_chunk(today=datetime.date(2024, 5, 17), db=self.session)
+        self.assertEqual([(row.id, row.user_email) for row in rows], [(self.contact.id, "test@example.com")])
+        self.assertEqual(await birthdays_chunk(today=datetime.date(2024, 5, 17), db=self.session, after=(self.user.id, self.contact.id)), [])
+        self.assertEqual(await birthdays_chunk(today=datetime.date(2024, 5, 18), db=self.session), [])
+        await self.assert_uses_index("ix_contacts_birthday_md_user_id_id", ordered=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,11 @@
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 
 from src.database.models import User
 
 
 def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    mock_enqueue = AsyncMock()
+    monkeypatch.setattr("src.routes.auth.job_queue.enqueue", mock_enqueue)
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -14,6 +14,9 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    mock_enqueue.assert_awaited_once_with(
+        "emails", "send_email", email=user.get("email"), username=user.get("username"), host="http://testserver/"
+    )
 
 
 def test_repeat_create_user(client, user):
@@ -36,7 +39,9 @@ def test_login_user_not_confirmed(client, user):
     assert data["detail"] == "Email not confirmed"
 
 
-def test_login_user(client, session, user):
+def test_login_user(client, session, user, monkeypatch):
+    mock_start = AsyncMock()
+    monkeypatch.setattr("src.services.auth.refresh_tokens.start", mock_start)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
     session.commit()
@@ -47,6 +52,7 @@ def test_login_user(client, session, user):
     assert response.status_code == 200, response.text
     data = response.json()
     assert data["token_type"] == "bearer"
+    mock_start.assert_awaited_once()
 
 
 def test_login_wrong_password(client, user):
@@ -0,0 +1,5 @@
+def test_read_jwks(client):
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"keys": []}
+    assert response.headers["cache-control"] == "public, max-age=300"
@@ -0,0 +1,17 @@
+from src.conf.config import settings
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "")
+    response = client.get("/metrics", headers={"Authorization": "Bearer anything"})
+    assert response.status_code == 404, response.text
+
+
+def test_metrics_require_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "secret")
+    for headers in ({}, {"Authorization": "Bearer wrong"}):
+        response = client.get("/metrics", headers=headers)
+        assert response.status_code == 401, response.text
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200, response.text
+    assert set(response.json()) == {"redis_pool", "password_hasher", "mailer", "user_cache", "token_cache"}
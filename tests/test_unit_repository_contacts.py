@@ -1,77 +1,131 @@
 import unittest
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import datetime
 
 from src.database.models import Contact, User
 from src.schemas import ContactModel
 from src.repository.contacts import (
     get_contacts,
+    get_contacts_page,
     get_contact,
     create_contact,
+    import_contacts,
     remove_contact,
     update_contact,
     search_contacts,
-    birthdays
+    find_contacts_fuzzy,
+    birthdays,
+    _search_statement,
+    _birthday_window
 )
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
 
     async def test_get_contacts(self):
         notes = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = notes
+        self.session.execute.return_value.scalars().all.return_value = notes
         result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, notes)
 
+    async def test_get_contacts_page_has_next(self):
+        notes = [Contact(id=1, first_name="a", last_name="a"), Contact(id=2, first_name="b", last_name="b"), Contact(id=3, first_name="c", last_name="c")]
+        self.session.execute.return_value.scalars().all.return_value = notes
+        result, next_cursor = await get_contacts_page(limit=2, user=self.user, db=self.session)
+        self.assertEqual(result, notes[:2])
+        self.assertIsNotNone(next_cursor)
+        self.session.execute.return_value.scalars().all.return_value = notes[2:]
+        result, next_cursor = await get_contacts_page(limit=2, user=self.user, db=self.session, cursor=next_cursor)
+        self.assertEqual(result, notes[2:])
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_page_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await get_contacts_page(limit=2, user=self.user, db=self.session, cursor="not-a-cursor")
+
     async def test_get_contact_found(self):
         note = Contact()
-        self.session.query().filter().first.return_value = note
+        self.session.execute.return_value.scalars().first.return_value = note
         result = await get_contact(tag_id=1, user=self.user, db=self.session)
         self.assertEqual(result, note)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await get_contact(tag_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
     async def test_create_contact(self):
         body = ContactModel(first_name="test_name", last_name="test_last_name",email="test@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1)
-        self.session.query().filter().all.return_value = body
+        note = Contact()
+        self.session.execute.return_value.scalars().one.return_value = note
         result = await create_contact(body=body,db=self.session,user=self.user)
-        self.assertEqual(result.first_name, body.first_name)
-        self.assertEqual(result.last_name, body.last_name)
-        self.assertEqual(result.email,body.email)
-        self.assertEqual(result.phone_number,body.phone_number)
-        self.assertEqual(result.birthday,body.birthday)
-        self.assertEqual(result.additional_data,body.additional_data)
+        self.assertEqual(result, note)
+        values = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(values["first_name"], body.first_name)
+        self.assertEqual(values["last_name"], body.last_name)
+        self.assertEqual(values["email"],body.email)
+        self.assertEqual(values["phone_number"],body.phone_number)
+        self.assertEqual(values["birthday"],body.birthday)
+        self.assertEqual(values["additional_data"],body.additional_data)
+        self.assertEqual(values["user_id"],self.user.id)
+        self.session.commit.assert_awaited_once()
+
+    async def test_import_contacts(self):
+        row = {"first_name": "test_name", "last_name": "test_last_name", "email": "test@example.com", "phone_number": 12345, "birthday": "1990-05-17", "additional_data": "test_data"}
+        rows = [
+            (1, row),
+            (2, {**row, "email": "test1@example.com", "phone_number": 1}),
+            (3, {**row, "email": "test2@example.com", "phone_number": 12345}),
+            (4, {**row, "email": "not-an-email"}),
+            (5, None),
+        ]
+        self.session.execute.return_value.scalars().all.return_value = ["test@example.com"]
+
+        async def iterate():
+            for item in rows:
+                yield item
+
+        result = await import_contacts(rows=iterate(), user=self.user, db=self.session, chunk_size=1000)
+        self.assertEqual(result["inserted"], 1)
+        self.assertEqual(result["failed"], 4)
+        self.assertEqual([error["row"] for error in result["errors"]], [3, 4, 5, 2])
+        values = self.session.execute.call_args.args[1]
+        self.assertEqual([value["email"] for value in values], ["test@example.com", "test1@example.com"])
+        self.assertEqual(values[0]["user_id"], 1)
+        self.assertEqual(values[0]["birthday_md"], 517)
 
     async def test_remove_contact_found(self):
         note = Contact()
-        self.session.query().filter().first.return_value = note
+        self.session.execute.return_value.scalars().first.return_value = note
         result = await remove_contact(tag_id=1, db=self.session,user=self.user)
         self.assertEqual(result, note)
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await remove_contact(tag_id=1, db=self.session,user=self.user)
         self.assertIsNone(result)
 
     async def test_update_contact_found(self):
         body =ContactModel(first_name="test_name", last_name="test_last_name",email="test@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1)
-        self.session.query().filter().first.return_value = body
+        note = Contact()
+        self.session.execute.return_value.scalars().first.return_value = note
         # self.session.commit.return_value = None
         result = await update_contact(tag_id=1, body=body,db=self.session,user=self.user)
-        self.assertEqual(result, body)
+        self.assertEqual(result, note)
+        values = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(values["birthday_md"], body.birthday.month * 100 + body.birthday.day)
+        self.assertEqual(self.session.execute.await_count, 1)
 
     async def test_update_contact_not_found(self):
         body =ContactModel(first_name="test_name", last_name="test_last_name",email="test@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1)
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         # self.session.commit.return_value = None
         result = await update_contact(tag_id=1, body=body, db=self.session,user=self.user)
         self.assertIsNone(result)
@@ -81,19 +135,67 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                   ContactModel(first_name="test_name", last_name="test_last_name1",email="test@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1),
                   ContactModel(first_name="test_name", last_name="test_last_name",email="test1@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1)
                   ]
-        self.session.query().filter().all.return_value=contacts
+        self.session.execute.return_value.scalars().all.return_value=contacts
         result=await search_contacts(db=self.session,user=self.user,first_name="test_name1",last_name="test_last_name1",email="test1@example.com")
         self.assertEqual(result,contacts)
 
+    async def test_search_contacts_operators(self):
+        notes = [Contact()]
+        self.session.execute.return_value.scalars().all.return_value = notes
+        result = await search_contacts(db=self.session, user=self.user, last_name="test_last_name", order_by=["-birthday"], phone_number__in=[1, 2], birthday__gte=datetime.date(1990, 1, 1))
+        self.assertEqual(result, notes)
+        statement, params = self.session.execute.call_args.args
+        self.assertEqual(params, {"last_name__eq": "test_last_name", "phone_number__in": [1, 2], "birthday__gte": datetime.date(1990, 1, 1), "owner_id": 1})
+        self.assertIs(statement, _search_statement((("birthday", "gte"), ("last_name", "eq"), ("phone_number", "in")), ("-birthday",)))
+
+    async def test_search_contacts_no_criteria(self):
+        result = await search_contacts(db=self.session, user=self.user, first_name="")
+        self.assertIsNone(result)
+
+    async def test_search_contacts_unsupported(self):
+        with self.assertRaises(ValueError):
+            await search_contacts(db=self.session, user=self.user, password="secret")
+        with self.assertRaises(ValueError):
+            await search_contacts(db=self.session, user=self.user, first_name__regex="t.*")
+        with self.assertRaises(ValueError):
+            await search_contacts(db=self.session, user=self.user, first_name="test_name", order_by=["user"])
+
+    async def test_search_contacts_invalid_values(self):
+        for criteria in ({"id__in": 5}, {"first_name": ["a"]}, {"first_name": {"a": 1}}, {"phone_number": "abc"}, {"phone_number__in": [True]}, {"birthday": 1990}):
+            with self.assertRaises(ValueError):
+                await search_contacts(db=self.session, user=self.user, **criteria)
+        self.session.execute.assert_not_called()
+        await search_contacts(db=self.session, user=self.user, phone_number="12345", birthday="1990-01-01")
+        self.assertEqual(self.session.execute.call_args.args[1], {"phone_number__eq": 12345, "birthday__eq": datetime.date(1990, 1, 1), "owner_id": 1})
+
+    async def test_find_contacts_fuzzy(self):
+        notes = [Contact(), Contact()]
+        self.session.execute.return_value.scalars().all.return_value = notes
+        result = await find_contacts_fuzzy(q="Tes", user=self.user, db=self.session)
+        self.assertEqual(result, notes)
+        self.session.execute.reset_mock()
+        self.assertEqual(await find_contacts_fuzzy(q="  ", user=self.user, db=self.session), [])
+        self.session.execute.assert_not_called()
+
     async def test_birthdays(self):
         contacts=[ContactModel(first_name="test_name1", last_name="test_last_name",email="test@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1),
                   ContactModel(first_name="test_name", last_name="test_last_name1",email="test@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1),
                   ContactModel(first_name="test_name", last_name="test_last_name",email="test1@example.com",phone_number=12345,birthday=(datetime.datetime.now().date()-datetime.timedelta(weeks=(52*30))-datetime.timedelta(days=35)),additional_data="test_data",user_id=1)
                   ]
-        self.session.query().filter().all.return_value=contacts
+        self.session.execute.return_value.scalars().all.return_value=contacts
         result=await birthdays(db=self.session,user=self.user)
         self.assertEqual(result,contacts)
 
+    def test_birthday_window(self):
+        self.assertEqual(_birthday_window(datetime.date(2023, 6, 10), 7), (610, 617))
+
+    def test_birthday_window_year_wrap(self):
+        self.assertEqual(_birthday_window(datetime.date(2023, 12, 28), 7), (1228, 104))
+
+    def test_birthday_window_feb_29_non_leap_year(self):
+        self.assertEqual(_birthday_window(datetime.date(2023, 2, 21), 7), (221, 229))
+        self.assertEqual(_birthday_window(datetime.date(2024, 2, 21), 7), (221, 228))
+
 
 if __name__ == '__main__':
     unittest.main()
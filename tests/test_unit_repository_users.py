@@ -1,33 +1,44 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy.orm import Session
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
 import datetime
 
 from src.database.models import User
 from src.schemas import ContactModel,UserModel
-from src.repository.users import get_user_by_email,create_user,update_token,confirmed_email,update_avatar
+from src.repository.users import get_user_by_email,get_user_by_id,create_user,update_password,confirmed_email,update_avatar
 
 
 class TestUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session=MagicMock(spec=Session)
+        self.session=MagicMock(spec=AsyncSession)
+        self.session.execute.return_value=MagicMock()
         self.user=User(id=1)
+        patcher=patch("src.repository.users.user_cache",AsyncMock())
+        self.user_cache=patcher.start()
+        self.addCleanup(patcher.stop)
 
     async def test_get_user_by_email_found(self):
         user=User()
-        self.session.query().filter().first.return_value=user
+        self.session.execute.return_value.scalars().first.return_value=user
         result=await get_user_by_email(email="test@example.com",db=self.session)
         self.assertEqual(result,user)
     
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter().first.return_value=None
+        self.session.execute.return_value.scalars().first.return_value=None
         result=await get_user_by_email(email="test@example.com",db=self.session)
         self.assertIsNone(result)
 
+    async def test_get_user_by_id(self):
+        user=User(id=1)
+        self.session.execute.return_value.scalars().first.return_value=user
+        result=await get_user_by_id(user_id=1,db=self.session)
+        self.assertEqual(result,user)
+
     async def test_create_user(self):
         body=UserModel(username="test_name",email="test@example.com",password="test_passw")
-        self.session.query().filter().all.return_value=body
+        self.session.execute.return_value.scalars().all.return_value=body
         result=await create_user(body=body,db=self.session)
         self.assertEqual(result.username,body.username)
         self.assertEqual(result.email,body.email)
@@ -35,9 +46,34 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     async def test_update_avatar(self):
         user=User()
-        self.session.query().filter().first.return_value=user
+        self.session.execute.return_value.scalars().first.return_value=user
         result=await update_avatar(email="test@example.com",url="url",db=self.session)
         self.assertEqual(result,user)
+        self.assertEqual(result.avatar,"url")
+        self.user_cache.refresh.assert_awaited_once_with(user)
+
+    async def test_confirmed_email(self):
+        user=User(confirmed=False)
+        self.session.execute.return_value.scalars().first.return_value=user
+        await confirmed_email(email="test@example.com",db=self.session)
+        self.assertTrue(user.confirmed)
+        self.user_cache.refresh.assert_awaited_once_with(user)
+
+    async def test_confirmed_email_without_redis(self):
+        user=User(email="test@example.com",confirmed=False)
+        self.session.execute.return_value.scalars().first.return_value=user
+        self.user_cache.refresh.side_effect=redis.ConnectionError()
+        self.user_cache.local=MagicMock()
+        await confirmed_email(email="test@example.com",db=self.session)
+        self.assertTrue(user.confirmed)
+        self.session.commit.assert_awaited_once()
+        self.user_cache.local.pop.assert_called_once_with("test@example.com")
+
+    async def test_update_password(self):
+        user=User(password="old_hash")
+        await update_password(user=user,hashed_password="new_hash",db=self.session)
+        self.assertEqual(user.password,"new_hash")
+        self.session.commit.assert_awaited_once()
 
 if __name__=="__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.services.auth import auth_service, Principal
+
+
+class TestCurrentPrincipal(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.user = User(id=1, username="test_name", email="test@example.com", confirmed=True)
+        patcher = patch("src.services.auth.token_cache")
+        self.token_cache = patcher.start()
+        self.token_cache.get.return_value = None
+        self.token_cache.is_revoked = AsyncMock(return_value=False)
+        self.addCleanup(patcher.stop)
+        patcher = patch("src.services.auth.user_cache")
+        self.user_cache = patcher.start()
+        self.user_cache.get = AsyncMock(return_value=self.user)
+        self.addCleanup(patcher.stop)
+
+    async def test_principal_from_claims(self):
+        token = await auth_service.create_access_token(data=auth_service.user_claims(self.user))
+        result = await auth_service.current_principal(token=token, db=self.session)
+        self.assertEqual(result, Principal(id=1, email="test@example.com", confirmed=True))
+        self.user_cache.get.assert_not_awaited()
+        self.session.execute.assert_not_called()
+
+    async def test_principal_from_legacy_token(self):
+        token = await auth_service.create_access_token(data={"sub": "test@example.com"})
+        result = await auth_service.current_principal(token=token, db=self.session)
+        self.assertEqual(result, Principal(id=1, email="test@example.com", confirmed=True))
+        self.user_cache.get.assert_awaited_once_with("test@example.com")
+
+    async def test_redis_unavailable_falls_back(self):
+        token = await auth_service.create_access_token(data={"sub": "test@example.com"})
+        self.token_cache.is_revoked.side_effect = redis.ConnectionError
+        self.user_cache.get.side_effect = redis.ConnectionError
+        self.user_cache.set = AsyncMock(side_effect=redis.ConnectionError)
+        self.session.execute = AsyncMock()
+        self.session.execute.return_value = MagicMock()
+        self.session.execute.return_value.scalars().first.return_value = self.user
+        result = await auth_service.get_current_user(token=token, db=self.session)
+        self.assertIs(result, self.user)
+        self.token_cache.set.assert_not_called()
+        with patch("src.services.auth.fail_policy.default", False):
+            with self.assertRaises(HTTPException) as e:
+                await auth_service.get_current_user(token=token, db=self.session)
+        self.assertEqual(e.exception.status_code, 503)
+
+    async def test_principal_invalid_token(self):
+        refresh_token = await auth_service.create_refresh_token(data=auth_service.user_claims(self.user))
+        for token in ("token", refresh_token):
+            with self.assertRaises(HTTPException) as e:
+                await auth_service.current_principal(token=token, db=self.session)
+            self.assertEqual(e.exception.status_code, 401)
+
+
+class TestRefreshTokens(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.user = User(id=1, username="test_name", email="test@example.com", confirmed=True)
+        patcher = patch("src.services.auth.refresh_tokens")
+        self.refresh_tokens = patcher.start()
+        self.refresh_tokens.start = AsyncMock()
+        self.refresh_tokens.rotate = AsyncMock(return_value=self.refresh_tokens.ROTATED)
+        self.addCleanup(patcher.stop)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        self.session.execute.return_value.scalars().first.return_value = self.user
+
+    async def test_create_session_tokens_starts_family(self):
+        result = await auth_service.create_session_tokens(self.user)
+        payload = await auth_service.decode_refresh_token(result["refresh_token"])
+        self.refresh_tokens.start.assert_awaited_once_with(payload["fam"], payload["jti"], auth_service.REFRESH_TOKEN_TTL)
+        self.assertEqual((payload["sub"], payload["uid"]), ("test@example.com", 1))
+
+    async def test_rotate_refresh_token(self):
+        tokens = await auth_service.create_session_tokens(self.user)
+        old = await auth_service.decode_refresh_token(tokens["refresh_token"])
+        result = await auth_service.rotate_refresh_token(tokens["refresh_token"], self.session)
+        new = await auth_service.decode_refresh_token(result["refresh_token"])
+        self.assertEqual((new["fam"], new["uid"]), (old["fam"], 1))
+        self.assertNotEqual(new["jti"], old["jti"])
+        self.refresh_tokens.rotate.assert_awaited_once_with(old["fam"], old["jti"], new["jti"], auth_service.REFRESH_TOKEN_TTL)
+
+    async def test_rotate_refresh_token_rereads_user(self):
+        tokens = await auth_service.create_session_tokens(self.user)
+        self.user.email, self.user.confirmed = "new@example.com", False
+        result = await auth_service.rotate_refresh_token(tokens["refresh_token"], self.session)
+        new = await auth_service.decode_refresh_token(result["refresh_token"])
+        self.assertEqual((new["sub"], new["confirmed"]), ("new@example.com", False))
+        self.session.execute.return_value.scalars().first.return_value = None
+        with self.assertRaises(HTTPException) as e:
+            await auth_service.rotate_refresh_token(result["refresh_token"], self.session)
+        self.assertEqual(e.exception.status_code, 401)
+        self.refresh_tokens.rotate.assert_awaited_once()
+
+    async def test_rotate_refresh_token_rejected(self):
+        tokens = await auth_service.create_session_tokens(self.user)
+        legacy = await auth_service.create_refresh_token(data={"sub": "test@example.com"})
+        self.refresh_tokens.rotate.return_value = self.refresh_tokens.REUSED
+        for token in (tokens["refresh_token"], legacy, tokens["access_token"]):
+            with self.assertRaises(HTTPException) as e:
+                await auth_service.rotate_refresh_token(token, self.session)
+            self.assertEqual(e.exception.status_code, 401)
+        self.refresh_tokens.rotate.assert_awaited_once()
+
+    async def test_redis_unavailable_follows_fail_policy(self):
+        self.refresh_tokens.start.side_effect = redis.ConnectionError
+        self.refresh_tokens.rotate.side_effect = redis.ConnectionError
+        tokens = await auth_service.create_session_tokens(self.user, "login")
+        old = await auth_service.decode_refresh_token(tokens["refresh_token"])
+        result = await auth_service.rotate_refresh_token(tokens["refresh_token"], self.session, "refresh_token")
+        new = await auth_service.decode_refresh_token(result["refresh_token"])
+        self.assertEqual((new["fam"], new["jti"]), (old["fam"], old["jti"]))
+        with patch("src.services.auth.fail_policy.routes", {"login": False, "refresh_token": False}):
+            for call in (auth_service.create_session_tokens(self.user, "login"), auth_service.rotate_refresh_token(tokens["refresh_token"], self.session, "refresh_token")):
+                with self.assertRaises(HTTPException) as e:
+                    await call
+                self.assertEqual(e.exception.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
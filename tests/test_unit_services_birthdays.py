@@ -0,0 +1,80 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.services.birthdays import BirthdayGreetings
+
+
+class TestBirthdayGreetings(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_factory = async_sessionmaker(bind=self.engine, expire_on_commit=False, class_=AsyncSession)
+        async with self.session_factory() as db:
+            users = [User(email=f"user{n}@example.com", username=f"user{n}", password="password", confirmed=n != 3) for n in range(4)]
+            db.add_all(users)
+            await db.flush()
+            # user0: 3 birthdays today, user1: none, user2: 1, user3: unconfirmed
+            for user, count in zip(users, (3, 0, 1, 1)):
+                for n in range(count):
+                    db.add(Contact(first_name=f"first{n}", last_name=user.username, birthday=datetime.date(1990, 2, 28), birthday_md=228, user_id=user.id))
+            db.add(Contact(first_name="other", last_name="user1", birthday=datetime.date(1990, 3, 1), birthday_md=301, user_id=users[1].id))
+            db.add(Contact(first_name="leap", last_name="user2", birthday=datetime.date(1992, 2, 29), birthday_md=229, user_id=users[2].id))
+            await db.commit()
+        self.redis = MagicMock()
+        self.redis.set = AsyncMock(return_value=True)
+        self.redis.hgetall = AsyncMock(return_value={})
+        self.redis.register_script.side_effect = lambda script: AsyncMock(return_value=1)
+        self.jobs = MagicMock()
+        self.jobs.enqueue = AsyncMock()
+        self.greetings = BirthdayGreetings(self.redis, self.jobs, self.session_factory, chunk_size=2, concurrency=2)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_chunks_hold_users_together(self):
+        chunks = [[[row.first_name for row in rows] for rows in groups] async for groups in self.greetings.chunks(datetime.date(2023, 2, 28))]
+        self.assertEqual(chunks, [[["first0", "first1", "first2"]], [["first0", "leap"]]])
+        chunks = [groups async for groups in self.greetings.chunks(datetime.date(2024, 2, 28))]
+        self.assertEqual([[len(rows) for rows in groups] for groups in chunks], [[3], [1]])
+
+    async def test_run(self):
+        result = await self.greetings.run(datetime.date(2023, 2, 28))
+        self.assertEqual(result, {"users": 2, "contacts": 5})
+        self.assertEqual(self.jobs.enqueue.await_count, 2)
+        self.jobs.enqueue.assert_any_await(
+            "emails", "send_birthday_email", email="user2@example.com", username="user2",
+            contacts=[{"first_name": "first0", "last_name": "user2"}, {"first_name": "leap", "last_name": "user2"}],
+        )
+        token = self.redis.set.await_args.args[1]
+        self.redis.set.assert_awaited_once_with("birthday-greetings:2023-02-28:lock", token, nx=True, ex=3600)
+        self.greetings._checkpoint.assert_awaited_with(
+            keys=["birthday-greetings:2023-02-28", "birthday-greetings:2023-02-28:lock"],
+            args=[token, 3600, BirthdayGreetings.CHECKPOINT_TTL, "done", 1, "users", 2, "contacts", 5],
+        )
+        self.greetings._release.assert_awaited_once_with(keys=["birthday-greetings:2023-02-28:lock"], args=[token])
+
+    async def test_run_stops_when_lock_is_lost(self):
+        self.greetings._checkpoint.return_value = 0
+        self.assertIsNone(await self.greetings.run(datetime.date(2023, 2, 28)))
+        self.jobs.enqueue.assert_awaited_once()
+        self.greetings._checkpoint.assert_awaited_once()
+
+    async def test_run_resumes_from_checkpoint(self):
+        self.redis.hgetall.return_value = {b"user_id": b"1", b"id": b"3", b"users": b"1", b"contacts": b"3"}
+        result = await self.greetings.run(datetime.date(2023, 2, 28))
+        self.assertEqual(result, {"users": 2, "contacts": 5})
+        self.assertEqual(self.jobs.enqueue.await_args.kwargs["email"], "user2@example.com")
+        self.jobs.enqueue.assert_awaited_once()
+
+    async def test_run_once_per_day(self):
+        self.redis.hgetall.return_value = {b"done": b"1", b"users": b"2", b"contacts": b"5"}
+        self.assertEqual(await self.greetings.run(datetime.date(2023, 2, 28)), {"users": 2, "contacts": 5})
+        self.redis.set.return_value = None
+        self.assertIsNone(await self.greetings.run(datetime.date(2023, 2, 28)))
+        self.jobs.enqueue.assert_not_awaited()
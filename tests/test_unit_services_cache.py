@@ -0,0 +1,185 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+from datetime import datetime
+
+import orjson
+import redis.asyncio as redis
+import time
+
+from src.database.models import User
+from src.services.cache import TTLCache, UserCache, TokenCache, listen
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(), {"size": 2, "hits": 3, "misses": 1})
+
+    def test_expiry(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        with patch("src.services.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=5)
+        with patch("src.services.cache.time.monotonic", return_value=110.0):
+            self.assertEqual(cache.get("a"), 1)
+            self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["size"], 1)
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.pipeline = MagicMock()
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.redis.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.cache = UserCache(self.redis, ttl=900, local_ttl=60, local_maxsize=10)
+        self.user = User(id=1, username="test_name", email="test@example.com", created_at=datetime(2024, 7, 1, 12, 0), avatar="url", confirmed=True, password="hash")
+
+    async def test_set_stores_snapshot(self):
+        await self.cache.set(self.user)
+        key, data = self.redis.set.await_args.args
+        self.assertEqual(key, "user:test@example.com")
+        self.assertEqual(self.redis.set.await_args.kwargs, {"ex": 900})
+        self.assertNotIn("password", orjson.loads(data))
+
+    async def test_get_local_hit_skips_redis(self):
+        await self.cache.set(self.user)
+        result = await self.cache.get("test@example.com")
+        self.redis.get.assert_not_awaited()
+        self.assertEqual((result.id, result.email, result.created_at), (1, "test@example.com", datetime(2024, 7, 1, 12, 0)))
+        self.assertIsNot(result, self.user)
+
+    async def test_get_from_redis(self):
+        self.redis.get.return_value = orjson.dumps(UserCache.snapshot(self.user))
+        result = await self.cache.get("test@example.com")
+        self.assertEqual((result.id, result.username, result.created_at, result.confirmed), (1, "test_name", datetime(2024, 7, 1, 12, 0), True))
+        await self.cache.get("test@example.com")
+        self.redis.get.assert_awaited_once()
+
+    async def test_get_miss(self):
+        self.redis.get.return_value = None
+        self.assertIsNone(await self.cache.get("test@example.com"))
+
+
+    async def test_refresh_announces_change(self):
+        await self.cache.refresh(self.user)
+        self.pipe.set.assert_called_once()
+        self.pipe.publish.assert_called_once_with(UserCache.CHANNEL, f"{self.cache.worker_id}:test@example.com")
+        self.pipe.execute.assert_awaited_once()
+        self.assertIsNotNone(self.cache.local.get("test@example.com"))
+
+    async def test_invalidate(self):
+        await self.cache.set(self.user)
+        await self.cache.invalidate("test@example.com")
+        self.pipe.delete.assert_called_once_with("user:test@example.com")
+        self.pipe.execute.assert_awaited_once()
+        self.assertIsNone(self.cache.local.get("test@example.com"))
+
+    async def test_handle_message_from_other_worker(self):
+        await self.cache.set(self.user)
+        self.cache.handle_message(f"{self.cache.worker_id}:test@example.com".encode())
+        self.assertIsNotNone(self.cache.local.get("test@example.com"))
+        self.cache.handle_message(b"other:test@example.com")
+        self.assertIsNone(self.cache.local.get("test@example.com"))
+
+
+class TestTokenCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.pipeline = MagicMock()
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.redis.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.cache = TokenCache(self.redis, maxsize=10)
+        self.claims = {"sub": "test@example.com", "scope": "access_token", "exp": int(time.time()) + 900}
+
+    def test_set_and_get(self):
+        self.assertIsNone(self.cache.get("token"))
+        self.cache.set("token", self.claims)
+        self.assertEqual(self.cache.get("token"), self.claims)
+        self.assertIn(TokenCache.digest("token"), self.cache.local._data)
+        self.assertEqual(self.cache.local.stats(), {"size": 1, "hits": 1, "misses": 1})
+
+    def test_set_expired_is_ignored(self):
+        self.cache.set("token", {**self.claims, "exp": int(time.time()) - 1})
+        self.assertIsNone(self.cache.get("token"))
+
+    async def test_revoke(self):
+        self.cache.set("token", self.claims)
+        await self.cache.revoke("token", self.claims["exp"])
+        self.assertIsNone(self.cache.get("token"))
+        key = TokenCache.key(TokenCache.digest("token"))
+        self.pipe.set.assert_called_once_with(key, 1, exat=self.claims["exp"])
+        self.pipe.publish.assert_called_once_with(TokenCache.CHANNEL, f"{self.cache.worker_id}:{TokenCache.digest('token')}")
+        self.redis.exists.return_value = 1
+        self.assertTrue(await self.cache.is_revoked("token"))
+        self.redis.exists.assert_awaited_once_with(key)
+
+    def test_handle_message_from_other_worker(self):
+        self.cache.set("token", self.claims)
+        self.cache.handle_message(f"other:{TokenCache.digest('token')}".encode())
+        self.assertIsNone(self.cache.get("token"))
+
+
+class FakePubSub:
+    """
+    A subscription delivering some messages, then either failing or staying idle.
+    """
+
+    def __init__(self, messages, fail):
+        self.messages = messages
+        self.fail = fail
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        for data in self.messages:
+            yield {"type": "message", "data": data}
+        if self.fail:
+            raise redis.ConnectionError()
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        pass
+
+
+class TestListen(unittest.IsolatedAsyncioTestCase):
+
+    async def test_idle_subscription_keeps_cache(self):
+        local = TTLCache(maxsize=10, ttl=60)
+        local.set("a", 1)
+        local.set("b", 2)
+        r = MagicMock()
+        r.pubsub.return_value = FakePubSub([b"b"], fail=False)
+        task = asyncio.create_task(listen(r, "channel", lambda data: local.pop(data.decode()), local))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        self.assertEqual((local.get("a"), local.get("b")), (1, None))
+
+    async def test_clears_cache_after_disconnect(self):
+        local = TTLCache(maxsize=10, ttl=60)
+        local.set("a", 1)
+        r = MagicMock()
+        r.pubsub.side_effect = [FakePubSub([], fail=True), FakePubSub([], fail=False)]
+        task = asyncio.create_task(listen(r, "channel", MagicMock(), local))
+        await asyncio.sleep(1.1)
+        task.cancel()
+        self.assertIsNone(local.get("a"))
+        self.assertEqual(r.pubsub.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+
+from src.services.circuit import CircuitBreaker, CircuitOpenError, FailPolicy, PoolExhaustedError
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+
+    async def test_opens_after_failures(self):
+        func = AsyncMock(side_effect=redis.ConnectionError)
+        for _ in range(2):
+            with self.assertRaises(redis.ConnectionError):
+                await self.breaker.call(func)
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.call(func)
+        self.assertEqual(func.await_count, 2)
+        self.assertEqual(self.breaker.stats(), {"state": "open", "failures": 2, "rejected": 1})
+
+    async def test_timeout_counts_as_failure(self):
+        with self.assertRaises(redis.TimeoutError):
+            await self.breaker.call(AsyncMock(side_effect=redis.TimeoutError))
+        self.assertEqual(self.breaker.failures, 1)
+
+    async def test_pool_exhausted_does_not_count(self):
+        for _ in range(3):
+            with self.assertRaises(redis.ConnectionError):
+                await self.breaker.call(AsyncMock(side_effect=PoolExhaustedError))
+        self.assertEqual((self.breaker.state, self.breaker.failures), ("closed", 0))
+
+    async def test_response_errors_do_not_count(self):
+        with self.assertRaises(redis.ResponseError):
+            await self.breaker.call(AsyncMock(side_effect=redis.ResponseError))
+        self.assertEqual(self.breaker.failures, 0)
+
+    async def test_half_open_trial(self):
+        with patch("src.services.circuit.time.monotonic", return_value=100.0):
+            for _ in range(2):
+                self.breaker.record_failure()
+        with patch("src.services.circuit.time.monotonic", return_value=106.0):
+            self.assertEqual(self.breaker.state, "half-open")
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, "open")
+        with patch("src.services.circuit.time.monotonic", return_value=112.0):
+            self.assertEqual(await self.breaker.call(AsyncMock(return_value="PONG")), "PONG")
+            self.assertEqual(self.breaker.state, "closed")
+
+
+class TestFailPolicy(unittest.TestCase):
+
+    def test_check(self):
+        policy = FailPolicy(True, {"export_contacts": "closed"})
+        policy.check("read_contacts")
+        policy.check(None)
+        with self.assertRaises(HTTPException) as e:
+            policy.check("export_contacts")
+        self.assertEqual(e.exception.status_code, 503)
+        self.assertFalse(FailPolicy(False, {"read_contacts": "open"}).fail_open("find_contacts"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import asyncio
+import datetime
+import io
+import unittest
+from types import SimpleNamespace
+
+from src.services.contacts_io import detect_format, check_utf8, iter_csv_rows, iter_ndjson_rows, iterate_in_threadpool, format_ndjson, format_csv_header, format_csv, format_vcard
+
+
+class TestContactsIO(unittest.TestCase):
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format("contacts.CSV", None), "csv")
+        self.assertEqual(detect_format("contacts.jsonl", "application/octet-stream"), "ndjson")
+        self.assertEqual(detect_format("upload", "application/x-ndjson; charset=utf-8"), "ndjson")
+        self.assertIsNone(detect_format("contacts.xlsx", None))
+
+    def test_check_utf8(self):
+        file = io.BytesIO("first_name\ncaf\u00e9\n".encode())
+        check_utf8(file, chunk_size=10)
+        self.assertEqual(file.tell(), 0)
+        file = io.BytesIO(b"first_name\ncaf\xe9\n")
+        with self.assertRaises(ValueError):
+            check_utf8(file)
+        self.assertEqual(file.tell(), 0)
+
+    def test_iter_csv_rows(self):
+        file = io.BytesIO(b'\xef\xbb\xbffirst_name,last_name,additional_data\ntest_name,test_last_name,"multi\nline"\n')
+        rows = list(iter_csv_rows(file))
+        self.assertEqual(rows, [(1, {"first_name": "test_name", "last_name": "test_last_name", "additional_data": "multi\nline"})])
+        self.assertFalse(file.closed)
+
+    def test_iter_ndjson_rows(self):
+        file = io.BytesIO(b'{"first_name": "test_name"}\n\n[1, 2]\nnot json\n')
+        rows = list(iter_ndjson_rows(file))
+        self.assertEqual(rows, [(1, {"first_name": "test_name"}), (3, None), (4, None)])
+
+    def test_iterate_in_threadpool(self):
+        async def collect():
+            return [item async for item in iterate_in_threadpool(iter(range(5)), batch_size=2)]
+
+        self.assertEqual(asyncio.run(collect()), [0, 1, 2, 3, 4])
+
+    def setUp(self):
+        self.contact = SimpleNamespace(id=1, first_name="test_name", last_name="test_last_name", email="test@example.com", phone_number=12345, birthday=datetime.date(1990, 5, 17), additional_data="likes tea, coffee; cake")
+
+    def test_format_ndjson(self):
+        self.assertEqual(format_ndjson(self.contact), b'{"id":1,"first_name":"test_name","last_name":"test_last_name","email":"test@example.com","phone_number":12345,"birthday":"1990-05-17","additional_data":"likes tea, coffee; cake"}\n')
+
+    def test_format_csv(self):
+        self.assertEqual(format_csv_header(), b"id,first_name,last_name,email,phone_number,birthday,additional_data\r\n")
+        self.assertEqual(format_csv(self.contact), b'1,test_name,test_last_name,test@example.com,12345,1990-05-17,"likes tea, coffee; cake"\r\n')
+
+    def test_format_vcard(self):
+        card = format_vcard(self.contact).decode()
+        self.assertTrue(card.startswith("BEGIN:VCARD\r\nVERSION:3.0\r\n"))
+        self.assertIn("N:test_last_name;test_name;;;\r\n", card)
+        self.assertIn("BDAY:1990-05-17\r\n", card)
+        self.assertIn("NOTE:likes tea\\, coffee\\; cake\r\n", card)
+        self.assertTrue(card.endswith("END:VCARD\r\n"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import aiosmtplib
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from src.services.email import TEMPLATE_FOLDER, PrerenderedTemplate, birthday_email, deliver, get_template, render_template
+from src.services.jobs import PermanentJobError
+
+
+class TestRenderTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.env = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]))
+        self.context = {"host": "http://localhost/", "username": "<b>Tom & Jerry's</b>", "token": "a.b.c"}
+
+    def test_matches_jinja(self):
+        expected = self.env.get_template("email_template.html").render(**self.context)
+        self.assertEqual(render_template("email_template.html", **self.context), expected)
+        self.assertIn("&lt;b&gt;Tom &amp; Jerry&#39;s&lt;/b&gt;", expected)
+
+    def test_template_is_prepared_once(self):
+        first = get_template("email_template.html", ("host", "token", "username"))
+        self.assertIs(get_template("email_template.html", ("host", "token", "username")), first)
+        self.assertEqual(len(first.parts), 7)
+
+    def test_renders_loops(self):
+        html = render_template("birthday_template.html", username="tom", contacts=[{"first_name": "<Ann>", "last_name": "Lee"}])
+        self.assertIn("<li>&lt;Ann&gt; Lee</li>", html)
+        self.assertIsNone(get_template("birthday_template.html", ("contacts", "username")).parts)
+
+    def test_falls_back_to_jinja_for_filtered_values(self):
+        template = self.env.from_string("<p>{{ username|upper }}{% if token %} {{ token }}{% endif %}</p>")
+        prerendered = PrerenderedTemplate(template, ("token", "username"))
+        self.assertIsNone(prerendered.parts)
+        self.assertEqual(prerendered.render(username="tom", token=""), "<p>TOM</p>")
+
+
+class TestDeliver(unittest.IsolatedAsyncioTestCase):
+
+    async def test_permanent_failures_are_not_retried(self):
+        message = birthday_email("user@example.com", "user", [])
+        with patch("src.services.email.mailer.send", AsyncMock()) as mock_send:
+            await deliver(message)
+            mock_send.assert_awaited_once_with(message)
+            mock_send.side_effect = aiosmtplib.SMTPResponseException(550, "No such user")
+            with self.assertRaises(PermanentJobError):
+                await deliver(message)
+            mock_send.side_effect = aiosmtplib.SMTPRecipientsRefused([])
+            with self.assertRaises(PermanentJobError):
+                await deliver(message)
+            mock_send.side_effect = aiosmtplib.SMTPResponseException(451, "Try again later")
+            with self.assertRaises(aiosmtplib.SMTPResponseException):
+                await deliver(message)
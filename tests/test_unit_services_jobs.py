@@ -0,0 +1,146 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import orjson
+import redis.asyncio as redis
+
+from src.services.jobs import Job, JobQueue, PermanentJobError, Worker
+
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = MagicMock()
+        self.redis.rpush = AsyncMock()
+        self.redis.zadd = AsyncMock(return_value=1)
+        self.claim, self.ack, self.retry = AsyncMock(), AsyncMock(return_value=1), AsyncMock(return_value=1)
+        self.redis.register_script.side_effect = [self.claim, self.ack, self.retry]
+        self.jobs = JobQueue(self.redis, {"emails": 4}, visibility_timeout=60, max_attempts=3, backoff=5.0)
+
+    async def test_enqueue(self):
+        with patch("src.services.jobs.time.time", return_value=100.0):
+            job_id = await self.jobs.enqueue("emails", "send_email", email="a@b.c")
+            await self.jobs.enqueue("emails", "send_email", delay=10, email="a@b.c")
+        key, payload = self.redis.rpush.await_args.args
+        self.assertEqual(key, "jobs:emails:ready")
+        self.assertEqual(orjson.loads(payload), {"id": job_id, "name": "send_email", "kwargs": {"email": "a@b.c"}, "enqueued_at": 100.0})
+        key, scores = self.redis.zadd.await_args.args
+        self.assertEqual(key, "jobs:emails:delayed")
+        self.assertEqual(list(scores.values()), [110000])
+        with self.assertRaises(KeyError):
+            await self.jobs.enqueue("unknown", "send_email")
+
+    async def test_claim(self):
+        payload = orjson.dumps({"id": "1", "name": "send_email", "kwargs": {"email": "a@b.c"}, "enqueued_at": 1.0})
+        self.claim.return_value = [payload, 2]
+        with patch("src.services.jobs.time.time", return_value=100.0):
+            jobs = await self.jobs.claim("emails", 2)
+        self.assertEqual(jobs, [Job("emails", "1", "send_email", {"email": "a@b.c"}, 2, payload.decode())])
+        self.claim.assert_awaited_once_with(
+            keys=["jobs:emails:ready", "jobs:emails:delayed", "jobs:emails:inflight", "jobs:emails:attempts", "jobs:emails:dead"],
+            args=[100000, 160000, 2, 4, 3],
+        )
+
+    async def test_ack_and_fail(self):
+        job = Job("emails", "1", "send_email", {}, 2, "{}")
+        self.assertTrue(await self.jobs.ack(job))
+        self.ack.assert_awaited_once_with(keys=["jobs:emails:inflight", "jobs:emails:attempts"], args=["{}", "1"])
+        with patch("src.services.jobs.time.time", return_value=100.0):
+            self.assertEqual(await self.jobs.fail(job), 1)
+            await self.jobs.fail(job, permanent=True)
+        keys = ["jobs:emails:inflight", "jobs:emails:delayed", "jobs:emails:attempts", "jobs:emails:dead"]
+        self.assertEqual(self.retry.await_args_list[0].kwargs, {"keys": keys, "args": ["{}", "1", 110000, 3]})
+        self.assertEqual(self.retry.await_args_list[1].kwargs, {"keys": keys, "args": ["{}", "1", 110000, 0]})
+
+    async def test_extend(self):
+        job = Job("emails", "1", "send_email", {}, 1, "{}")
+        with patch("src.services.jobs.time.time", return_value=100.0):
+            self.assertTrue(await self.jobs.extend(job))
+        self.redis.zadd.assert_awaited_once_with("jobs:emails:inflight", {"{}": 160000}, xx=True, ch=True)
+
+
+class TestWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.jobs = MagicMock()
+        self.jobs.limits = {"emails": 2}
+        self.jobs.visibility_timeout = 60
+        self.jobs.ack = AsyncMock(return_value=True)
+        self.jobs.fail = AsyncMock(return_value=1)
+
+    def job(self, name: str, job_id: str = "1") -> Job:
+        return Job("emails", job_id, name, {"value": job_id}, 1, job_id)
+
+    async def test_runs_acks_and_retries(self):
+        done = []
+
+        async def ok(value):
+            done.append(value)
+
+        async def broken(value):
+            raise ValueError(value)
+
+        worker = Worker(self.jobs, {"ok": ok, "broken": broken}, ["emails"], poll_interval=0.01)
+        claimed = [[self.job("ok", "1"), self.job("broken", "2")], [self.job("missing", "3")]]
+
+        async def claim(queue, count):
+            if claimed:
+                return claimed.pop(0)
+            worker.stop()
+            return []
+
+        self.jobs.claim = AsyncMock(side_effect=claim)
+        await asyncio.wait_for(worker.run(), 1)
+        self.assertEqual(done, ["1"])
+        self.jobs.ack.assert_awaited_once_with(self.job("ok", "1"))
+        self.jobs.fail.assert_any_await(self.job("broken", "2"))
+        self.jobs.fail.assert_any_await(self.job("missing", "3"), permanent=True)
+        self.assertEqual(worker.stats(), {"completed": 1, "failed": 2})
+
+    async def test_respects_concurrency_limit(self):
+        running, peak = 0, 0
+        release = asyncio.Event()
+
+        async def slow(value):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+
+        worker = Worker(self.jobs, {"slow": slow}, ["emails"], poll_interval=0.01)
+        counts = []
+
+        async def claim(queue, count):
+            counts.append(count)
+            if len(counts) == 1:
+                return [self.job("slow", "1"), self.job("slow", "2")]
+            worker.stop()
+            return []
+
+        self.jobs.claim = AsyncMock(side_effect=claim)
+        task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.05)
+        self.assertEqual(counts, [2])
+        self.assertEqual(peak, 2)
+        release.set()
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(counts, [2, 2])
+
+    async def test_permanent_error_is_not_retried(self):
+        async def refused(value):
+            raise PermanentJobError(value)
+
+        worker = Worker(self.jobs, {"refused": refused}, ["emails"])
+        await worker._process(self.job("refused"))
+        self.jobs.fail.assert_awaited_once_with(self.job("refused"), permanent=True)
+
+    async def test_redis_error_leaves_job_claimed(self):
+        async def ok(value):
+            pass
+
+        self.jobs.ack = AsyncMock(side_effect=redis.ConnectionError())
+        worker = Worker(self.jobs, {"ok": ok}, ["emails"])
+        await worker._process(self.job("ok"))
+        self.jobs.fail.assert_not_awaited()
@@ -0,0 +1,78 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import JWTError, jwt
+
+from src.services.keys import KeyRing
+
+
+def write_key(directory, kid, public=False):
+    key = ec.generate_private_key(ec.SECP256R1())
+    if public:
+        data = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    else:
+        data = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    Path(directory, f"{kid}.pem").write_bytes(data)
+
+
+class TestKeyRing(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        write_key(self.directory.name, "old")
+        write_key(self.directory.name, "new")
+        write_key(self.directory.name, "other", public=True)
+
+    def load(self, active_kid, accept_secret=True):
+        return KeyRing.from_directory(self.directory.name, active_kid, "ES256", "secret", "HS256", accept_secret)
+
+    def test_secret_only(self):
+        ring = KeyRing("secret", "HS256")
+        token = ring.encode({"sub": "test@example.com"})
+        self.assertNotIn("kid", jwt.get_unverified_header(token))
+        self.assertEqual(ring.decode(token), {"sub": "test@example.com"})
+        self.assertEqual(ring.jwks(), {"keys": []})
+
+    def test_rotation_keeps_old_tokens_valid(self):
+        old_token = self.load("old").encode({"sub": "test@example.com"})
+        ring = self.load("new")
+        token = ring.encode({"sub": "test@example.com"})
+        self.assertEqual(jwt.get_unverified_header(token), {"alg": "ES256", "kid": "new", "typ": "JWT"})
+        self.assertEqual(ring.decode(token), {"sub": "test@example.com"})
+        self.assertEqual(ring.decode(old_token), {"sub": "test@example.com"})
+
+    def test_secret_tokens(self):
+        secret_token = KeyRing("secret", "HS256").encode({"sub": "test@example.com"})
+        self.assertEqual(self.load("new").decode(secret_token), {"sub": "test@example.com"})
+        with self.assertRaises(JWTError):
+            self.load("new", accept_secret=False).decode(secret_token)
+
+    def test_rejects_unknown_and_forged_tokens(self):
+        ring = self.load("new")
+        with self.assertRaises(JWTError):
+            ring.decode(jwt.encode({"sub": "x"}, "secret", algorithm="HS256", headers={"kid": "missing"}))
+        with self.assertRaises(JWTError):
+            ring.decode(jwt.encode({"sub": "x"}, "secret", algorithm="HS256", headers={"kid": "new"}))
+        with self.assertRaises(JWTError):
+            ring.decode("token")
+
+    def test_active_key_must_be_private(self):
+        with self.assertRaises(ValueError):
+            self.load("other")
+        with self.assertRaises(ValueError):
+            self.load("missing")
+
+    def test_jwks(self):
+        keys = self.load("new").jwks()["keys"]
+        self.assertEqual([key["kid"] for key in keys], ["new", "old", "other"])
+        for key in keys:
+            self.assertEqual((key["kty"], key["crv"], key["alg"], key["use"]), ("EC", "P-256", "ES256", "sig"))
+            self.assertNotIn("d", key)
+
+
+if __name__ == '__main__':
+    unittest.main()
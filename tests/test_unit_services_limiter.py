@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+
+from src.services.auth import Principal
+from src.services.limiter import Limit, Limits, LocalBuckets, RateLimiter, rate_limit
+
+
+class TestLimits(unittest.TestCase):
+
+    def test_parse_and_describe(self):
+        self.assertEqual(Limit.parse("10/60"), Limit(10, 60))
+        self.assertEqual(Limit(10, 60).describe(), "No more than 10 requests per minute")
+        self.assertEqual(Limit(5, 1).describe(), "No more than 5 requests per 1 seconds")
+
+    def test_get(self):
+        limits = Limits("10/60", {"export_contacts": "2/60"}, {"7": "100/60", "7:export_contacts": "20/60"})
+        self.assertEqual(limits.get("read_contacts"), Limit(10, 60))
+        self.assertEqual(limits.get("export_contacts", 1), Limit(2, 60))
+        self.assertEqual(limits.get("read_contacts", 7), Limit(100, 60))
+        self.assertEqual(limits.get("export_contacts", 7), Limit(20, 60))
+
+
+class TestLocalBuckets(unittest.TestCase):
+
+    def test_take(self):
+        buckets = LocalBuckets()
+        limit = Limit(3, 60)
+        self.assertIsNone(buckets.take("key", limit, 1))
+        buckets.fill("key", limit, 1)
+        self.assertTrue(buckets.take("key", limit, 1))
+        self.assertTrue(buckets.take("key", limit, 1))
+        self.assertFalse(buckets.take("key", limit, 1))
+        self.assertEqual(buckets.pending, {"key": (limit, 2)})
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = MagicMock()
+        self.script = AsyncMock(return_value=[1, 1, 0])
+        self.redis.register_script.return_value = self.script
+        self.limit = Limit(2, 60)
+
+    async def test_hit(self):
+        limiter = RateLimiter(self.redis)
+        with patch("src.services.limiter.time.time", return_value=125.5):
+            self.assertEqual(await limiter.hit("route:1", self.limit), (True, 0))
+        self.script.assert_awaited_once_with(keys=["ratelimit:route:1:2", "ratelimit:route:1:1"], args=[2, 60000, 5500, 1, 0])
+        self.script.return_value = [0, 2, 1500]
+        self.assertEqual(await limiter.hit("route:1", self.limit), (False, 1.5))
+
+    async def test_approximate_hit_uses_local_bucket(self):
+        limiter = RateLimiter(self.redis, approximate=True, sync_interval=0.5)
+        self.assertEqual(await limiter.hit("route:1", self.limit), (True, 0))
+        self.assertEqual(await limiter.hit("route:1", self.limit), (True, 0))
+        self.assertEqual(await limiter.hit("route:1", self.limit), (False, 0.5))
+        self.script.assert_awaited_once()
+
+    async def test_sync(self):
+        limiter = RateLimiter(self.redis, approximate=True)
+        limiter.buckets.fill("route:1", self.limit, 0)
+        limiter.buckets.fill("route:2", self.limit, 0)
+        limiter.buckets.take("route:1", self.limit, 1)
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[[1, 2, 0]])
+        self.redis.pipeline.return_value.__aenter__.return_value = pipe
+        await limiter.sync()
+        self.assertEqual(self.script.await_args.kwargs["args"][3:], [1, 1])
+        self.assertIs(self.script.await_args.kwargs["client"], pipe)
+        self.assertEqual(limiter.buckets.tokens, {"route:1": 0})
+        self.assertEqual(limiter.buckets.pending, {})
+
+    async def test_rate_limit_dependency(self):
+        with patch("src.services.limiter.limiter") as limiter:
+            limiter.hit = AsyncMock(return_value=(False, 1.2))
+            with self.assertRaises(HTTPException) as e:
+                await rate_limit("read_contacts")(Principal(id=1, email="test@example.com", confirmed=True))
+            self.assertEqual((e.exception.status_code, e.exception.headers), (429, {"Retry-After": "2"}))
+            self.assertEqual(limiter.hit.await_args.args[0], "read_contacts:1")
+
+    async def test_rate_limit_redis_unavailable(self):
+        principal = Principal(id=1, email="test@example.com", confirmed=True)
+        with patch("src.services.limiter.limiter") as limiter:
+            limiter.hit = AsyncMock(side_effect=redis.ConnectionError)
+            await rate_limit("read_contacts")(principal)
+            with self.assertRaises(HTTPException) as e:
+                await rate_limit("export_contacts")(principal)
+            self.assertEqual(e.exception.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
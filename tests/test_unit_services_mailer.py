@@ -0,0 +1,140 @@
+import asyncio
+import socket
+import unittest
+from email.message import EmailMessage
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+
+from src.services.mailer import Mailer, SMTPPool
+
+
+class Handler:
+    """
+    Accepts messages, answering each recipient's first delivery with the queued replies.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.replies = {}
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        replies = self.replies.get(envelope.rcpt_tos[0])
+        if replies:
+            return replies.pop(0)
+        self.messages.append(envelope.rcpt_tos[0])
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestMailer(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.handler = Handler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=free_port())
+        self.controller.start()
+        pool = SMTPPool("127.0.0.1", self.controller.port, None, None, use_tls=False, start_tls=False, size=2, timeout=5)
+        self.mailer = Mailer(pool, concurrency=2, batch_size=10, max_attempts=3, backoff=0.01)
+
+    def tearDown(self):
+        if self.controller.loop.is_running():
+            self.controller.stop()
+
+    def message(self, to):
+        message = EmailMessage()
+        message["From"] = "noreply@example.com"
+        message["To"] = to
+        message["Subject"] = "Test"
+        message.set_content("<p>Test</p>", subtype="html")
+        return message
+
+    async def test_sends_over_pooled_connections(self):
+        await self.mailer.start()
+        for number in range(50):
+            await self.mailer.enqueue(self.message(f"user{number}@example.com"))
+        await self.mailer.stop()
+        self.assertEqual(sorted(self.handler.messages), sorted(f"user{number}@example.com" for number in range(50)))
+        self.assertLessEqual(len(self.handler.sessions), 2)
+        self.assertEqual(self.mailer.stats(), {"queued": 0, "retrying": 0, "sent": 50, "failed": 0, "connections_opened": len(self.handler.sessions)})
+
+    async def test_retries_temporary_errors(self):
+        self.handler.replies["retry@example.com"] = ["451 Try again later", "451 Try again later"]
+        self.handler.replies["rejected@example.com"] = ["550 No such user"]
+        await self.mailer.start()
+        await self.mailer.enqueue(self.message("retry@example.com"))
+        await self.mailer.enqueue(self.message("rejected@example.com"))
+        await asyncio.sleep(0.2)
+        await self.mailer.stop()
+        self.assertEqual(self.handler.messages, ["retry@example.com"])
+        self.assertEqual((self.mailer.sent, self.mailer.failed), (1, 1))
+
+    async def test_drops_after_max_attempts(self):
+        self.handler.replies["retry@example.com"] = ["451 Try again later"] * 3
+        await self.mailer.start()
+        await self.mailer.enqueue(self.message("retry@example.com"))
+        await asyncio.sleep(0.2)
+        await self.mailer.stop()
+        self.assertEqual((self.handler.messages, self.mailer.failed), ([], 1))
+
+    async def test_survives_unexpected_errors(self):
+        await self.mailer.start()
+        for _ in range(self.mailer.concurrency):
+            message = self.message("user@example.com")
+            del message["From"]
+            await self.mailer.enqueue(message)
+            await asyncio.sleep(0.05)
+        await self.mailer.enqueue(self.message("after@example.com"))
+        await self.mailer.stop()
+        self.assertEqual(self.handler.messages, ["after@example.com"])
+        self.assertEqual((self.mailer.sent, self.mailer.failed), (1, self.mailer.concurrency))
+
+    async def test_stop_waits_for_retries(self):
+        self.handler.replies["retry@example.com"] = ["451 Try again later"]
+        self.mailer.backoff = 0.2
+        await self.mailer.start()
+        await self.mailer.enqueue(self.message("retry@example.com"))
+        await self.mailer.stop()
+        self.assertEqual(self.handler.messages, ["retry@example.com"])
+        self.handler.replies["late@example.com"] = ["451 Try again later"]
+        self.mailer.backoff = 5
+        await self.mailer.start()
+        await self.mailer.enqueue(self.message("late@example.com"))
+        await self.mailer.stop(timeout=0.2)
+        self.assertEqual((self.mailer.sent, self.mailer.failed), (1, 1))
+
+    async def test_send_raises_on_failure(self):
+        self.handler.replies["rejected@example.com"] = ["550 No such user"]
+        await self.mailer.send(self.message("now@example.com"))
+        with self.assertRaises(aiosmtplib.SMTPResponseException) as cm:
+            await self.mailer.send(self.message("rejected@example.com"))
+        self.assertEqual(cm.exception.code, 550)
+        self.assertEqual((self.handler.messages, self.mailer.sent, self.mailer.failed), (["now@example.com"], 1, 1))
+        self.controller.stop()
+        await self.mailer.pool.close()
+        with self.assertRaises((aiosmtplib.SMTPException, OSError)):
+            await self.mailer.send(self.message("down@example.com"))
+        self.assertEqual(self.mailer.queue.qsize(), 0)
+
+    async def test_reconnects_when_server_is_down(self):
+        self.controller.stop()
+        self.mailer.backoff = 0.05
+        await self.mailer.start()
+        await self.mailer.enqueue(self.message("later@example.com"))
+        await asyncio.sleep(0.02)
+        controller = Controller(self.handler, hostname="127.0.0.1", port=self.controller.port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        await asyncio.sleep(0.3)
+        await self.mailer.stop()
+        self.assertEqual(self.handler.messages, ["later@example.com"])
+
+
+if __name__ == '__main__':
+    unittest.main()
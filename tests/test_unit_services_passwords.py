@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.passwords import PasswordHasher
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+
+    def tearDown(self):
+        self.hasher.executor.shutdown()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.hasher.hash("password")
+        self.assertTrue(hashed.startswith("$2b$04$"))
+        self.assertTrue(await self.hasher.verify("password", hashed))
+        self.assertFalse(await self.hasher.verify("wrong", hashed))
+        self.assertEqual(self.hasher.stats(), {"workers": 1, "pending": 0, "queued": 0, "completed": 3, "rejected": 0})
+
+    async def test_verify_and_update_rehashes_on_cost_change(self):
+        hashed = await self.hasher.hash("password")
+        self.assertEqual(await self.hasher.verify_and_update("password", hashed), (True, None))
+        stronger = PasswordHasher(rounds=5, workers=1, max_queue=1)
+        try:
+            verified, new_hash = await stronger.verify_and_update("password", hashed)
+            self.assertTrue(verified)
+            self.assertTrue(new_hash.startswith("$2b$05$"))
+            self.assertEqual(await stronger.verify_and_update("wrong", hashed), (False, None))
+        finally:
+            stronger.executor.shutdown()
+
+    async def test_full_queue_is_refused(self):
+        release = threading.Event()
+        running = asyncio.create_task(self.hasher._run(release.wait))
+        queued = asyncio.create_task(self.hasher._run(release.wait))
+        await asyncio.sleep(0)
+        self.assertEqual(self.hasher.stats()["queued"], 1)
+        with self.assertRaises(HTTPException) as e:
+            await self.hasher.hash("password")
+        self.assertEqual(e.exception.status_code, 503)
+        release.set()
+        await asyncio.gather(running, queued)
+        self.assertEqual(self.hasher.stats()["rejected"], 1)
+
+    async def test_cancelled_call_counts_until_done(self):
+        release = threading.Event()
+        call = asyncio.create_task(self.hasher._run(release.wait))
+        await asyncio.sleep(0)
+        call.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await call
+        self.assertEqual((self.hasher.pending, self.hasher.completed), (1, 0))
+        release.set()
+        while self.hasher.pending:
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.hasher.completed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
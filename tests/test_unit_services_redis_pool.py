@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import AsyncMock
+
+import redis.asyncio as redis
+
+from src.services.circuit import CircuitBreaker, PoolExhaustedError
+from src.services.redis_pool import RedisPool
+
+
+class TestRedisPool(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pool = RedisPool("localhost", 6379, max_connections=5, pool_timeout=0.1, socket_timeout=0.2, connect_timeout=0.3)
+
+    def test_settings(self):
+        kwargs = self.pool.pool.connection_kwargs
+        self.assertEqual((self.pool.pool.max_connections, self.pool.pool.timeout), (5, 0.1))
+        self.assertEqual((kwargs["socket_timeout"], kwargs["socket_connect_timeout"]), (0.2, 0.3))
+        self.assertIs(self.pool.client.connection_pool, self.pool.pool)
+
+    def test_stats(self):
+        self.assertEqual(self.pool.stats(), {"max_connections": 5, "in_use": 0, "idle": 0, "breaker": None})
+
+    async def test_saturated_pool_does_not_open_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+        pool = RedisPool("localhost", 6379, max_connections=1, pool_timeout=0.05, breaker=breaker)
+        connection = pool.pool.get_available_connection()
+        for _ in range(3):
+            with self.assertRaises(PoolExhaustedError):
+                await pool.client.ping()
+        self.assertEqual(breaker.stats(), {"state": "closed", "failures": 0, "rejected": 0})
+        await pool.pool.release(connection)
+
+    async def test_ping(self):
+        self.pool.client.ping = AsyncMock(return_value=True)
+        self.assertTrue(await self.pool.ping())
+        self.pool.client.ping = AsyncMock(side_effect=redis.ConnectionError)
+        self.assertFalse(await self.pool.ping())
+
+    def test_pipeline(self):
+        pipe = self.pool.pipeline()
+        self.assertIs(pipe.connection_pool, self.pool.pool)
+        self.assertFalse(pipe.is_transaction)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from src.services.refresh_tokens import RefreshTokenStore
+
+
+class TestRefreshTokenStore(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = MagicMock()
+        self.redis.set = AsyncMock()
+        self.redis.delete = AsyncMock()
+        self.script = AsyncMock(return_value=1)
+        self.redis.register_script.return_value = self.script
+        self.store = RefreshTokenStore(self.redis)
+
+    def test_script_registered(self):
+        self.redis.register_script.assert_called_once_with(RefreshTokenStore.ROTATE_SCRIPT)
+
+    async def test_start(self):
+        await self.store.start("family", "jti", 60)
+        self.redis.set.assert_awaited_once_with("refresh-family:family", "jti", ex=60)
+
+    async def test_rotate(self):
+        for returned, expected in ((1, RefreshTokenStore.ROTATED), (0, RefreshTokenStore.UNKNOWN), (-1, RefreshTokenStore.REUSED)):
+            self.script.return_value = returned
+            self.assertEqual(await self.store.rotate("family", "jti", "new_jti", 60), expected)
+        self.script.assert_awaited_with(keys=["refresh-family:family"], args=["jti", "new_jti", 60])
+
+    async def test_revoke(self):
+        await self.store.revoke("family")
+        self.redis.delete.assert_awaited_once_with("refresh-family:family")
+
+
+if __name__ == '__main__':
+    unittest.main()
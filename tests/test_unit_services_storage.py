@@ -0,0 +1,93 @@
+import hashlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import redis.asyncio as redis
+from fastapi import HTTPException, UploadFile
+
+from src.services.storage import Avatars, CloudinaryAvatarStorage, LocalAvatarStorage, read_image
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="avatar.png")
+
+
+class TestReadImage(unittest.IsolatedAsyncioTestCase):
+
+    async def test_reads_in_chunks(self):
+        image = await read_image(upload(PNG), max_size=1000, chunk_size=16)
+        self.assertEqual((image.content_type, image.extension, image.size), ("image/png", ".png", len(PNG)))
+        self.assertEqual(image.digest, hashlib.sha256(PNG).hexdigest())
+        self.assertEqual(image.file.read(), PNG)
+
+    async def test_rejects_other_types(self):
+        for data in (b"<svg></svg>", b""):
+            with self.assertRaises(HTTPException) as cm:
+                await read_image(upload(data), max_size=1000)
+            self.assertEqual(cm.exception.status_code, 415)
+
+    async def test_rejects_large_images(self):
+        with self.assertRaises(HTTPException) as cm:
+            await read_image(upload(PNG), max_size=50, chunk_size=16)
+        self.assertEqual(cm.exception.status_code, 413)
+
+
+class TestAvatarStorage(unittest.IsolatedAsyncioTestCase):
+
+    async def test_local_storage_keeps_one_copy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = LocalAvatarStorage(directory, "/avatars/")
+            image = await read_image(upload(PNG), max_size=1000)
+            url = await storage.save(image)
+            self.assertEqual(url, f"/avatars/{image.digest}.png")
+            self.assertEqual(Path(directory, f"{image.digest}.png").read_bytes(), PNG)
+            self.assertEqual(await storage.save(await read_image(upload(PNG), max_size=1000)), url)
+            self.assertEqual(len(list(Path(directory).iterdir())), 1)
+
+    async def test_cloudinary_storage(self):
+        storage = CloudinaryAvatarStorage("cloud", "key", "secret")
+        image = await read_image(upload(PNG), max_size=1000)
+        with patch("src.services.storage.cloudinary.uploader.upload", return_value={"version": 7}) as mock_upload:
+            url = await storage.save(image)
+        self.assertEqual(mock_upload.call_args.kwargs["public_id"], f"NotesApp/avatars/{image.digest}")
+        self.assertFalse(mock_upload.call_args.kwargs["overwrite"])
+        self.assertIn(f"/cloud/image/upload/c_fill,h_250,w_250/v7/NotesApp/avatars/{image.digest}", url)
+
+
+class TestAvatars(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.storage = MagicMock()
+        self.storage.name = "local"
+        self.storage.save = AsyncMock(return_value="/avatars/a.png")
+        self.redis = MagicMock()
+        self.redis.get = AsyncMock(return_value=None)
+        self.redis.set = AsyncMock()
+        self.avatars = Avatars(self.storage, self.redis, max_size=1000)
+
+    async def test_upload_skips_stored_images(self):
+        self.assertEqual(await self.avatars.upload(upload(PNG)), "/avatars/a.png")
+        key = f"avatar:local:{hashlib.sha256(PNG).hexdigest()}"
+        self.redis.set.assert_awaited_once_with(key, "/avatars/a.png")
+        self.redis.get.return_value = b"/avatars/a.png"
+        self.assertEqual(await self.avatars.upload(upload(PNG)), "/avatars/a.png")
+        self.storage.save.assert_awaited_once()
+
+    async def test_upload_without_redis(self):
+        self.redis.get.side_effect = redis.ConnectionError()
+        self.redis.set.side_effect = redis.ConnectionError()
+        self.assertEqual(await self.avatars.upload(upload(PNG)), "/avatars/a.png")
+        self.storage.save.assert_awaited_once()
+
+    def test_check_content_length(self):
+        self.avatars.check_content_length(SimpleNamespace(headers={"content-length": str(1000 + Avatars.MULTIPART_OVERHEAD)}))
+        for headers, code in (({}, 411), ({"content-length": "abc"}, 400), ({"content-length": str(1001 + Avatars.MULTIPART_OVERHEAD)}, 413)):
+            with self.assertRaises(HTTPException) as cm:
+                self.avatars.check_content_length(SimpleNamespace(headers=headers))
+            self.assertEqual(cm.exception.status_code, code)